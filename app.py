@@ -1,12 +1,19 @@
 import argparse
+import json
 import os
 import sys
+import time
+from urllib.parse import quote
 
-from flask import Flask, render_template, request, send_from_directory, abort, url_for
+from flask import (Flask, render_template, request, abort, url_for, jsonify, redirect, send_file, Response, g,
+                   stream_template, stream_with_context)
+from markupsafe import Markup
 
 from config import Config
 # 导入文件操作和搜索工具模块
-from utils import file_operations, search_utils
+from utils import (admission, archive, compression, file_operations, file_transfer, fragment_cache, http_cache,
+                   log_follow, manifest, metadata_store, metrics, profiling, roots, search_index, search_utils,
+                   thumbnails)
 
 # 创建 Flask 应用实例
 app = Flask(__name__)
@@ -14,6 +21,70 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 
+if app.config['ADMISSION_ENABLED']:
+    # 在响应发送完毕时释放下载槽位，并按需对下载限速
+    app.wsgi_app = admission.AdmissionMiddleware(app.wsgi_app)
+
+if app.config['METRICS_ENABLED']:
+    # 按路由统计请求数、耗时、发送字节数和 in-flight 请求数，并记录模板渲染耗时
+    app.wsgi_app = metrics.MetricsMiddleware(app.wsgi_app)
+    metrics.connect_template_timing(app)
+
+if app.config['PROFILING_ENABLED']:
+    # 结构化计时日志和慢请求剖析，位于最外层以便统计完整的请求耗时
+    app.wsgi_app = profiling.ProfilingMiddleware(app.wsgi_app, app.config, app.logger)
+
+
+@app.before_request
+def start_request_metrics():
+    """
+    记录请求对应的路由，并启动本 worker 的指标快照线程。
+    """
+    if app.config['METRICS_ENABLED']:
+        metrics.start_flusher(app)
+        metrics.start_request(request.environ, request.endpoint or 'unmatched')
+
+
+@app.before_request
+def admission_control():
+    """
+    按客户端限制请求速率和同时进行的下载数，超出限制时返回 429。
+    """
+    if not admission.is_available():
+        return None
+    try:
+        admission.admit(request)
+    except admission.Rejected as e:
+        message = "下载数已达上限，请稍后再试。" if e.reason != 'rate' else "请求过于频繁，请稍后再试。"
+        if request.path.startswith('/api/'):
+            response = jsonify(error=message)
+        else:
+            response = app.make_response(render_template('error.html', error_code=429, error_message=message))
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    return None
+
+
+@app.after_request
+def compress_response(response):
+    """
+    按 Accept-Encoding 压缩 HTML 和 JSON 响应。
+    """
+    return compression.compress_response(response)
+
+
+@app.context_processor
+def inject_thumbnail_settings():
+    """
+    向模板提供缩略图是否可用以及可用尺寸。
+    """
+    return {
+        'thumbnails_enabled': thumbnails.is_available(),
+        'thumbnail_sizes': app.config['THUMBNAIL_SIZES'],
+    }
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     """
@@ -38,6 +109,60 @@ def internal_server_error(e):
     return render_template('error.html', error_code=500, error_message="服务器内部错误。"), 500
 
 
+# url_for 生成链接前缀时使用的占位路径
+_URL_PLACEHOLDER = 'aetherserve-path-placeholder'
+# 与 Werkzeug 路由转换器相同的保留字符，保证拼接出的链接与 url_for 生成的一致
+_URL_PATH_SAFE = "!$&'()*+,/:;=@"
+
+
+def _url_prefixes():
+    """
+    返回当前请求下各类条目链接的前缀（路径之前的部分）。每个请求只调用几次 url_for，
+    条目链接由前缀加上转义后的路径拼接而成。前缀取决于请求的主机和脚本根路径，因此按请求缓存在 g 中。
+    """
+    prefixes = g.get('url_prefixes')
+    if prefixes is None:
+        def prefix(endpoint, **values):
+            url = url_for(endpoint, **values)
+            return url[:-len(_URL_PLACEHOLDER)]
+
+        prefixes = g.url_prefixes = {
+            'browse': prefix('browse', sub_path=_URL_PLACEHOLDER),
+            'preview': prefix('preview', file_path=_URL_PLACEHOLDER),
+            'download': prefix('download_file', file_path=_URL_PLACEHOLDER),
+            'thumbnail': prefix('thumbnail', size=app.config['THUMBNAIL_SIZES'][0], image_path=_URL_PLACEHOLDER),
+            'browse_external': prefix('browse', sub_path=_URL_PLACEHOLDER, _external=True),
+            'download_external': prefix('download_file', file_path=_URL_PLACEHOLDER, _external=True),
+        }
+    return prefixes
+
+
+@metrics.timed('add_item_urls')
+def _add_item_urls(items):
+    """
+    为每个列表项添加链接：url（文件夹的浏览链接或可预览文件的预览链接）、download_url、
+    thumb_url（图片缩略图）以及用于复制的完整 URL full_url。
+    """
+    prefixes = _url_prefixes()
+    thumbnails_enabled = thumbnails.is_available()
+    for item in items:
+        path = quote(item['path'], safe=_URL_PATH_SAFE)
+        if item['is_dir']:
+            # 文件夹的完整 URL 是其浏览链接
+            item['url'] = prefixes['browse'] + path
+            item['full_url'] = prefixes['browse_external'] + path
+            continue
+        if item.get('is_text') or item.get('is_image'):
+            item['url'] = prefixes['preview'] + path
+        else:
+            item['url'] = None
+        item['download_url'] = prefixes['download'] + path
+        # 文件的完整 URL 是其下载链接
+        item['full_url'] = prefixes['download_external'] + path
+        if item.get('is_image') and thumbnails_enabled:
+            item['thumb_url'] = prefixes['thumbnail'] + path
+
+
 @app.route('/')
 @app.route('/browse/')
 @app.route('/browse/<path:sub_path>')
@@ -49,16 +174,27 @@ def browse(sub_path=''):
     try:
         # 规范化路径，移除开头的斜杠，防止 os.path.join 出现问题
         current_path = sub_path.strip('/')
-        items = file_operations.list_directory(current_path)
 
-        # 为每个项目添加完整的 URL
-        for item in items:
-            if item['is_dir']:
-                # 文件夹的完整 URL 是其浏览链接
-                item['full_url'] = url_for('browse', sub_path=item['path'], _external=True)
-            else:
-                # 文件的完整 URL 是其下载链接
-                item['full_url'] = url_for('download_file', file_path=item['path'], _external=True)
+        # 在读取目录内容之前检查条件请求，目录未变化时直接返回 304
+        etag, last_modified = http_cache.directory_validators(current_path)
+        not_modified = http_cache.not_modified_response(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        # 只渲染第一页，其余条目由页面滚动时通过 /api/list 按需加载。
+        # 表格行的 HTML 以 ETag（目录版本、配置和主机）为键缓存，目录未变化时跳过列表和渲染
+        cached_rows = fragment_cache.get(('browse-rows', etag))
+        if cached_rows is None:
+            items, total, next_cursor = file_operations.page_directory(
+                current_path, limit=app.config['LISTING_PAGE_SIZE']
+            )
+            _add_item_urls(items)
+            rows_html = Markup(render_template('file_rows.html', items=items))
+            # 与目录列表缓存相同，刚修改过的目录在同一时间戳粒度内可能再次变化而 ETag 不变，暂不缓存
+            if time.time() - last_modified.timestamp() >= file_operations._LISTING_CACHE_MIN_AGE:
+                fragment_cache.put(('browse-rows', etag), rows_html, total, next_cursor)
+        else:
+            rows_html, total, next_cursor = cached_rows
 
         # 构建面包屑导航
         breadcrumbs = []
@@ -73,14 +209,18 @@ def browse(sub_path=''):
         if parent_path == '/':  # 根目录的上一级是空字符串
             parent_path = ''
 
-        return render_template(
+        return http_cache.cacheable(render_template(
             'index.html',
             current_path=current_path,
-            items=items,
+            rows_html=rows_html,
             breadcrumbs=breadcrumbs,
             parent_path=parent_path,
+            total=total,
+            next_cursor=next_cursor,
+            # 多根目录的虚拟顶层目录不是磁盘上的目录，不能打包下载
+            archive_available=bool(current_path) or not roots.is_multi_root(),
             base_url=request.url_root  # 传递 base_url 到模板，用于其他需要的情况
-        )
+        ), etag, last_modified)
     except FileNotFoundError:
         # 如果文件或目录未找到，返回 404 错误
         abort(404)
@@ -93,6 +233,45 @@ def browse(sub_path=''):
         abort(500)
 
 
+@app.route('/api/list/')
+@app.route('/api/list/<path:sub_path>')
+def api_list(sub_path=''):
+    """
+    分页列出目录内容的 JSON 接口。
+    查询参数：cursor（上一页返回的游标）、limit、sort（name/size/modified/type）、
+    order（asc/desc）和 filter（名称子串过滤）。
+    """
+    current_path = sub_path.strip('/')
+    try:
+        limit = int(request.args.get('limit', app.config['LISTING_PAGE_SIZE']))
+    except ValueError:
+        return jsonify(error="limit 必须是整数。"), 400
+    limit = max(1, min(limit, app.config['LISTING_PAGE_MAX_SIZE']))
+
+    try:
+        items, total, next_cursor = file_operations.page_directory(
+            current_path,
+            sort=request.args.get('sort', 'name'),
+            descending=request.args.get('order', 'asc') == 'desc',
+            name_filter=request.args.get('filter', '').strip(),
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
+    except file_operations.InvalidListingQuery as e:
+        return jsonify(error=str(e)), 400
+    except FileNotFoundError:
+        return jsonify(error="文件或目录未找到。"), 404
+    except ValueError:
+        return jsonify(error="禁止访问。"), 403
+    except Exception as e:
+        app.logger.error(f"列表接口错误，路径: {sub_path}: {e}")
+        return jsonify(error="服务器内部错误。"), 500
+
+    _add_item_urls(items)
+
+    return jsonify(path=current_path, items=items, total=total, next_cursor=next_cursor)
+
+
 @app.route('/preview/<path:file_path>')
 def preview(file_path):
     """
@@ -103,35 +282,68 @@ def preview(file_path):
         # 规范化文件路径
         file_path = file_path.strip('/')
 
+        # 文本文件显示开头（head）还是末尾（tail），日志文件默认显示末尾
+        mode = request.args.get('mode')
+        if mode not in ('head', 'tail'):
+            extension = os.path.splitext(file_path)[1].lower()
+            mode = 'tail' if extension in app.config['PREVIEW_TAIL_EXTENSIONS'] else 'head'
+
+        # 在读取和检测文件之前检查条件请求，文件未变化时直接返回 304
+        etag, last_modified = http_cache.file_validators(file_path, mode)
+        not_modified = http_cache.not_modified_response(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
         # 获取文件信息，用于显示文件名和大小
         file_info = file_operations.get_file_info(file_path)
 
         # 为当前文件添加完整的下载 URL
         file_info['full_url'] = url_for('download_file', file_path=file_path, _external=True)
 
-        # 判断文件类型并渲染相应模板
-        if file_operations.is_text_file(file_path):
-            content, is_truncated = file_operations.read_text_file(file_path)
-            return render_template(
+        # 判断文件类型并渲染相应模板（一次分类同时得到文本/图片判断）
+        file_kind = file_operations.classify_file(file_path)
+        if file_kind == file_operations.FILE_KIND_TEXT:
+            next_offset = tail_start = None
+            if mode == 'tail':
+                # tail 模式：只读取最后 PREVIEW_TAIL_LINES 行，next_offset 为跟随新内容的起点
+                chunk, tail_start, next_offset = file_operations.read_text_tail(
+                    file_path, app.config['PREVIEW_TAIL_LINES'], app.config['MAX_PREVIEW_FILE_SIZE']
+                )
+                content = chunk.decode('utf-8', errors='ignore')
+                is_truncated = tail_start > 0
+            elif app.config['PREVIEW_CHUNKED']:
+                # 分块模式：页面只包含第一块，其余部分由前端按需加载
+                chunk, _, next_offset, _ = file_operations.read_text_chunk(
+                    file_path, 0, app.config['PREVIEW_CHUNK_SIZE']
+                )
+                content = chunk.decode('utf-8', errors='ignore')
+                is_truncated = next_offset < file_info['size']
+            else:
+                content, is_truncated = file_operations.read_text_file(file_path)
+            return http_cache.cacheable(render_template(
                 'preview.html',
                 file_path=file_path,
                 file_name=file_info['name'],
                 file_size=file_info['size'],
                 content=content,
                 is_truncated=is_truncated,
+                chunked=app.config['PREVIEW_CHUNKED'],
+                next_offset=next_offset,
+                tail=mode == 'tail',
+                tail_start=tail_start,
                 base_url=request.url_root,  # 传递 base_url 到模板
                 full_url=file_info['full_url']  # 传递完整 URL 到模板
-            )
-        elif file_operations.is_image_file(file_path):
+            ), etag, last_modified)
+        elif file_kind == file_operations.FILE_KIND_IMAGE:
             # 图片文件直接渲染图片预览模板
-            return render_template(
+            return http_cache.cacheable(render_template(
                 'image_preview.html',
                 file_path=file_path,
                 file_name=file_info['name'],
                 file_size=file_info['size'],
                 base_url=request.url_root,  # 传递 base_url 到模板
                 full_url=file_info['full_url']  # 传递完整 URL 到模板
-            )
+            ), etag, last_modified)
         else:
             # 既不是文本也不是图片，则尝试下载
             return download_file(file_path)
@@ -148,6 +360,95 @@ def preview(file_path):
         abort(500)
 
 
+@app.route('/api/preview/<path:file_path>')
+def api_preview(file_path):
+    """
+    分块读取文本文件内容的接口，返回 text/plain 原始数据。
+    查询参数：offset（起始字节偏移，默认 0）和 length（最多读取的字节数）；
+    或者 tail=N，返回文件最后 N 行（最多 MAX_PREVIEW_FILE_SIZE 字节）。
+    响应头 X-Preview-Offset / X-Preview-Next-Offset / X-Preview-File-Size 描述本块的位置。
+    """
+    file_path = file_path.strip('/')
+    try:
+        offset = int(request.args.get('offset', 0))
+        length = int(request.args.get('length', app.config['PREVIEW_CHUNK_SIZE']))
+        tail = int(request.args['tail']) if 'tail' in request.args else None
+    except ValueError:
+        return jsonify(error="offset、length 和 tail 必须是整数。"), 400
+    if offset < 0 or length <= 0 or (tail is not None and tail <= 0):
+        return jsonify(error="offset 不能为负数，length 和 tail 必须大于 0。"), 400
+    length = min(length, app.config['MAX_PREVIEW_FILE_SIZE'])
+
+    try:
+        if tail is not None:
+            data, start, file_size = file_operations.read_text_tail(
+                file_path, min(tail, app.config['PREVIEW_TAIL_MAX_LINES']), app.config['MAX_PREVIEW_FILE_SIZE']
+            )
+            next_offset = file_size
+        else:
+            data, start, next_offset, file_size = file_operations.read_text_chunk(file_path, offset, length)
+    except FileNotFoundError:
+        return jsonify(error="文件未找到或不是可预览的文本文件。"), 404
+    except ValueError:
+        return jsonify(error="禁止访问。"), 403
+    except Exception as e:
+        app.logger.error(f"预览接口错误，文件: {file_path}: {e}")
+        return jsonify(error="服务器内部错误。"), 500
+
+    # text/* 类型会自动附加 charset=utf-8
+    response = app.response_class(data, mimetype='text/plain')
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['X-Preview-Offset'] = str(start)
+    response.headers['X-Preview-Next-Offset'] = str(next_offset)
+    response.headers['X-Preview-File-Size'] = str(file_size)
+    return response
+
+
+@app.route('/api/follow/<path:file_path>')
+def api_follow(file_path):
+    """
+    以 Server-Sent Events 推送文本文件新追加的内容（类似 tail -f），供日志预览页的“实时跟随”使用。
+    查询参数 offset 为开始推送的字节偏移，默认为当前文件末尾；浏览器重连时通过 Last-Event-ID 从上次的位置继续。
+    每条消息的 data 为 {"offset": ..., "text": ...}；文件被截断或轮转时发送 reset 事件，并从新文件的开头继续推送。
+    """
+    file_path = file_path.strip('/')
+    if not app.config['PREVIEW_FOLLOW_ENABLED']:
+        return jsonify(error="实时跟随未启用。"), 501
+    inode = None
+    offset = request.args.get('offset')
+    try:
+        offset = int(offset) if offset is not None else None
+    except ValueError:
+        return jsonify(error="offset 必须是整数。"), 400
+    last_event = log_follow.parse_event_id(request.headers.get('Last-Event-ID'))
+    if last_event is not None:
+        inode, offset = last_event
+    if offset is not None and offset < 0:
+        return jsonify(error="offset 不能为负数。"), 400
+
+    try:
+        absolute_path = file_operations._get_absolute_path(file_path)
+        if file_operations.classify_file(file_path) != file_operations.FILE_KIND_TEXT:
+            raise FileNotFoundError(f"Not a previewable text file: {file_path}")
+        stream = log_follow.follow(absolute_path, inode, offset, app.config)
+    except FileNotFoundError:
+        return jsonify(error="文件未找到或不是可预览的文本文件。"), 404
+    except ValueError:
+        return jsonify(error="禁止访问。"), 403
+    except log_follow.TooManyFollowers:
+        response = jsonify(error="实时跟随的连接数已达上限，请稍后再试。")
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    except Exception as e:
+        app.logger.error(f"跟随接口错误，文件: {file_path}: {e}")
+        return jsonify(error="服务器内部错误。"), 500
+
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 禁止 nginx 缓冲，事件立即送达浏览器
+    return response
+
+
 @app.route('/download/<path:file_path>')
 def download_file(file_path):
     """
@@ -161,16 +462,10 @@ def download_file(file_path):
 
         if not os.path.isfile(absolute_file_path):
             # 如果不是文件或文件不存在，返回 404 错误
-            abort(404)
-
-        # send_from_directory 用于从指定目录发送文件
-        # os.path.dirname(absolute_file_path) 是文件所在的目录
-        # os.path.basename(absolute_file_path) 是文件名
-        return send_from_directory(
-            os.path.dirname(absolute_file_path),
-            os.path.basename(absolute_file_path),
-            as_attachment=True  # 强制下载
-        )
+            raise FileNotFoundError(f"File not found: {file_path}")
+
+        # 根据 FILE_OFFLOAD_MODE 交给前端代理发送，或回退到 send_from_directory
+        return file_transfer.send_file_response(absolute_file_path, as_attachment=True)  # 强制下载
     except FileNotFoundError:
         # 文件未找到，返回 404 错误
         abort(404)
@@ -183,6 +478,36 @@ def download_file(file_path):
         abort(500)
 
 
+@app.route('/archive/<path:archive_path>')
+def download_archive(archive_path):
+    """
+    将整个目录打包为 ZIP、tar 或 tar.zst 并以流的形式下载，例如 /archive/configs/nginx.zip。
+    根目录使用 /archive/.zip。归档边读边发送，不产生临时文件，也不会把整个文件读入内存。
+    """
+    try:
+        dir_path, suffix = archive.split_archive_path(archive_path)
+        if suffix is None:
+            raise FileNotFoundError(f"Unsupported archive format: {archive_path}")
+        stream, download_name, mimetype = archive.stream_directory(dir_path, suffix)
+    except FileNotFoundError:
+        # 目录未找到或格式不支持，返回 404 错误
+        abort(404)
+    except ValueError:
+        # 目录穿越尝试，返回 403 错误
+        abort(403)
+    except archive.ArchiveTooLarge:
+        # 超过文件数或字节数上限
+        return render_template('error.html', error_code=413, error_message="目录过大，无法打包下载。"), 413
+    except Exception as e:
+        # 记录其他未知错误并返回 500 错误
+        app.logger.error(f"打包下载路由错误，路径: {archive_path}: {e}")
+        abort(500)
+
+    response = app.response_class(stream, mimetype=mimetype)
+    response.headers['Content-Disposition'] = file_transfer._content_disposition('attachment', download_name)
+    return response
+
+
 @app.route('/serve_image/<path:image_path>')
 def serve_image(image_path):
     """
@@ -195,14 +520,10 @@ def serve_image(image_path):
 
         if not os.path.isfile(absolute_image_path):
             # 如果不是文件或文件不存在，返回 404 错误
-            abort(404)
+            raise FileNotFoundError(f"File not found: {image_path}")
 
-        # send_from_directory 会自动处理 MIME 类型
-        return send_from_directory(
-            os.path.dirname(absolute_image_path),
-            os.path.basename(absolute_image_path),
-            as_attachment=False  # 不强制下载
-        )
+        # 根据 FILE_OFFLOAD_MODE 交给前端代理发送，或回退到 send_from_directory
+        return file_transfer.send_file_response(absolute_image_path, as_attachment=False)  # 不强制下载
     except FileNotFoundError:
         # 图片未找到，返回 404 错误
         abort(404)
@@ -215,51 +536,321 @@ def serve_image(image_path):
         abort(500)
 
 
+@app.route('/thumb/<int:size>/<path:image_path>')
+def thumbnail(size, image_path):
+    """
+    提供图片缩略图。缩略图在首次请求时生成并缓存；
+    无法生成缩略图（未安装 Pillow、格式不支持或解码失败）时重定向到原图。
+    """
+    if size not in app.config['THUMBNAIL_SIZES']:
+        abort(404)
+    try:
+        image_path = image_path.strip('/')
+        result = thumbnails.get_thumbnail(image_path, size) if thumbnails.is_available() else None
+        if result is None:
+            return redirect(url_for('serve_image', image_path=image_path))
+        thumbnail_path, mimetype = result
+        return send_file(thumbnail_path, mimetype=mimetype, conditional=True,
+                         max_age=app.config['THUMBNAIL_MAX_AGE'])
+    except FileNotFoundError:
+        # 图片未找到，返回 404 错误
+        abort(404)
+    except ValueError:
+        # 目录穿越尝试，返回 403 错误
+        abort(403)
+    except Exception as e:
+        # 记录其他未知错误并返回 500 错误
+        app.logger.error(f"缩略图路由错误，图片: {image_path}: {e}")
+        abort(500)
+
+
+@app.route('/api/thumbnails/warm/', methods=['POST'])
+@app.route('/api/thumbnails/warm/<path:sub_path>', methods=['POST'])
+def api_warm_thumbnails(sub_path=''):
+    """
+    在后台为目录中的所有图片预生成缩略图（默认为最小尺寸，可通过 size 参数指定），立即返回。
+    """
+    if not thumbnails.is_available():
+        return jsonify(error="缩略图功能不可用。"), 404
+    try:
+        size = int(request.args.get('size', app.config['THUMBNAIL_SIZES'][0]))
+    except ValueError:
+        return jsonify(error="size 必须是整数。"), 400
+    if size not in app.config['THUMBNAIL_SIZES']:
+        return jsonify(error="不支持的缩略图尺寸。"), 400
+    try:
+        queued = thumbnails.warm_directory(file_operations.list_directory(sub_path.strip('/')), size)
+    except FileNotFoundError:
+        return jsonify(error="文件或目录未找到。"), 404
+    except ValueError:
+        return jsonify(error="禁止访问。"), 403
+    except Exception as e:
+        app.logger.error(f"缩略图预热错误，路径: {sub_path}: {e}")
+        return jsonify(error="服务器内部错误。"), 500
+    return jsonify(queued=queued, size=size), 202
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    以 Prometheus 文本格式输出所有 Gunicorn worker 汇总后的指标。
+    """
+    if not app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(metrics.render(app.config['METRICS_DIR']), mimetype='text/plain; version=0.0.4')
+
+
+def _search_limit():
+    """
+    从查询参数中读取每页结果数，限制在 1 到 SEARCH_PAGE_MAX_SIZE 之间。limit 不是整数时抛出 ValueError。
+    """
+    limit = int(request.args.get('limit', app.config['SEARCH_PAGE_SIZE']))
+    return max(1, min(limit, app.config['SEARCH_PAGE_MAX_SIZE']))
+
+
+def _stream_search_results(page, query):
+    """
+    逐个生成一页搜索结果并添加完整的 URL。响应已经开始发送，搜索出错时只能记录错误并结束这一页。
+    """
+    try:
+        for item in page:
+            _add_item_urls([item])
+            yield item
+    except Exception as e:
+        app.logger.error(f"全局搜索错误，查询: '{query}': {e}")
+        page.partial = True
+        page.next_cursor = None
+
+
 @app.route('/search')
 def search():
     """
     全局搜索文件的路由。
-    根据查询关键词在文件服务根目录下搜索文件和文件夹。
+    根据查询关键词在文件服务根目录下搜索文件和文件夹；mode=content 时通过全文索引搜索文本文件的内容。
+    结果按页返回（cursor、limit 查询参数），页面以流的形式边搜索边发送，一页填满后立即停止搜索。
     """
     query = request.args.get('query', '').strip()
-    results = []
-    if query:
+    # mode=content 时搜索文本文件的内容，否则搜索文件和文件夹名称
+    mode = 'content' if request.args.get('mode') == 'content' else 'name'
+    cursor = request.args.get('cursor') or None
+    try:
+        limit = _search_limit()
+    except ValueError:
+        limit = app.config['SEARCH_PAGE_SIZE']
+
+    # 索引就绪时，结果只取决于索引的 generation、查询词和分页参数，可以在搜索之前回答条件请求
+    etag = None
+    if mode == 'content':
+        generation = search_index.current_content_generation()
+    else:
+        generation = search_index.current_generation()
+    if generation is not None:
+        etag = http_cache.make_etag('search', mode, generation, query, cursor or '', limit)
+        not_modified = http_cache.not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+
+    page = None
+    message = None
+    if mode == 'content' and 0 < len(query) < 3:
+        message = "全文搜索的关键词至少需要 3 个字符。"
+    elif query:
         try:
-            raw_results = search_utils.search_files_globally(query)
-            # 为每个搜索结果添加完整的 URL
-            for item in raw_results:
-                if item['is_dir']:
-                    item['full_url'] = url_for('browse', sub_path=item['path'], _external=True)
-                else:
-                    item['full_url'] = url_for('download_file', file_path=item['path'], _external=True)
-            results = raw_results
+            page = search_utils.search_page(query, mode, cursor, limit)
+            if page is None:
+                # 全文搜索只使用索引，索引就绪之前不读取文件
+                message = "全文索引正在构建中，请稍后再试。"
+                etag = None
+        except file_operations.InvalidListingQuery:
+            message = "分页游标无效，请重新搜索。"
+            etag = None
         except Exception as e:
-            # 记录搜索错误
+            # 记录搜索错误，返回空结果
             app.logger.error(f"全局搜索错误，查询: '{query}': {e}")
-            # 可以选择返回一个错误信息给用户，或者直接返回空结果
-            results = []
+            etag = None  # 出错时的空结果不应被缓存
 
-    return render_template('search_results.html', query=query, results=results,
-                           base_url=request.url_root)  # 传递 base_url 到模板
+    results = _stream_search_results(page, query) if page is not None else []
+    response = Response(stream_template(
+        'search_results.html', query=query, results=results, page=page, mode=mode, message=message,
+        limit=request.args.get('limit'), base_url=request.url_root  # 传递 base_url 到模板
+    ))
+    if etag is None:
+        return response
+    return http_cache.cacheable(response, etag)
 
 
-# 启动服务器的主函数，供 pipx 或其他脚本调用
-def run_server(host='0.0.0.0', port=5000, root_dir=None):
+@app.route('/api/search')
+def api_search():
     """
-    启动 AetherServe Flask 应用程序。
-    此函数旨在作为 pipx 或其他脚本的入口点。
+    以 NDJSON 流式返回搜索结果的接口：每找到一个结果就输出一行 JSON，
+    最后一行为 {"done": true, "count": ..., "next_cursor": ..., "partial": ...}。
+    查询参数：query、mode（name/content）、cursor（上一页返回的游标）和 limit。
+    """
+    query = request.args.get('query', '').strip()
+    mode = 'content' if request.args.get('mode') == 'content' else 'name'
+    if not query:
+        return jsonify(error="query 不能为空。"), 400
+    if mode == 'content' and len(query) < 3:
+        return jsonify(error="全文搜索的关键词至少需要 3 个字符。"), 400
+    try:
+        limit = _search_limit()
+    except ValueError:
+        return jsonify(error="limit 必须是整数。"), 400
 
-    参数:
-        host (str): 绑定的 IP 地址。默认为 '0.0.0.0' (所有接口)。
-        port (int): 监听的端口号。默认为 5000。
-        root_dir (str, optional): 文件服务根目录的绝对路径。
-                                  如果提供，将覆盖 .env 文件中的设置。
+    try:
+        page = search_utils.search_page(query, mode, request.args.get('cursor') or None, limit)
+    except file_operations.InvalidListingQuery as e:
+        return jsonify(error=str(e)), 400
+    except Exception as e:
+        app.logger.error(f"搜索接口错误，查询: '{query}': {e}")
+        return jsonify(error="服务器内部错误。"), 500
+    if page is None:
+        response = jsonify(error="全文索引正在构建中，请稍后再试。")
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    def generate():
+        for item in _stream_search_results(page, query):
+            yield json.dumps(item, ensure_ascii=False) + '\n'
+        yield json.dumps({
+            'done': True, 'count': page.count, 'next_cursor': page.next_cursor, 'partial': page.partial
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/api/query/')
+@app.route('/api/query/<path:sub_path>')
+def api_query(sub_path=''):
+    """
+    按元数据查询目录下（含所有子目录）的文件和文件夹的 JSON 接口，例如最近 7 天修改的大于 500 MB 的文件：
+    /api/query/releases?type=file&min_size=500M&newer_than=7d&sort=size&order=desc。
+    查询参数：type（all/file/dir）、min_size、max_size、newer_than、older_than、modified_after、
+    modified_before、ext（逗号分隔）、min_depth、max_depth、sort（path/size/modified/depth）、order 和 limit。
+    """
+    current_path = sub_path.strip('/')
+    if not metadata_store.is_available():
+        return jsonify(error="元数据查询不可用，需要启用 METADATA_INDEX_ENABLED 并安装 NumPy。"), 501
+    try:
+        limit = int(request.args.get('limit', app.config['QUERY_PAGE_SIZE']))
+    except ValueError:
+        return jsonify(error="limit 必须是整数。"), 400
+    limit = max(1, min(limit, app.config['QUERY_MAX_LIMIT']))
+
+    try:
+        result = metadata_store.query_metadata(current_path, request.args, limit)
+    except metadata_store.InvalidMetadataQuery as e:
+        return jsonify(error=str(e)), 400
+    except FileNotFoundError:
+        return jsonify(error="文件或目录未找到。"), 404
+    except Exception as e:
+        app.logger.error(f"元数据查询接口错误，路径: {sub_path}: {e}")
+        return jsonify(error="服务器内部错误。"), 500
+    if result is None:
+        response = jsonify(error="元数据索引正在构建中，请稍后再试。")
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    total, total_size, items, missing_roots = result
+    _add_item_urls(items)
+    if missing_roots:
+        # 多根目录查询时超时或快照尚未就绪的根目录，结果不包含这些根目录中的条目
+        return jsonify(path=current_path, total=total, total_size=total_size, items=items,
+                       partial=True, missing_roots=missing_roots)
+    return jsonify(path=current_path, total=total, total_size=total_size, items=items)
+
+
+@app.route('/api/manifest/')
+@app.route('/api/manifest/<path:sub_path>')
+def api_manifest(sub_path=''):
+    """
+    供镜像同步使用的文件清单接口，以 NDJSON 流式返回目录下（含所有子目录）每个文件的
+    path、size、mtime_ns、sha256（尚未计算完成时为 null）和最后变化的 generation。
+    传入 since=<generation> 时只返回此后新增、修改或删除（"deleted": true）的条目。
+    最后一行为 {"done": true, "generation": ..., "index_id": ..., "count": ..., "pending_hashes": ...}，
+    镜像保存 generation 和 index_id，下次增量请求时一并传入；清单重建后 index_id 变化，接口返回 410，需要重新全量同步。
+    """
+    current_path = sub_path.strip('/')
+    if not app.config['MANIFEST_ENABLED']:
+        return jsonify(error="清单接口未启用。"), 501
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify(error="since 必须是整数。"), 400
+
+    try:
+        # 每个根目录有各自的清单（generation 和 index_id），多根目录时需要分别同步每个根目录
+        root_name, _, root_path = roots.split_path(current_path)
+        if root_name is None:
+            return jsonify(error="请指定要同步的根目录。", roots=list(roots.named_roots())), 400
+        if not os.path.isdir(file_operations._get_absolute_path(current_path)):
+            return jsonify(error="文件或目录未找到。"), 404
+        index = manifest.ready_manifest(since, root_name)
+        if index is None:
+            response = jsonify(error="文件清单正在构建中，请稍后再试。")
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        if since is not None and request.args.get('index_id', index.index_id) != index.index_id:
+            raise manifest.ManifestOutOfRange("Manifest was rebuilt.")
+        generation, entries = index.entries(root_path, since)
+    except FileNotFoundError:
+        return jsonify(error="文件或目录未找到。"), 404
+    except ValueError:
+        return jsonify(error="禁止访问。"), 403
+    except manifest.ManifestOutOfRange:
+        return jsonify(error="无法提供该 generation 之后的增量，请重新获取完整清单。",
+                       generation=index.generation, index_id=index.index_id), 410
+    except Exception as e:
+        app.logger.error(f"清单接口错误，路径: {sub_path}: {e}")
+        return jsonify(error="服务器内部错误。"), 500
+
+    # 清单只取决于 generation、目录和 since，镜像轮询时没有变化可以直接返回 304
+    etag = http_cache.make_etag('manifest', index.index_id, generation, current_path, since)
+    not_modified = http_cache.not_modified_response(etag)
+    if not_modified is not None:
+        return not_modified
+
+    index_id = index.index_id
+
+    def generate():
+        count = pending = 0
+        for entry in entries:
+            count += 1
+            if not entry.get('deleted') and entry['sha256'] is None:
+                pending += 1
+            entry['path'] = roots.join(root_name, entry['path'])
+            yield json.dumps(entry, ensure_ascii=False) + '\n'
+        yield json.dumps({
+            'done': True, 'generation': generation, 'index_id': index_id, 'count': count, 'pending_hashes': pending
+        }) + '\n'
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    return http_cache.cacheable(response, etag)
+
+
+def _prepare_root_dir(root_dir=None):
+    """
+    应用命令行指定的根目录，并确保根目录存在，创建失败时退出程序。
     """
     # 如果通过命令行提供了 root_dir，则覆盖配置中的值
     if root_dir:
         app.config['FILE_SERVER_ROOT_DIR'] = os.path.abspath(root_dir)
+        # 同时写入环境变量，使异步模式下由 uvicorn 启动的 worker 进程也使用该目录
+        os.environ['FILE_SERVER_ROOT_DIR'] = app.config['FILE_SERVER_ROOT_DIR']
+        # 命令行指定的根目录优先于 .env 中的多根目录配置
+        app.config['FILE_SERVER_ROOTS'] = {}
+        os.environ['FILE_SERVER_ROOTS'] = ''
         print(f"使用指定的根目录: {app.config['FILE_SERVER_ROOT_DIR']}")
 
+    if app.config['FILE_SERVER_ROOTS']:
+        # 多根目录通常是各自的挂载点，不存在时只给出提示，不自动创建
+        for name, path in app.config['FILE_SERVER_ROOTS'].items():
+            if not os.path.isdir(path):
+                print(f"警告: 根目录 {name} ({path}) 不存在或不是目录，在其可用之前不会出现在列表中。")
+        return
+
     # 在启动应用前，确保根目录存在
     if not os.path.exists(app.config['FILE_SERVER_ROOT_DIR']):
         try:
@@ -269,10 +860,62 @@ def run_server(host='0.0.0.0', port=5000, root_dir=None):
             print(f"创建文件服务根目录 {app.config['FILE_SERVER_ROOT_DIR']} 失败: {e}")
             sys.exit(1)  # 如果目录创建失败，则退出程序
 
-    print(f"AetherServe 正在 {host}:{port} 启动，文件根目录为: {app.config['FILE_SERVER_ROOT_DIR']}...")
+
+def _describe_roots():
+    """
+    返回启动信息中显示的根目录描述。
+    """
+    if app.config['FILE_SERVER_ROOTS']:
+        return ', '.join(f"{name}={path}" for name, path in app.config['FILE_SERVER_ROOTS'].items())
+    return app.config['FILE_SERVER_ROOT_DIR']
+
+
+# 启动服务器的主函数，供 pipx 或其他脚本调用
+def run_server(host='0.0.0.0', port=5000, root_dir=None):
+    """
+    启动 AetherServe Flask 应用程序。
+    此函数旨在作为 pipx 或其他脚本的入口点。
+
+    参数:
+        host (str): 绑定的 IP 地址。默认为 '0.0.0.0' (所有接口)。
+        port (int): 监听的端口号。默认为 5000。
+        root_dir (str, optional): 文件服务根目录的绝对路径。
+                                  如果提供，将覆盖 .env 文件中的设置。
+    """
+    _prepare_root_dir(root_dir)
+
+    # 直接运行时前面没有 nginx/Apache 代理，文件始终由 Flask 自己发送
+    app.config['FILE_OFFLOAD_MODE'] = ''
+    app.config['USE_X_SENDFILE'] = False
+
+    print(f"AetherServe 正在 {host}:{port} 启动，文件根目录为: {_describe_roots()}...")
     app.run(debug=True, host=host, port=port)  # 使用传递的 host 和 port 启动应用
 
 
+def run_async_server(host='0.0.0.0', port=5000, root_dir=None, workers=1):
+    """
+    以 asyncio (ASGI) 模式启动 AetherServe，适合大量并发下载和慢速客户端。
+    需要安装可选依赖 uvicorn。路由与 run_server 完全相同，见 asgi.py。
+
+    参数:
+        host (str): 绑定的 IP 地址。默认为 '0.0.0.0' (所有接口)。
+        port (int): 监听的端口号。默认为 5000。
+        root_dir (str, optional): 文件服务根目录的绝对路径。
+        workers (int): worker 进程数。默认为 1。
+    """
+    try:
+        import uvicorn
+    except ImportError:
+        print("异步模式需要安装 uvicorn: pip install uvicorn")
+        sys.exit(1)
+
+    _prepare_root_dir(root_dir)
+
+    print(f"AetherServe (异步模式) 正在 {host}:{port} 启动，文件根目录为: {_describe_roots()}...")
+    uvicorn.run('asgi:application', host=host, port=port, workers=workers,
+                app_dir=os.path.dirname(os.path.abspath(__file__)))
+
+
 # 保留原有的 if __name__ == '__main__': 块，以支持直接运行 app.py 进行开发测试
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='运行 AetherServe HTTP 文件服务器。')
@@ -282,6 +925,13 @@ if __name__ == '__main__':
                         help='要监听的端口号。默认为 5000。')
     parser.add_argument('--root-dir', type=str,
                         help='文件服务根目录的绝对路径。将覆盖 .env 文件中的设置。')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='使用 asyncio (ASGI) 模式运行，需要安装 uvicorn。')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='异步模式下的 worker 进程数。默认为 1。')
     args = parser.parse_args()
 
-    run_server(host=args.host, port=args.port, root_dir=args.root_dir)  # 将解析到的参数传递给 run_server
+    if args.use_async:
+        run_async_server(host=args.host, port=args.port, root_dir=args.root_dir, workers=args.workers)
+    else:
+        run_server(host=args.host, port=args.port, root_dir=args.root_dir)  # 将解析到的参数传递给 run_server
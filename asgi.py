@@ -0,0 +1,172 @@
+"""
+AetherServe 的 asyncio (ASGI) 服务入口。
+
+使用方式（需要安装可选依赖 uvicorn）：
+    uvicorn asgi:application --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:application
+或者通过 app.py 的 --async 参数 / run_async_server() 启动。
+
+所有路由仍由 Flask 应用处理，但 Flask 视图在有界线程池中执行，响应体则按块在另一个线程池中读取，
+每读完一块就释放线程，再由事件循环异步发送给客户端。因此慢速客户端和大文件下载只占用一个协程，
+不会像同步 Gunicorn worker 那样独占整个 worker，浏览和搜索请求也不会排在文件块读取之后。
+"""
+import asyncio
+import contextvars
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.wsgi import FileWrapper
+
+from app import app
+
+
+class _ChunkedFileWrapper(FileWrapper):
+    """
+    wsgi.file_wrapper 实现：send_file 默认每块只读 8 KB，这里改为按 ASYNC_CHUNK_SIZE 读取，
+    减少线程池调度次数。保留 FileWrapper 的 seek/tell，使 Range 请求仍能直接定位。
+    """
+    chunk_size = 256 * 1024
+
+    def __init__(self, file, buffer_size=8192):
+        super().__init__(file, max(buffer_size, self.chunk_size))
+
+
+def _build_environ(scope, body):
+    """
+    根据 ASGI HTTP scope 构建 PEP 3333 environ。
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        # WSGI 要求 PATH_INFO 为按 latin-1 解码的原始字节
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': _ChunkedFileWrapper,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = 'HTTP_' + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+class AsyncBridge:
+    """
+    将 WSGI 应用适配为 ASGI 应用。视图调用和响应体的读取分别在两个有界线程池中执行。
+    """
+
+    def __init__(self, wsgi_app, request_workers, stream_workers):
+        self.wsgi_app = wsgi_app
+        # 执行 Flask 视图（目录列表、搜索、渲染等阻塞操作）
+        self._request_executor = ThreadPoolExecutor(request_workers, thread_name_prefix='aether-request')
+        # 读取响应体的下一块（文件块、归档、压缩流），与视图分开，避免大量下载拖慢浏览
+        self._stream_executor = ThreadPoolExecutor(stream_workers, thread_name_prefix='aether-stream')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._handle_http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._request_executor.shutdown(wait=False, cancel_futures=True)
+                self._stream_executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle_http(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                break
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await self._run_wsgi(_build_environ(scope, bytes(body)), send, disconnected)
+        finally:
+            watcher.cancel()
+
+    async def _run_wsgi(self, environ, send, disconnected):
+        loop = asyncio.get_running_loop()
+        response_start = {}
+        # 视图、每一块响应体和 close 可能在不同的线程中执行，统一在同一个 contextvars 上下文中运行，
+        # 使 stream_with_context 推入的 Flask 请求上下文在整个响应期间可见
+        context = contextvars.copy_context()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response_start.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start['status'] = int(status.split(' ', 1)[0])
+            response_start['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+
+        iterable = await loop.run_in_executor(
+            self._request_executor, context.run, self.wsgi_app, environ, start_response
+        )
+        iterator = iter(iterable)
+        try:
+            while not disconnected.is_set():
+                chunk = await loop.run_in_executor(self._stream_executor, context.run, next, iterator, None)
+                if not response_start.get('sent'):
+                    await send({
+                        'type': 'http.response.start',
+                        'status': response_start['status'],
+                        'headers': response_start['headers'],
+                    })
+                    response_start['sent'] = True
+                if chunk is None:
+                    break
+                if chunk:
+                    # send 会等待传输缓冲区腾出空间，慢速客户端只会挂起本协程
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not disconnected.is_set():
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(iterable, 'close'):
+                # 关闭迭代器会触发生成器的清理逻辑（例如删除压缩缓存的临时文件）
+                await loop.run_in_executor(self._stream_executor, context.run, iterable.close)
+
+
+_ChunkedFileWrapper.chunk_size = app.config['ASYNC_CHUNK_SIZE']
+application = AsyncBridge(
+    app,
+    request_workers=app.config['ASYNC_REQUEST_WORKERS'],
+    stream_workers=app.config['ASYNC_STREAM_WORKERS'],
+)
@@ -0,0 +1,134 @@
+"""
+目录列表基准测试。
+
+在临时目录中生成包含 1k / 10k / 100k 个条目的目录（文本、图片和二进制文件混合），
+然后测量 file_operations.list_directory 的冷启动耗时（禁用目录列表缓存并清空 MIME 缓存）。
+
+在项目根目录下运行：
+
+    python -m benchmarks.bench_listing
+    python -m benchmarks.bench_listing --sizes 1000 10000 --repeat 5 --json
+
+要对比修改前后的结果，可以在两个提交上分别运行（例如借助 git worktree）。
+
+参考结果（单核、本地磁盘，--repeat 3 的中位数，单位为秒）：
+
+    条目数     改用 scandir 之前   scandir + 并行 stat   再启用 MIME_TRUST_EXTENSIONS
+    1k         0.227              0.222                0.045
+    10k        2.26               2.17                 0.493
+    100k       22.6               21.9                 4.96
+
+冷启动耗时主要花在 libmagic 读取文件头上。单核本地磁盘上并行 stat 几乎没有收益，
+它针对的是 NFS 等每次 stat 都有网络往返的挂载点；按扩展名信任 MIME 类型才能明显缩短耗时。
+因此并行阶段是实验性的，LISTING_PARALLEL_THRESHOLD 默认为 0（关闭）。
+本脚本默认仍启用它（--parallel-threshold 2000），把 TMPDIR 环境变量指向网络挂载点后运行，
+与 --parallel-threshold 0 的结果对比，即可测量它在网络挂载上的收益。
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 文件类型混合：文本、PNG 图片和随机二进制文件
+_PNG_HEADER = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR' + b'\x00' * 64
+
+
+def make_directory(parent, num_entries):
+    """
+    生成包含 num_entries 个条目的目录，返回其名称。
+    """
+    name = f'dir_{num_entries}'
+    path = os.path.join(parent, name)
+    os.makedirs(path)
+    for i in range(num_entries):
+        kind = i % 10
+        if kind == 0:
+            os.mkdir(os.path.join(path, f'sub_{i:06d}'))
+        elif kind < 6:
+            with open(os.path.join(path, f'file_{i:06d}.txt'), 'w') as f:
+                f.write(f'line {i}\n' * 8)
+        elif kind < 8:
+            with open(os.path.join(path, f'image_{i:06d}.png'), 'wb') as f:
+                f.write(_PNG_HEADER)
+        else:
+            with open(os.path.join(path, f'blob_{i:06d}.bin'), 'wb') as f:
+                f.write(os.urandom(256))
+    return name
+
+
+def _reset_caches(file_operations):
+    """
+    清空进程内缓存，使每次测量都是冷启动。旧版本中不存在的缓存会被忽略。
+    """
+    for attr in ('_listing_cache', '_mime_cache'):
+        cache = getattr(file_operations, attr, None)
+        if cache is not None:
+            cache.clear()
+
+
+def run(sizes, repeat, parallel_threshold, trust_extensions):
+    """
+    依次测量每种目录大小，返回结果列表。
+    """
+    root_dir = tempfile.mkdtemp(prefix='aetherserve_bench_')
+    os.environ['FILE_SERVER_ROOT_DIR'] = root_dir
+    from app import app
+    from utils import file_operations
+
+    app.config.update(
+        FILE_SERVER_ROOT_DIR=root_dir,
+        LISTING_CACHE_MAX_ENTRIES=0,
+        LISTING_PARALLEL_THRESHOLD=parallel_threshold,
+        MIME_TRUST_EXTENSIONS=trust_extensions,
+    )
+
+    results = []
+    try:
+        for size in sizes:
+            name = make_directory(root_dir, size)
+            timings = []
+            with app.app_context():
+                for _ in range(repeat):
+                    _reset_caches(file_operations)
+                    start = time.perf_counter()
+                    items = file_operations.list_directory(name)
+                    timings.append(time.perf_counter() - start)
+            results.append({
+                'entries': size,
+                'listed': len(items),
+                'min_s': round(min(timings), 4),
+                'median_s': round(statistics.median(timings), 4),
+            })
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AetherServe 目录列表基准测试。')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='要测试的目录条目数。默认为 1000 10000 100000。')
+    parser.add_argument('--repeat', type=int, default=3, help='每种大小重复测量的次数。默认为 3。')
+    parser.add_argument('--parallel-threshold', type=int, default=2000,
+                        help='LISTING_PARALLEL_THRESHOLD 的值，0 表示串行（应用的默认值）。默认为 2000。')
+    parser.add_argument('--trust-extensions', action='store_true', help='启用 MIME_TRUST_EXTENSIONS。')
+    parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果。')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.parallel_threshold, args.trust_extensions)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'条目数':>10} {'列出':>10} {'最短(s)':>10} {'中位数(s)':>10}")
+    for r in results:
+        print(f"{r['entries']:>10} {r['listed']:>10} {r['min_s']:>10} {r['median_s']:>10}")
+
+
+if __name__ == '__main__':
+    main()
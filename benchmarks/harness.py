@@ -0,0 +1,343 @@
+"""
+端到端基准测试：在确定性的合成文件树上驱动 browse、preview、search、download_file 和 serve_image。
+
+两种模式：
+- inprocess：通过 Flask 测试客户端在本进程内发送请求，测量应用本身的开销；
+- http：在本地启动 Gunicorn，通过真实的 HTTP 并发请求测量（包括 WSGI 服务器和网络栈）。
+
+输出每个场景的 p50 / p95 / p99 延迟、吞吐量以及峰值 RSS，可以保存为 JSON 在不同提交之间比较。
+
+在项目根目录下运行：
+
+    python -m benchmarks.harness --mode inprocess --requests 200
+    python -m benchmarks.harness --mode http --workers 4 --concurrency 16 --output after.json
+    python -m benchmarks.harness --mode http --app asgi:application \\
+        --worker-class uvicorn.workers.UvicornWorker --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from urllib.parse import quote
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.treegen import (BINARY_EXTENSIONS, IMAGE_EXTENSIONS, TEXT_EXTENSIONS, WORDS,  # noqa: E402
+                                add_spec_arguments, generate_tree, spec_from_args)
+
+SCENARIOS = ('browse', 'preview', 'search', 'download_file', 'serve_image')
+
+
+def _classify_existing_tree(root_dir):
+    """
+    按扩展名对已有目录中的文件分类，生成与 generate_tree 相同格式的清单。
+    """
+    manifest = {'dirs': [], 'text': [], 'image': [], 'binary': [], 'total_bytes': 0}
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        relative_dir = os.path.relpath(dirpath, root_dir).replace(os.sep, '/')
+        relative_dir = '' if relative_dir == '.' else relative_dir
+        manifest['dirs'].append(relative_dir)
+        for name in filenames:
+            extension = os.path.splitext(name)[1].lower()
+            kind = 'text' if extension in TEXT_EXTENSIONS else \
+                'image' if extension in IMAGE_EXTENSIONS + ('.jpg', '.jpeg', '.gif', '.webp') else \
+                'binary' if extension in BINARY_EXTENSIONS else None
+            if kind:
+                manifest[kind].append(f"{relative_dir}/{name}".lstrip('/'))
+    return manifest
+
+
+def build_requests(manifest, scenario, count, rng):
+    """
+    为场景生成 count 个确定性的请求 URL。清单中没有对应文件时返回空列表。
+    """
+    if scenario == 'browse':
+        pool = [f"/browse/{quote(path)}" if path else '/' for path in manifest['dirs']]
+    elif scenario == 'preview':
+        pool = [f"/preview/{quote(path)}" for path in manifest['text'] + manifest['image']]
+    elif scenario == 'search':
+        pool = [f"/search?query={quote(word)}" for word in WORDS]
+    elif scenario == 'download_file':
+        pool = [f"/download/{quote(path)}" for path in manifest['text'] + manifest['binary']]
+    else:
+        pool = [f"/serve_image/{quote(path)}" for path in manifest['image']]
+    if not pool:
+        return []
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def summarize(latencies, errors, total_bytes, elapsed):
+    """
+    计算延迟分位数（毫秒）和吞吐量。
+    """
+    result = {'requests': len(latencies), 'errors': errors, 'bytes': total_bytes}
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        result.update(
+            p50_ms=round(percentiles[49] * 1000, 3),
+            p95_ms=round(percentiles[94] * 1000, 3),
+            p99_ms=round(percentiles[98] * 1000, 3),
+            mean_ms=round(statistics.fmean(latencies) * 1000, 3),
+        )
+    result['throughput_rps'] = round(len(latencies) / elapsed, 2) if elapsed > 0 else None
+    return result
+
+
+def run_inprocess(urls_by_scenario, warmup):
+    """
+    使用 Flask 测试客户端依次发送请求。
+    """
+    from app import app
+    client = app.test_client()
+
+    def fetch(url):
+        response = client.get(url)
+        try:
+            return response.status_code, len(response.get_data())
+        finally:
+            response.close()
+
+    results = {}
+    for scenario, urls in urls_by_scenario.items():
+        for url in urls[:warmup]:
+            fetch(url)
+        latencies, errors, total_bytes = [], 0, 0
+        started = time.perf_counter()
+        for url in urls:
+            start = time.perf_counter()
+            status, size = fetch(url)
+            latencies.append(time.perf_counter() - start)
+            errors += status >= 400
+            total_bytes += size
+        results[scenario] = summarize(latencies, errors, total_bytes, time.perf_counter() - started)
+    # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = max_rss / 1024 / 1024 if sys.platform == 'darwin' else max_rss / 1024
+    return results, {'process_peak_rss_mb': round(peak_rss_mb, 1)}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _child_pids(parent_pid):
+    """
+    通过 /proc 查找子进程（Gunicorn worker），非 Linux 系统返回空列表。
+    """
+    children = []
+    try:
+        names = os.listdir('/proc')
+    except OSError:
+        return children
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # 第 4 个字段是 ppid；进程名可能包含空格，因此从最后一个 ')' 之后开始解析
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent_pid:
+            children.append(int(name))
+    return children
+
+
+def _peak_rss_mb(pid):
+    """
+    读取进程的峰值 RSS (VmHWM)，无法读取时返回 None。
+    """
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_http(urls_by_scenario, warmup, root_dir, cache_dir, args):
+    """
+    启动本地 Gunicorn，并使用 concurrency 个线程并发发送真实的 HTTP 请求。
+    """
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, FILE_SERVER_ROOT_DIR=root_dir, CACHE_DIR=cache_dir)
+    command = [sys.executable, '-m', 'gunicorn', args.app, '--workers', str(args.workers),
+               '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    if args.worker_class:
+        command += ['--worker-class', args.worker_class]
+    server = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env)
+
+    def fetch(url):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base_url + url, timeout=60) as response:
+                size = len(response.read())
+                status = response.status
+        except urllib.error.HTTPError as e:
+            size, status = len(e.read()), e.code
+        return time.perf_counter() - start, status, size
+
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(base_url + '/', timeout=2).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError('Gunicorn 未能启动')
+                time.sleep(0.2)
+
+        results = {}
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            for scenario, urls in urls_by_scenario.items():
+                list(executor.map(fetch, urls[:warmup]))
+                started = time.perf_counter()
+                samples = list(executor.map(fetch, urls))
+                elapsed = time.perf_counter() - started
+                results[scenario] = summarize(
+                    [latency for latency, _, _ in samples],
+                    sum(status >= 400 for _, status, _ in samples),
+                    sum(size for _, _, size in samples),
+                    elapsed,
+                )
+        worker_rss = [rss for pid in _child_pids(server.pid) if (rss := _peak_rss_mb(pid)) is not None]
+        memory = {
+            'worker_peak_rss_mb': round(max(worker_rss), 1) if worker_rss else None,
+            'workers_total_peak_rss_mb': round(sum(worker_rss), 1) if worker_rss else None,
+        }
+        return results, memory
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(report, baseline=None):
+    """
+    打印结果表格；提供 baseline 时同时打印 p50 / p95 相对基线的变化。
+    """
+    header = f"{'场景':<14} {'请求':>6} {'错误':>5} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'rps':>9}"
+    if baseline:
+        header += f" {'Δp50':>8} {'Δp95':>8}"
+    print(header)
+    for scenario, result in report['results'].items():
+        line = (f"{scenario:<14} {result['requests']:>6} {result['errors']:>5} {result.get('p50_ms', '-'):>9} "
+                f"{result.get('p95_ms', '-'):>9} {result.get('p99_ms', '-'):>9} {result['throughput_rps']:>9}")
+        base = (baseline or {}).get('results', {}).get(scenario)
+        if base:
+            for key in ('p50_ms', 'p95_ms'):
+                if result.get(key) and base.get(key):
+                    line += f" {(result[key] / base[key] - 1) * 100:>+7.1f}%"
+                else:
+                    line += f" {'-':>8}"
+        print(line)
+    print('内存:', ', '.join(f"{key}={value}" for key, value in report['memory'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AetherServe 端到端基准测试。')
+    parser.add_argument('--mode', choices=('inprocess', 'http'), default='inprocess',
+                        help='inprocess 使用 Flask 测试客户端，http 通过本地 Gunicorn。默认为 inprocess。')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help='要运行的场景。默认为全部。')
+    parser.add_argument('--requests', type=int, default=200, help='每个场景的请求数。默认为 200。')
+    parser.add_argument('--warmup', type=int, default=20, help='每个场景正式测量前的预热请求数。默认为 20。')
+    parser.add_argument('--tree', help='使用已有的目录代替生成的合成文件树（仍按扩展名分类文件）。')
+    parser.add_argument('--workers', type=int, default=4, help='http 模式下的 Gunicorn worker 数。默认为 4。')
+    parser.add_argument('--worker-class', help='http 模式下的 Gunicorn worker 类型，例如 gthread。')
+    parser.add_argument('--app', default='app:app',
+                        help='http 模式下的应用入口。默认为 app:app，异步模式使用 asgi:application。')
+    parser.add_argument('--concurrency', type=int, default=8, help='http 模式下的并发请求数。默认为 8。')
+    parser.add_argument('--output', help='把 JSON 结果写入该文件。')
+    parser.add_argument('--compare', help='与之前保存的 JSON 结果比较。')
+    parser.add_argument('--json', action='store_true', help='以 JSON 格式输出结果。')
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    spec = spec_from_args(args)
+    work_dir = tempfile.mkdtemp(prefix='aetherserve_bench_')
+    cache_dir = os.path.join(work_dir, 'cache')
+    try:
+        if args.tree:
+            root_dir = os.path.abspath(args.tree)
+            manifest = _classify_existing_tree(root_dir)
+        else:
+            root_dir = os.path.join(work_dir, 'tree')
+            manifest = generate_tree(root_dir, spec)
+        # 必须在导入 app 之前设置，Config 在导入时读取环境变量
+        os.environ['FILE_SERVER_ROOT_DIR'] = root_dir
+        os.environ['CACHE_DIR'] = cache_dir
+
+        rng = random.Random(spec.seed)
+        urls_by_scenario = {}
+        for scenario in args.scenarios:
+            urls = build_requests(manifest, scenario, args.requests, rng)
+            if urls:
+                urls_by_scenario[scenario] = urls
+
+        if args.mode == 'inprocess':
+            results, memory = run_inprocess(urls_by_scenario, args.warmup)
+        else:
+            results, memory = run_http(urls_by_scenario, args.warmup, root_dir, cache_dir, args)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'mode': args.mode,
+        'workers': args.workers if args.mode == 'http' else 1,
+        'worker_class': args.worker_class if args.mode == 'http' else None,
+        'concurrency': args.concurrency if args.mode == 'http' else 1,
+        'tree': args.tree or asdict(spec),
+        'files': {kind: len(manifest[kind]) for kind in ('dirs', 'text', 'image', 'binary')},
+        'results': results,
+        'memory': memory,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+
+
+if __name__ == '__main__':
+    main()
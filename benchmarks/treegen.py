@@ -0,0 +1,181 @@
+"""
+确定性的合成文件树生成器，供基准测试使用。
+
+相同的参数和随机种子总是生成完全相同的目录结构、文件名和文件内容，
+因此可以在不同提交之间比较基准测试结果。
+
+在项目根目录下运行：
+
+    python -m benchmarks.treegen /tmp/bench_tree --depth 3 --fanout 4 --files 50
+    python -m benchmarks.treegen /tmp/bench_tree --mix 6:2:2 --median-size 4096 --seed 7
+"""
+import argparse
+import json
+import math
+import os
+import random
+import struct
+import sys
+import zlib
+from dataclasses import asdict, dataclass
+
+# 文件名和文本内容使用的固定词表，便于构造能命中的搜索关键词
+WORDS = (
+    'alpha', 'bravo', 'config', 'delta', 'export', 'format', 'gateway', 'host', 'index', 'journal',
+    'kernel', 'lambda', 'module', 'network', 'option', 'proxy', 'query', 'report', 'server', 'token',
+    'upstream', 'vector', 'worker', 'yaml', 'zone', '数据', '报告', '配置',
+)
+TEXT_EXTENSIONS = ('.txt', '.conf', '.json', '.py', '.md', '.log', '.yaml')
+IMAGE_EXTENSIONS = ('.png',)
+BINARY_EXTENSIONS = ('.bin', '.dat')
+
+
+@dataclass
+class TreeSpec:
+    """
+    合成文件树的参数。
+    """
+    depth: int = 2  # 子目录层数（0 表示只有根目录）
+    fanout: int = 4  # 每个目录的子目录数
+    files_per_dir: int = 50  # 每个目录的文件数
+    median_size: int = 2048  # 文件大小的中位数（字节），大小服从对数正态分布
+    size_sigma: float = 1.5  # 对数正态分布的 sigma，越大尾部越长
+    max_size: int = 8 * 1024 * 1024  # 单个文件大小上限（字节）
+    mix: tuple = (6, 2, 2)  # 文本 : 图片 : 二进制 的权重
+    seed: int = 1
+
+
+def _png(width, height, rng):
+    """
+    生成一张有效的 RGB PNG 图片（不依赖 Pillow）。
+    """
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    color = bytes(rng.randrange(256) for _ in range(3))
+    row = b'\x00' + color * width
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(row * height)) + chunk(b'IEND', b''))
+
+
+def _text(size, rng):
+    """
+    生成约 size 字节、由词表组成的多行文本。
+    """
+    lines = []
+    total = 0
+    line_no = 0
+    while total < size:
+        line = f"{line_no:06d} " + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))) + '\n'
+        lines.append(line)
+        total += len(line.encode('utf-8'))
+        line_no += 1
+    return ''.join(lines)
+
+
+def _file_size(spec, rng):
+    size = int(rng.lognormvariate(math.log(spec.median_size), spec.size_sigma))
+    return max(1, min(size, spec.max_size))
+
+
+def generate_tree(root_dir, spec):
+    """
+    在 root_dir 下生成合成文件树，返回清单：
+    {'dirs': [...], 'text': [...], 'image': [...], 'binary': [...], 'total_bytes': N}，路径均为相对路径。
+    """
+    rng = random.Random(spec.seed)
+    manifest = {'dirs': [''], 'text': [], 'image': [], 'binary': [], 'total_bytes': 0}
+    kinds = ('text', 'image', 'binary')
+
+    def fill(relative_dir, level):
+        absolute_dir = os.path.join(root_dir, relative_dir)
+        os.makedirs(absolute_dir, exist_ok=True)
+        for i in range(spec.files_per_dir):
+            kind = rng.choices(kinds, weights=spec.mix)[0]
+            stem = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{level}_{i:05d}"
+            if kind == 'text':
+                name = stem + rng.choice(TEXT_EXTENSIONS)
+                data = _text(_file_size(spec, rng), rng).encode('utf-8')
+            elif kind == 'image':
+                name = stem + rng.choice(IMAGE_EXTENSIONS)
+                data = _png(rng.randint(16, 640), rng.randint(16, 480), rng)
+            else:
+                name = stem + rng.choice(BINARY_EXTENSIONS)
+                data = rng.randbytes(_file_size(spec, rng))
+            with open(os.path.join(absolute_dir, name), 'wb') as f:
+                f.write(data)
+            manifest[kind].append(f"{relative_dir}/{name}".lstrip('/'))
+            manifest['total_bytes'] += len(data)
+        if level >= spec.depth:
+            return
+        for i in range(spec.fanout):
+            child = f"{relative_dir}/{rng.choice(WORDS)}_dir_{level + 1}_{i:02d}".lstrip('/')
+            manifest['dirs'].append(child)
+            fill(child, level + 1)
+
+    fill('', 0)
+    return manifest
+
+
+def parse_mix(value):
+    """
+    解析 "文本:图片:二进制" 形式的权重，例如 "6:2:2"。
+    """
+    parts = tuple(float(part) for part in value.split(':'))
+    if len(parts) != 3 or any(part < 0 for part in parts) or not any(parts):
+        raise argparse.ArgumentTypeError('mix 必须是三个非负数，例如 6:2:2')
+    return parts
+
+
+def add_spec_arguments(parser):
+    """
+    向 argparse 解析器添加 TreeSpec 的参数（生成器和基准测试脚本共用）。
+    """
+    defaults = TreeSpec()
+    parser.add_argument('--depth', type=int, default=defaults.depth, help=f'子目录层数。默认为 {defaults.depth}。')
+    parser.add_argument('--fanout', type=int, default=defaults.fanout,
+                        help=f'每个目录的子目录数。默认为 {defaults.fanout}。')
+    parser.add_argument('--files', type=int, default=defaults.files_per_dir,
+                        help=f'每个目录的文件数。默认为 {defaults.files_per_dir}。')
+    parser.add_argument('--median-size', type=int, default=defaults.median_size,
+                        help=f'文件大小中位数（字节）。默认为 {defaults.median_size}。')
+    parser.add_argument('--size-sigma', type=float, default=defaults.size_sigma,
+                        help=f'文件大小对数正态分布的 sigma。默认为 {defaults.size_sigma}。')
+    parser.add_argument('--max-size', type=int, default=defaults.max_size,
+                        help=f'单个文件大小上限（字节）。默认为 {defaults.max_size}。')
+    parser.add_argument('--mix', type=parse_mix, default=defaults.mix,
+                        help='文本:图片:二进制 文件的比例。默认为 6:2:2。')
+    parser.add_argument('--seed', type=int, default=defaults.seed, help=f'随机种子。默认为 {defaults.seed}。')
+
+
+def spec_from_args(args):
+    return TreeSpec(
+        depth=args.depth, fanout=args.fanout, files_per_dir=args.files, median_size=args.median_size,
+        size_sigma=args.size_sigma, max_size=args.max_size, mix=tuple(args.mix), seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成确定性的合成文件树。')
+    parser.add_argument('dest', help='目标目录（必须不存在或为空）。')
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    if os.path.exists(args.dest) and os.listdir(args.dest):
+        parser.error(f'目标目录不为空: {args.dest}')
+    spec = spec_from_args(args)
+    manifest = generate_tree(args.dest, spec)
+    json.dump({
+        'spec': asdict(spec),
+        'dirs': len(manifest['dirs']),
+        'text': len(manifest['text']),
+        'image': len(manifest['image']),
+        'binary': len(manifest['binary']),
+        'total_bytes': manifest['total_bytes'],
+    }, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+
+if __name__ == '__main__':
+    main()
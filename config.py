@@ -6,6 +6,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def _parse_roots(value):
+    """
+    解析 FILE_SERVER_ROOTS，例如 "media=/mnt/media,backup=/mnt/backup"，返回 {名称: 绝对路径}（保持配置顺序）。
+    名称不能为空，也不能包含斜杠或以点开头，无效的条目会被忽略。
+    """
+    roots = {}
+    for item in value.split(','):
+        name, _, path = item.partition('=')
+        name, path = name.strip(), path.strip()
+        if not name and not path:
+            continue
+        if not name or not path or '/' in name or '\\' in name or name.startswith('.'):
+            print(f"忽略无效的 FILE_SERVER_ROOTS 条目: {item.strip()}")
+            continue
+        roots[name] = os.path.normpath(os.path.abspath(path))
+    return roots
+
+
 class Config:
     """
     AetherServe 应用的配置类。
@@ -21,10 +39,52 @@ class Config:
     _default_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'AetherServe_Files'))
     FILE_SERVER_ROOT_DIR = os.environ.get('FILE_SERVER_ROOT_DIR') or _default_root
 
+    # 多个命名根目录，例如 "media=/mnt/media,backup=/mnt/backup"，每个根目录可以位于不同的磁盘或挂载点。
+    # 配置后 FILE_SERVER_ROOT_DIR 不再使用：每个根目录以其名称作为虚拟顶层目录出现（/browse/media/...），
+    # 路径安全检查针对各自的根目录进行；全局搜索和元数据查询在线程池中并行查询所有根目录，结果边到达边合并。
+    # 留空则只服务 FILE_SERVER_ROOT_DIR。
+    FILE_SERVER_ROOTS = _parse_roots(os.environ.get('FILE_SERVER_ROOTS', ''))
+
+    # 缓存目录，用于存放搜索索引等可重建的持久化数据。
+    # 可通过 .env 中的 CACHE_DIR 覆盖，默认位于项目目录下的 'cache' 文件夹。
+    CACHE_DIR = os.environ.get('CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
     # 允许预览的最大文件大小（字节）。
     # 超过此大小的文本文件将只显示部分内容并提供下载选项。
     MAX_PREVIEW_FILE_SIZE = 5 * 1024 * 1024  # 5 MB
 
+    # 分块预览配置。
+    # 启用后，文本预览页只包含文件的第一块内容，其余部分在滚动时通过 /api/preview 按需加载，
+    # 因此可以预览任意大小的文件，而不受 MAX_PREVIEW_FILE_SIZE 限制。
+    # 此时 MAX_PREVIEW_FILE_SIZE 仅限制单次请求（例如“复制内容”）最多返回的字节数。
+    PREVIEW_CHUNKED = True
+    # 每块的字节数。
+    PREVIEW_CHUNK_SIZE = 256 * 1024  # 256 KB
+
+    # 日志文件预览配置。扩展名在该列表中的文本文件预览时默认显示末尾的 PREVIEW_TAIL_LINES 行（tail 模式），
+    # 从文件末尾向前读取，不扫描文件的其余部分。预览页可以在开头和末尾之间切换。
+    PREVIEW_TAIL_EXTENSIONS = ['.log']
+    PREVIEW_TAIL_LINES = 1000
+    # /api/preview 的 tail 参数允许的最大行数
+    PREVIEW_TAIL_MAX_LINES = 100000
+
+    # 日志实时跟随配置（/api/follow，Server-Sent Events）。
+    # 每个 worker 进程对同一文件只运行一个轮询线程，新追加的内容读入内存缓冲区后推送给所有跟随该文件的客户端。
+    # 每个跟随连接在整个连接期间占用一个线程：同步 Gunicorn worker 下会占用整个 worker，
+    # 几个浏览器标签页就能占满所有 worker，因此默认关闭，建议只在异步模式或 gthread worker 下启用。
+    # 启用准入控制时跟随连接与下载一样占用传输槽位（见 ADMISSION_TRANSFER_ENDPOINTS）。
+    PREVIEW_FOLLOW_ENABLED = os.environ.get('PREVIEW_FOLLOW_ENABLED', '').lower() in ('1', 'true', 'yes')
+    # 轮询文件大小的间隔（秒）
+    PREVIEW_FOLLOW_POLL_INTERVAL = 1.0
+    # 每个被跟随文件在内存中保留的最近追加内容（字节），落后更多的客户端直接从文件补读
+    PREVIEW_FOLLOW_BUFFER_BYTES = 1024 * 1024  # 1 MB
+    # 没有新内容时发送心跳的间隔（秒）
+    PREVIEW_FOLLOW_KEEPALIVE = 15
+    # 单个连接的最长时间（秒），到期后浏览器自动重连并从上次的位置继续
+    PREVIEW_FOLLOW_MAX_DURATION = 600
+    # 每个 worker 进程同时跟随的连接数上限，超过时返回 503
+    PREVIEW_FOLLOW_MAX_CLIENTS = 16
+
     # 可识别的文本文件扩展名列表，用于在线预览和语法高亮。
     # 此列表用作回退或初始过滤，但 python-magic 将用于更健壮的 MIME 类型检测。
     TEXT_FILE_EXTENSIONS = [
@@ -39,6 +99,13 @@ class Config:
         '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp', '.ico'
     ]
 
+    # 为 True 时，扩展名在上面两个列表中的文件直接按扩展名分类，完全跳过 libmagic 检测。
+    # 可大幅降低大目录的渲染开销，但扩展名与内容不符的文件会被误判。
+    MIME_TRUST_EXTENSIONS = os.environ.get('MIME_TRUST_EXTENSIONS', '').lower() in ('1', 'true', 'yes')
+
+    # MIME 类型缓存的最大条目数（每个 worker 进程一份），按 (inode, 大小, mtime) 缓存 libmagic 的检测结果。
+    MIME_CACHE_MAX_ENTRIES = 100000
+
     # 需要隐藏的文件或文件夹名称列表（支持通配符，如 '*.log' 或 'temp_*'）
     HIDDEN_ITEMS = [
         '.git',
@@ -62,7 +129,224 @@ class Config:
         'clash-config.y*',
     ]
 
-    if not os.path.exists(FILE_SERVER_ROOT_DIR):
+    # 目录列表缓存配置（每个 worker 进程一份，LRU 淘汰）。
+    # 缓存以目录的 inode 和 st_mtime_ns 校验，目录内容未变化时重复浏览只需一次 stat。
+    # 最多缓存的目录数量，设为 0 可禁用缓存。
+    LISTING_CACHE_MAX_ENTRIES = 256
+    # 缓存占用内存的估算上限（字节）。
+    LISTING_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 MB
+    # 缓存条目的最长有效期（秒）。修改已有文件不会改变目录的 mtime，
+    # 该有效期用于限制列表中文件大小和修改时间可能过期的时长。
+    LISTING_CACHE_TTL = 300
+
+    # 目录页渲染片段缓存配置（每个 worker 进程一份，LRU 淘汰）。
+    # 以目录的 ETag（inode、mtime、配置指纹和访问的主机）为键缓存首屏表格行的 HTML，目录未变化时跳过列表和渲染。
+    FRAGMENT_CACHE_MAX_ENTRIES = 256
+    FRAGMENT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 MB
+    # 与 LISTING_CACHE_TTL 相同，限制修改已有文件后列表中大小和修改时间的过期时长
+    FRAGMENT_CACHE_TTL = 300
+
+    # 大目录并行列表配置（实验性）。
+    # 目录项数量达到该阈值时，stat 和文件类型检测在线程池中并行执行。默认为 0（关闭）：单核本地磁盘上只快约 3%
+    # （见 benchmarks/bench_listing.py），针对的 NFS 等网络挂载尚未测量，测量确认有收益后再考虑默认启用。
+    LISTING_PARALLEL_THRESHOLD = int(os.environ.get('LISTING_PARALLEL_THRESHOLD', 0))
+    # 并行列表线程池的线程数（每个 worker 进程一份）。
+    LISTING_PARALLEL_WORKERS = 8
+
+    # 目录分页配置。浏览页首屏及 /api/list 每页默认返回的条目数，以及单页允许的最大条目数。
+    LISTING_PAGE_SIZE = 200
+    LISTING_PAGE_MAX_SIZE = 1000
+
+    # 文件发送卸载模式，用于让前端代理完成大文件的零拷贝发送，避免占用 Gunicorn worker。
+    # 'x-accel-redirect'：返回 X-Accel-Redirect 头，由 nginx 的 internal location 发送文件；
+    # 'x-sendfile'：返回 X-Sendfile 头（Apache mod_xsendfile / lighttpd）；
+    # 留空则由 Flask 自己发送文件。直接运行 app.py（run_server）时始终由 Flask 发送。
+    FILE_OFFLOAD_MODE = (os.environ.get('FILE_OFFLOAD_MODE') or '').lower()
+    # X-Accel-Redirect 模式下 nginx internal location 的 URL 前缀，该 location 应 alias 到 FILE_SERVER_ROOT_DIR。
+    # 配置了 FILE_SERVER_ROOTS 时，每个根目录需要一个 <前缀><名称>/ location，alias 到对应的根目录。
+    FILE_OFFLOAD_INTERNAL_PREFIX = os.environ.get('FILE_OFFLOAD_INTERNAL_PREFIX') or '/_protected_files/'
+    # Flask 内置的 X-Sendfile 支持
+    USE_X_SENDFILE = FILE_OFFLOAD_MODE == 'x-sendfile'
+
+    # 本地缓存层配置，适用于 FILE_SERVER_ROOT_DIR 位于 NFS/SMB 等网络挂载的部署。
+    # 启用后，频繁请求的文件（下载、图片和文本预览）被复制到本地磁盘（建议 SSD），之后直接从本地副本读取。
+    # 副本以源文件的 (inode, 大小, mtime) 校验，每次请求只需对源文件做一次 stat。
+    # 只在由 Flask 自己发送文件时生效，X-Accel-Redirect / X-Sendfile 模式下由前端代理读取源文件。
+    LOCAL_CACHE_ENABLED = os.environ.get('LOCAL_CACHE_ENABLED', '').lower() in ('1', 'true', 'yes')
+    LOCAL_CACHE_DIR = os.environ.get('LOCAL_CACHE_DIR') or os.path.join(CACHE_DIR, 'local')
+    # 本地副本的总容量上限，超过时删除最久未使用的副本。
+    LOCAL_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024  # 10 GB
+    # 超过该大小的文件不复制到本地
+    LOCAL_CACHE_MAX_FILE_SIZE = 512 * 1024 * 1024  # 512 MB
+    # 文件被请求多少次后才复制到本地（每个 worker 分别计数），避免只访问一次的文件挤掉热点文件。
+    LOCAL_CACHE_MIN_REQUESTS = 2
+    # 记录请求次数的文件数上限（每个 worker 进程一份，LRU 淘汰）
+    LOCAL_CACHE_MAX_TRACKED = 100000
+    # 复制文件的线程数（每个 worker 进程）。并发请求同一文件时只复制一次，多个 worker 之间通过文件锁互斥。
+    LOCAL_CACHE_FILL_WORKERS = 4
+    # 请求等待复制完成的最长时间（秒），超时后本次直接读取源文件，复制在后台继续完成。
+    LOCAL_CACHE_FILL_WAIT = 2
+
+    # 浏览、预览和搜索页面的 Cache-Control max-age（秒）。
+    # 页面带有弱 ETag 和 Last-Modified，过期后客户端或 nginx 微缓存可通过条件请求获得 304。
+    HTML_CACHE_MAX_AGE = 5
+
+    # 响应压缩配置（gzip 始终可用；安装 brotli / zstandard 后额外支持 br / zstd）。
+    # 文本文件下载优先使用同目录下的预压缩文件（.br / .zst / .gz），否则边压缩边发送并写入磁盘变体缓存；
+    # HTML 和 JSON 响应在内存中压缩。图片和已压缩的归档永远不会被压缩。
+    COMPRESSION_ENABLED = True
+    # 小于该字节数的内容不压缩。
+    COMPRESSION_MIN_SIZE = 1024
+    # 大于该字节数的文件不做动态压缩（预压缩文件不受此限制）。
+    COMPRESSION_MAX_FILE_SIZE = 512 * 1024 * 1024  # 512 MB
+    # 压缩变体缓存目录及其容量上限，超过上限时删除最久未使用的变体。
+    COMPRESSION_CACHE_DIR = os.path.join(CACHE_DIR, 'variants')
+    COMPRESSION_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+
+    # 缩略图配置（需要安装可选依赖 Pillow，未安装时页面直接显示原图）。
+    # 缩略图在首次请求时由进程池惰性生成，保存在以源文件 (inode, 大小, mtime) 为键的磁盘缓存中。
+    THUMBNAIL_ENABLED = True
+    # 可用的缩略图尺寸（最长边像素）。列表页使用最小的尺寸，图片预览页使用最大的尺寸。
+    THUMBNAIL_SIZES = [96, 480, 1280]
+    THUMBNAIL_CACHE_DIR = os.path.join(CACHE_DIR, 'thumbnails')
+    # 缩略图缓存容量上限，超过时删除最久未使用的缩略图。
+    THUMBNAIL_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+    # 生成缩略图的进程数（每个 worker 进程一个进程池）。
+    THUMBNAIL_WORKERS = 2
+    # 等待缩略图生成的最长时间（秒），超时后回退到原图。
+    THUMBNAIL_TIMEOUT = 30
+    # 缩略图响应的 Cache-Control max-age（秒）。
+    THUMBNAIL_MAX_AGE = 3600
+    # 允许解码的最大源图片像素数，防止解压炸弹。
+    THUMBNAIL_MAX_SOURCE_PIXELS = 100 * 1000 * 1000
+
+    # 目录打包下载配置（/archive/<目录>.zip、.tar，安装 zstandard 后还支持 .tar.zst）。
+    # 归档以流的形式边读边发送，不产生临时文件。单个归档允许的最大文件数和最大总字节数（压缩前），超过时返回 413。
+    ARCHIVE_MAX_FILES = 10000
+    ARCHIVE_MAX_BYTES = 4 * 1024 * 1024 * 1024  # 4 GB
+    # 打包时读取文件的块大小
+    ARCHIVE_CHUNK_SIZE = 256 * 1024  # 256 KB
+
+    # asyncio (ASGI) 服务模式配置（asgi.py / app.py --async）。
+    # 执行 Flask 视图的线程数，以及按块读取响应体的线程数（每个 worker 进程）。
+    ASYNC_REQUEST_WORKERS = 16
+    ASYNC_STREAM_WORKERS = 32
+    # 异步模式下发送文件时每次读取的块大小
+    ASYNC_CHUNK_SIZE = 256 * 1024  # 256 KB
+
+    # Prometheus 指标配置（/metrics）。
+    METRICS_ENABLED = True
+    # 每个 worker 定期把自己的指标快照写入该目录，/metrics 汇总所有 worker 的快照。
+    # 多个 worker 必须使用同一目录；建议在重启服务前清空该目录。
+    METRICS_DIR = os.path.join(CACHE_DIR, 'metrics')
+    # 快照写入间隔（秒），其他 worker 的指标最多滞后这么久
+    METRICS_FLUSH_INTERVAL = 5
+
+    # 请求剖析配置（默认关闭，可在 .env 中设置 PROFILING_ENABLED=true 开启）。
+    # 开启后每个请求在 TIMING_LOG_FILE 中写一行 JSON，包含总耗时、发送字节数以及路径解析、列目录、
+    # MIME 检测、模板渲染等各阶段的累计耗时。设为空字符串可只保留剖析文件。
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    TIMING_LOG_FILE = os.environ.get('TIMING_LOG_FILE', os.path.join(CACHE_DIR, 'timing.log'))
+    # 在应用代码中花费的时间（不包括等待客户端接收数据）超过该秒数的请求保存采样得到的调用栈
+    # （flame graph 折叠格式），设为 0 禁用栈采样
+    PROFILE_SLOW_THRESHOLD = 1.0
+    # 按设计长时间保持连接的路由（实时跟随），不保存剖析文件。路由名由 Prometheus 指标记录，需要启用 METRICS_ENABLED。
+    PROFILE_EXEMPT_ENDPOINTS = ['api_follow']
+    # 栈采样间隔（秒）
+    PROFILE_SAMPLE_INTERVAL = 0.01
+    # 随机抽取该比例的请求保存完整的 cProfile 数据（开销较大，建议保持很小），设为 0 禁用
+    PROFILE_SAMPLE_RATE = 0.001
+    # 剖析文件的保存目录，只保留最新的 PROFILE_MAX_FILES 个文件
+    PROFILE_DIR = os.path.join(CACHE_DIR, 'profiles')
+    PROFILE_MAX_FILES = 200
+
+    # 准入控制和限速配置。并发槽位和令牌桶保存在 ADMISSION_DIR 下并通过文件锁在所有 worker 之间共享，
+    # 需要类 Unix 系统的 fcntl。被拒绝的请求返回 429 和 Retry-After。
+    ADMISSION_ENABLED = True
+    ADMISSION_DIR = os.path.join(CACHE_DIR, 'admission')
+    # 按下载处理的路由（包括长时间保持连接的日志实时跟随）。这些路由在整个响应发送完毕之前占用一个客户端槽位，
+    # 设置了 ADMISSION_MAX_TRANSFERS 时还占用一个全局槽位。
+    ADMISSION_TRANSFER_ENDPOINTS = ['download_file', 'download_archive', 'api_follow']
+    # 所有客户端同时进行的下载数上限，设为 0 不限制（默认）。同步 Gunicorn 模式下建议设为小于 worker 数的值，
+    # 剩余的 worker 保留给浏览、预览和搜索；异步模式和 FILE_OFFLOAD_MODE 下下载不占用 worker，通常不需要设置。
+    ADMISSION_MAX_TRANSFERS = int(os.environ.get('ADMISSION_MAX_TRANSFERS', 0))
+    # 单个客户端同时进行的下载数上限
+    ADMISSION_MAX_TRANSFERS_PER_CLIENT = 2
+    # 单个客户端的请求速率（请求/秒）和允许的突发请求数，设为 0 禁用速率限制
+    ADMISSION_REQUESTS_PER_SECOND = 20
+    ADMISSION_REQUEST_BURST = 60
+    # 不计入请求速率的路由（静态资源和列表中的缩略图会在一次页面加载中产生大量请求）
+    ADMISSION_RATE_EXEMPT_ENDPOINTS = ['static', 'thumbnail']
+    # 下载槽位已满时建议客户端等待的秒数
+    ADMISSION_RETRY_AFTER = 5
+    # 请求带有该头且令牌在 ADMISSION_TOKENS 中时按令牌而不是 IP 区分客户端
+    ADMISSION_TOKEN_HEADER = 'X-AetherServe-Token'
+    # 允许使用的令牌（环境变量中以逗号分隔），默认为空，即忽略令牌头、始终按 IP 区分。
+    # 未列出的令牌不会生效，否则客户端每次换一个令牌就能绕过速率和并发限制。
+    ADMISSION_TOKENS = [
+        token.strip() for token in os.environ.get('ADMISSION_TOKENS', '').split(',') if token.strip()
+    ]
+    # 前面的反向代理层数。大于 0 时从 X-Forwarded-For 中取真实的客户端 IP，否则使用连接的对端地址。
+    ADMISSION_TRUSTED_PROXIES = 0
+    # 每个下载连接的带宽上限（字节/秒），设为 0 不限速。限速时文件不再通过 sendfile 发送。
+    DOWNLOAD_BANDWIDTH_LIMIT = 0
+
+    # 文件名搜索索引配置。
+    # 启用后，/search 将从持久化的三元组（trigram）索引中回答子串查询，而不是每次都遍历整个目录树。
+    SEARCH_INDEX_ENABLED = True
+    # 索引文件的保存路径，多个 Gunicorn worker 共享同一份索引文件。
+    SEARCH_INDEX_FILE = os.path.join(CACHE_DIR, 'search_index.pickle')
+    # 后台增量重扫的间隔（秒）。重扫只会重新列出 mtime 发生变化的目录。
+    SEARCH_INDEX_REFRESH_INTERVAL = 60
+
+    # 全文（文件内容）搜索索引配置。
+    # 索引只包含文本文件，按 (inode, 大小, mtime) 增量更新，文件内容压缩后保存在索引中，查询时不读取原文件。
+    CONTENT_INDEX_ENABLED = True
+    CONTENT_INDEX_FILE = os.path.join(CACHE_DIR, 'content_index.pickle')
+    # 超过该大小的文件不建立全文索引
+    CONTENT_INDEX_MAX_FILE_SIZE = 1 * 1024 * 1024  # 1 MB
+    CONTENT_INDEX_REFRESH_INTERVAL = 60
+    # 全文搜索结果中每个文件显示的匹配行数
+    CONTENT_SEARCH_SNIPPETS_PER_FILE = 5
+
+    # 搜索分页配置。/search 和 /api/search 每页默认返回的结果数，以及单页允许的最大结果数。
+    # 结果边找边发送给客户端，一页填满后立即停止遍历。
+    SEARCH_PAGE_SIZE = 100
+    SEARCH_PAGE_MAX_SIZE = 1000
+    # 单次搜索请求的时间预算（秒）。超时后返回已找到的部分结果，并附带从中断处继续的游标。
+    SEARCH_TIME_BUDGET = 3.0
+    # 多根目录模式下每个根目录的搜索时间预算（秒）。超时的根目录本页只返回已找到的结果，
+    # 下一页从它停下的位置继续，较慢的磁盘不会拖住其他根目录的结果。
+    SEARCH_ROOT_TIME_BUDGET = 2.0
+    # 元数据查询时等待每个根目录的时间（秒），超时的根目录不计入本次结果，响应中标记为 partial。
+    QUERY_ROOT_TIME_BUDGET = 2.0
+    # 并行查询各个根目录的线程数（每个 worker 进程）
+    ROOT_FANOUT_WORKERS = 8
+
+    # 列式元数据快照配置（需要安装可选依赖 NumPy）。
+    # 启用后，/api/query 在内存中的列式快照上按大小、修改时间、扩展名和深度过滤并排序，不需要遍历目录树。
+    METADATA_INDEX_ENABLED = True
+    METADATA_INDEX_FILE = os.path.join(CACHE_DIR, 'metadata_index.pickle')
+    # 后台重扫的间隔（秒）。文件大小变化不会改变目录的 mtime，每次重扫都会 stat 所有条目。
+    METADATA_INDEX_REFRESH_INTERVAL = 300
+    # /api/query 每次默认返回的条目数，以及允许的最大条目数
+    QUERY_PAGE_SIZE = 100
+    QUERY_MAX_LIMIT = 10000
+
+    # 镜像同步清单配置（/api/manifest）。
+    # 后台重扫按 (inode, 大小, mtime_ns) 检测变化，变化文件的 SHA-256 在线程池中计算并持久化。
+    MANIFEST_ENABLED = True
+    MANIFEST_INDEX_FILE = os.path.join(CACHE_DIR, 'manifest_index.pickle')
+    MANIFEST_REFRESH_INTERVAL = 300
+    # 计算哈希的线程数（只在负责重扫的 worker 中运行）
+    MANIFEST_HASH_WORKERS = 4
+    # 计算大量哈希期间，每隔多少秒保存一次进度，使其他 worker 和镜像能看到已完成的哈希
+    MANIFEST_SAVE_INTERVAL = 30
+    # 删除记录的保留时间（秒）。镜像超过该时间没有同步时需要重新获取完整清单。
+    MANIFEST_TOMBSTONE_MAX_AGE = 30 * 24 * 3600  # 30 天
+
+    # 多根目录通常是各自的挂载点，不自动创建，避免在未挂载时把文件写到系统盘上
+    if not FILE_SERVER_ROOTS and not os.path.exists(FILE_SERVER_ROOT_DIR):
         try:
             os.makedirs(FILE_SERVER_ROOT_DIR)
             print(f"创建 FILE_SERVER_ROOT_DIR: {FILE_SERVER_ROOT_DIR}")
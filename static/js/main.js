@@ -39,33 +39,224 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // 绑定所有“复制”按钮的点击事件
     // 注意：类名从 copy-path-btn 更改为 copy-link-btn
-    document.querySelectorAll('.copy-link-btn').forEach(button => {
-        button.addEventListener('click', function() {
-            const fullUrlToCopy = this.getAttribute('data-copy-url');
+    // 使用事件委托，使滚动加载的新行同样生效
+    document.addEventListener('click', function(event) {
+        const button = event.target.closest('.copy-link-btn');
+        if (button) {
+            const fullUrlToCopy = button.getAttribute('data-copy-url');
             copyToClipboard(fullUrlToCopy);
-        });
+        }
     });
 
-    // 实时搜索当前目录功能
-    const fileSearchInput = document.getElementById('fileSearchInput');
-    if (fileSearchInput) {
-        fileSearchInput.addEventListener('keyup', function() {
-            const filter = this.value.toLowerCase();
-            const table = document.getElementById('fileTable');
-            const tr = table.getElementsByTagName('tr');
-
-            for (let i = 1; i < tr.length; i++) { // 从第二行开始（跳过表头）
-                const td = tr[i].getElementsByTagName('td')[0]; // 获取名称列
-                if (td) {
-                    const textValue = td.textContent || td.innerText;
-                    if (textValue.toLowerCase().indexOf(filter) > -1) {
-                        tr[i].style.display = "";
-                    } else {
-                        tr[i].style.display = "none";
+    // 创建带图标的元素，例如 <i class="fas fa-folder me-2"></i>名称
+    function createIconElement(tagName, className, iconClass, text) {
+        const el = document.createElement(tagName);
+        if (className) {
+            el.className = className;
+        }
+        const icon = document.createElement('i');
+        icon.className = iconClass;
+        el.appendChild(icon);
+        el.appendChild(document.createTextNode(text));
+        return el;
+    }
+
+    // 与模板中的 (size / 1024 / 1024) | round(2) 显示一致
+    function formatSize(size) {
+        const mb = Math.round(size / 1024 / 1024 * 100) / 100;
+        return (Number.isInteger(mb) ? mb.toFixed(1) : String(mb)) + ' MB';
+    }
+
+    // 根据 /api/list 返回的条目构建表格行，结构与 index.html 中的模板保持一致
+    function buildFileRow(item) {
+        const tr = document.createElement('tr');
+        tr.setAttribute('data-name', item.name.toLowerCase());
+
+        const nameTd = document.createElement('td');
+        if (item.is_dir) {
+            const link = createIconElement('a', 'text-decoration-none text-primary', 'fas fa-folder me-2', item.name);
+            link.href = item.url;
+            nameTd.appendChild(link);
+        } else if (item.thumb_url) {
+            const link = document.createElement('a');
+            link.className = 'text-decoration-none text-dark';
+            link.href = item.url;
+            const thumb = document.createElement('img');
+            thumb.src = item.thumb_url;
+            thumb.className = 'list-thumb me-2';
+            thumb.loading = 'lazy';
+            thumb.alt = '';
+            link.appendChild(thumb);
+            link.appendChild(document.createTextNode(item.name));
+            nameTd.appendChild(link);
+        } else if (item.is_text || item.is_image) {
+            const link = createIconElement('a', 'text-decoration-none text-dark',
+                'fas fa-' + (item.is_text ? 'file-alt' : 'image') + ' me-2', item.name);
+            link.href = item.url;
+            nameTd.appendChild(link);
+        } else {
+            nameTd.appendChild(createIconElement('span', 'text-dark', 'fas fa-file me-2', item.name));
+        }
+        tr.appendChild(nameTd);
+
+        const typeTd = document.createElement('td');
+        typeTd.className = 't-type';
+        const badge = document.createElement('span');
+        if (item.is_dir) {
+            badge.className = 'badge bg-primary';
+            badge.textContent = '文件夹';
+        } else if (item.is_text) {
+            badge.className = 'badge bg-info';
+            badge.textContent = '文本文件';
+        } else if (item.is_image) {
+            badge.className = 'badge bg-success';
+            badge.textContent = '图片文件';
+        } else {
+            badge.className = 'badge bg-secondary';
+            badge.textContent = '其他文件';
+        }
+        typeTd.appendChild(badge);
+        tr.appendChild(typeTd);
+
+        const sizeTd = document.createElement('td');
+        sizeTd.className = 't-time';
+        sizeTd.textContent = item.is_dir ? '--' : formatSize(item.size);
+        tr.appendChild(sizeTd);
+
+        const timeTd = document.createElement('td');
+        timeTd.className = 't-time';
+        timeTd.textContent = item.modified_time;
+        tr.appendChild(timeTd);
+
+        const optTd = document.createElement('td');
+        optTd.className = 't-opt';
+        const copyBtn = createIconElement('button', 'btn btn-sm btn-outline-info copy-link-btn',
+            'fas fa-copy me-1', '复制');
+        copyBtn.setAttribute('data-copy-url', item.full_url);
+        optTd.appendChild(copyBtn);
+        if (!item.is_dir) {
+            const downloadLink = createIconElement('a', 'btn btn-sm btn-outline-success ms-2',
+                'fas fa-download me-1', '下载');
+            downloadLink.href = item.download_url;
+            optTd.appendChild(downloadLink);
+        }
+        tr.appendChild(optTd);
+        return tr;
+    }
+
+    // 目录列表按需加载：滚动到底部时通过 /api/list 获取下一页
+    const fileTable = document.getElementById('fileTable');
+    const fileTableSentinel = document.getElementById('fileTableSentinel');
+    if (fileTable && fileTableSentinel && fileTable.dataset.apiUrl) {
+        const tbody = fileTable.querySelector('tbody');
+        const totalEl = document.getElementById('fileTableTotal');
+        let nextCursor = fileTable.dataset.nextCursor || null;
+        let currentFilter = '';
+        let loading = false;
+        let requestSeq = 0;
+        const observerSupported = 'IntersectionObserver' in window;
+
+        function setSentinel(hasMore) {
+            fileTableSentinel.innerHTML = hasMore ? '<i class="fas fa-spinner fa-spin me-1"></i>加载中...' : '';
+        }
+
+        function showMessageRow(message) {
+            const tr = document.createElement('tr');
+            tr.className = 'empty-row';
+            const td = document.createElement('td');
+            td.colSpan = 5;
+            td.className = 'text-center text-muted';
+            td.textContent = message;
+            tr.appendChild(td);
+            tbody.appendChild(tr);
+        }
+
+        // 加载一页数据；reset 为 true 时清空表格并从第一页开始（用于过滤）
+        function loadPage(reset) {
+            if (loading && !reset) {
+                return;
+            }
+            if (!reset && !nextCursor) {
+                return;
+            }
+            loading = true;
+            const seq = ++requestSeq;
+            const params = new URLSearchParams();
+            if (!reset && nextCursor) {
+                params.set('cursor', nextCursor);
+            }
+            if (currentFilter) {
+                params.set('filter', currentFilter);
+            }
+            fetch(fileTable.dataset.apiUrl + '?' + params.toString(), {headers: {'Accept': 'application/json'}})
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('HTTP ' + response.status);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    if (seq !== requestSeq) {
+                        return; // 已有更新的请求（例如过滤条件改变），丢弃旧结果
+                    }
+                    if (reset) {
+                        tbody.innerHTML = '';
                     }
+                    const fragment = document.createDocumentFragment();
+                    data.items.forEach(item => fragment.appendChild(buildFileRow(item)));
+                    tbody.appendChild(fragment);
+                    if (data.total === 0) {
+                        showMessageRow(currentFilter ? '没有匹配的项目。' : '此目录为空。');
+                    }
+                    if (totalEl) {
+                        totalEl.textContent = '共 ' + data.total + ' 项';
+                    }
+                    nextCursor = data.next_cursor;
+                    setSentinel(!!nextCursor);
+                })
+                .catch(err => {
+                    console.error('加载目录列表失败: ', err);
+                    fileTableSentinel.textContent = '加载失败，请刷新页面重试。';
+                })
+                .finally(() => {
+                    if (seq === requestSeq) {
+                        loading = false;
+                        // 如果加载后哨兵仍在可视区域内（或浏览器不支持 IntersectionObserver），继续加载下一页
+                        if (nextCursor && (!observerSupported ||
+                            fileTableSentinel.getBoundingClientRect().top < window.innerHeight)) {
+                            loadPage(false);
+                        }
+                    }
+                });
+        }
+
+        if (observerSupported) {
+            const observer = new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    loadPage(false);
                 }
-            }
-        });
+            }, {rootMargin: '400px'});
+            observer.observe(fileTableSentinel);
+        } else {
+            // 不支持 IntersectionObserver 的浏览器依次加载全部
+            loadPage(false);
+        }
+
+        // 当前目录搜索：由服务端按名称过滤，避免遍历尚未加载的行
+        const fileSearchInput = document.getElementById('fileSearchInput');
+        if (fileSearchInput) {
+            let filterTimer = null;
+            fileSearchInput.addEventListener('input', function() {
+                clearTimeout(filterTimer);
+                const value = this.value.trim();
+                filterTimer = setTimeout(() => {
+                    if (value !== currentFilter) {
+                        currentFilter = value;
+                        loadPage(true);
+                    }
+                }, 250);
+            });
+        }
     }
 
     // 如果在预览页面，确保 Prism.js 高亮代码
@@ -74,12 +265,144 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // 预览页面复制内容按钮事件 (如果存在)
+    // 内容不再嵌入页面属性中，点击时从预览接口获取原始数据
     const copyContentBtn = document.getElementById('copyContentBtn');
     if (copyContentBtn) {
         copyContentBtn.addEventListener('click', function() {
-            // 获取 data-content 属性的值
-            const contentToCopy = this.getAttribute('data-content');
-            copyToClipboard(contentToCopy);
+            fetch(this.getAttribute('data-content-url'))
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('HTTP ' + response.status);
+                    }
+                    return response.text();
+                })
+                .then(text => {
+                    // 异步获取后 execCommand 可能因失去用户手势而失败，优先使用 Clipboard API
+                    if (navigator.clipboard && window.isSecureContext) {
+                        return navigator.clipboard.writeText(text).then(() => showToast('已复制到剪贴板！'));
+                    }
+                    copyToClipboard(text);
+                })
+                .catch(err => console.error('无法复制文本: ', err));
+        });
+    }
+
+    // 分块预览：滚动到底部时通过 /api/preview 加载下一块内容
+    const previewContent = document.getElementById('previewContent');
+    const previewSentinel = document.getElementById('previewSentinel');
+    if (previewContent && previewSentinel && previewContent.dataset.chunkUrl) {
+        let nextOffset = parseInt(previewContent.dataset.nextOffset, 10);
+        const fileSize = parseInt(previewContent.dataset.fileSize, 10);
+        let loadingChunk = false;
+
+        function loadNextChunk() {
+            if (loadingChunk || nextOffset >= fileSize) {
+                return;
+            }
+            loadingChunk = true;
+            fetch(previewContent.dataset.chunkUrl + '?offset=' + nextOffset)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('HTTP ' + response.status);
+                    }
+                    nextOffset = parseInt(response.headers.get('X-Preview-Next-Offset'), 10);
+                    return response.text();
+                })
+                .then(text => {
+                    // 每块使用独立的 <code> 元素，只高亮新加载的部分
+                    const code = document.createElement('code');
+                    code.className = previewContent.dataset.language;
+                    code.textContent = text;
+                    previewContent.appendChild(code);
+                    Prism.highlightElement(code);
+                    if (nextOffset >= fileSize) {
+                        previewSentinel.remove();
+                    }
+                })
+                .catch(err => {
+                    console.error('加载预览内容失败: ', err);
+                    previewSentinel.textContent = '加载失败，请刷新页面重试。';
+                    nextOffset = fileSize;
+                })
+                .finally(() => {
+                    loadingChunk = false;
+                    // 如果新内容较短、哨兵仍在可视区域附近，继续加载下一块
+                    if (nextOffset < fileSize &&
+                        previewSentinel.getBoundingClientRect().top < window.innerHeight + 800) {
+                        loadNextChunk();
+                    }
+                });
+        }
+
+        if ('IntersectionObserver' in window) {
+            new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    loadNextChunk();
+                }
+            }, {rootMargin: '800px'}).observe(previewSentinel);
+        } else {
+            window.addEventListener('scroll', function() {
+                if (previewSentinel.getBoundingClientRect().top < window.innerHeight + 800) {
+                    loadNextChunk();
+                }
+            });
+        }
+    }
+
+    // 日志 tail 模式的实时跟随：通过 /api/follow（Server-Sent Events）接收新追加的内容
+    const followBtn = document.getElementById('followBtn');
+    if (previewContent && followBtn && window.EventSource) {
+        let source = null;
+        let followOffset = followBtn.dataset.followOffset;
+
+        function appendPreviewText(text) {
+            // 追加前如果已滚动到底部，追加后继续停留在底部
+            const atBottom = window.innerHeight + window.scrollY >= document.body.scrollHeight - 40;
+            const code = document.createElement('code');
+            code.className = previewContent.dataset.language;
+            code.textContent = text;
+            previewContent.appendChild(code);
+            Prism.highlightElement(code);
+            if (atBottom) {
+                window.scrollTo(0, document.body.scrollHeight);
+            }
+        }
+
+        function setFollowing(following) {
+            followBtn.innerHTML = following
+                ? '<i class="fas fa-pause me-1"></i>停止跟随'
+                : '<i class="fas fa-play me-1"></i>实时跟随';
+            followBtn.classList.toggle('btn-outline-primary', !following);
+            followBtn.classList.toggle('btn-primary', following);
+        }
+
+        followBtn.addEventListener('click', function() {
+            if (source) {
+                source.close();
+                source = null;
+                setFollowing(false);
+                return;
+            }
+            // EventSource 断线后会带着 Last-Event-ID 自动重连，从上次的位置继续
+            source = new EventSource(followBtn.dataset.followUrl + '?offset=' + followOffset);
+            source.onmessage = event => {
+                appendPreviewText(JSON.parse(event.data).text);
+                // 事件 ID 为 "<inode>-<偏移>"，停止后再次跟随时从该位置继续
+                followOffset = event.lastEventId.split('-')[1];
+            };
+            source.addEventListener('reset', () => {
+                appendPreviewText('\n--- 文件已被截断或轮转，从头开始显示 ---\n');
+                followOffset = 0;
+            });
+            source.onerror = () => {
+                // 连接被拒绝（例如 429 或 503）时浏览器不会重连，恢复按钮状态
+                if (source && source.readyState === EventSource.CLOSED) {
+                    source = null;
+                    setFollowing(false);
+                }
+            };
+            setFollowing(true);
+            window.scrollTo(0, document.body.scrollHeight);
         });
     }
 });
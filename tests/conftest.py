@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 在导入应用之前把所有缓存目录指向临时目录，测试不会写入项目目录下的 cache
+_SESSION_DIR = tempfile.mkdtemp(prefix='aetherserve-tests-')
+os.environ['CACHE_DIR'] = os.path.join(_SESSION_DIR, 'cache')
+os.environ['FILE_SERVER_ROOT_DIR'] = os.path.join(_SESSION_DIR, 'root')
+os.environ.pop('FILE_SERVER_ROOTS', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+
+
+@pytest.fixture
+def root(tmp_path):
+    path = tmp_path / 'root'
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def app(root, tmp_path, monkeypatch):
+    """
+    每个测试使用独立的根目录和缓存目录。后台维护线程只在测试显式启用对应功能时启动。
+    """
+    cache = tmp_path / 'cache'
+    overrides = {
+        'TESTING': True,
+        'FILE_SERVER_ROOT_DIR': str(root),
+        'FILE_SERVER_ROOTS': {},
+        'SEARCH_INDEX_ENABLED': False,
+        'CONTENT_INDEX_ENABLED': False,
+        'METADATA_INDEX_ENABLED': False,
+        'MANIFEST_ENABLED': False,
+        'ADMISSION_ENABLED': False,
+        'LOCAL_CACHE_ENABLED': False,
+        'COMPRESSION_CACHE_DIR': str(cache / 'variants'),
+        'THUMBNAIL_CACHE_DIR': str(cache / 'thumbnails'),
+        'SEARCH_INDEX_FILE': str(cache / 'search_index.pickle'),
+        'CONTENT_INDEX_FILE': str(cache / 'content_index.pickle'),
+        'METADATA_INDEX_FILE': str(cache / 'metadata_index.pickle'),
+        'MANIFEST_INDEX_FILE': str(cache / 'manifest_index.pickle'),
+    }
+    for key, value in overrides.items():
+        monkeypatch.setitem(flask_app.config, key, value)
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
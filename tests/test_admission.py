@@ -0,0 +1,78 @@
+import pytest
+from flask import request
+
+from config import Config
+from utils import admission
+
+
+@pytest.fixture
+def admission_app(app, tmp_path, monkeypatch):
+    for key, value in {
+        'ADMISSION_ENABLED': True,
+        'ADMISSION_DIR': str(tmp_path / 'admission'),
+        'ADMISSION_TOKENS': ['team-a'],
+        'ADMISSION_REQUESTS_PER_SECOND': 0.001,
+        'ADMISSION_REQUEST_BURST': 1,
+    }.items():
+        monkeypatch.setitem(app.config, key, value)
+    return app
+
+
+def _client_key(app, **headers):
+    with app.test_request_context('/', headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        return admission.client_key(request)
+
+
+def test_only_listed_tokens_identify_clients(admission_app):
+    assert _client_key(admission_app) == 'ip:10.0.0.7'
+    assert _client_key(admission_app, **{'X-AetherServe-Token': 'team-a'}) == 'token:team-a'
+    assert _client_key(admission_app, **{'X-AetherServe-Token': 'random-123'}) == 'ip:10.0.0.7'
+
+
+def test_rotating_tokens_do_not_bypass_rate_limit(admission_app, root):
+    (root / 'docs').mkdir()
+    client = admission_app.test_client()
+    assert client.get('/browse/docs', headers={'X-AetherServe-Token': 'r1'}).status_code == 200
+    assert client.get('/browse/docs', headers={'X-AetherServe-Token': 'r2'}).status_code == 429
+
+
+def _admit_download(app, address):
+    with app.test_request_context('/download/a.bin', environ_base={'REMOTE_ADDR': address}):
+        assert request.endpoint == 'download_file'
+        admission.admit(request)
+        return request.environ[admission.SLOTS_ENVIRON_KEY]
+
+
+def test_global_transfer_cap_is_off_by_default(admission_app, monkeypatch):
+    monkeypatch.setitem(admission_app.config, 'ADMISSION_REQUESTS_PER_SECOND', 0)
+    assert Config.ADMISSION_MAX_TRANSFERS == 0 and Config.ADMISSION_TOKENS == []
+    monkeypatch.setitem(admission_app.config, 'ADMISSION_MAX_TRANSFERS', 0)
+    held = [_admit_download(admission_app, f"10.0.0.{i}") for i in range(6)]
+    assert all(len(slots) == 1 for slots in held)
+
+    monkeypatch.setitem(admission_app.config, 'ADMISSION_MAX_TRANSFERS', 2)
+    held += [_admit_download(admission_app, f"10.0.1.{i}") for i in range(2)]
+    with pytest.raises(admission.Rejected) as rejected:
+        _admit_download(admission_app, '10.0.1.9')
+    assert rejected.value.reason == 'transfers'
+    for slots in held:
+        admission._release(slots)
+
+
+def test_live_follow_is_off_by_default_and_holds_a_transfer_slot(admission_app, root, monkeypatch):
+    assert not Config.PREVIEW_FOLLOW_ENABLED
+    assert 'api_follow' in Config.ADMISSION_TRANSFER_ENDPOINTS
+    monkeypatch.setitem(admission_app.config, 'PREVIEW_FOLLOW_ENABLED', True)
+    monkeypatch.setitem(admission_app.config, 'ADMISSION_REQUESTS_PER_SECOND', 0)
+    monkeypatch.setitem(admission_app.config, 'ADMISSION_MAX_TRANSFERS_PER_CLIENT', 1)
+    (root / 'app.log').write_text('started\n')
+    client = admission_app.test_client()
+
+    follower = client.get('/api/follow/app.log', buffered=False)
+    assert follower.status_code == 200
+    # 跟随连接保持期间占用该客户端唯一的传输槽位
+    assert client.get('/api/follow/app.log', buffered=False).status_code == 429
+    follower.close()
+    again = client.get('/api/follow/app.log', buffered=False)
+    assert again.status_code == 200
+    again.close()
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import asgi
+
+
+def _call(path, query=b''):
+    """
+    通过 asgi.application 发送一个 GET 请求，返回 (状态码, 响应体)。
+    """
+    async def run():
+        messages = []
+        delivered = False
+
+        async def receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait()  # 客户端一直保持连接
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path, 'query_string': query,
+            'headers': [(b'host', b'localhost')], 'http_version': '1.1',
+        }
+        await asgi.application(scope, receive, send)
+        assert messages[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+        return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+    return asyncio.run(run())
+
+
+def _make_tree(root):
+    for i in range(5):
+        (root / f"report-{i}.log").write_text('x')
+
+
+def test_streamed_search_api_keeps_request_context(app, root):
+    _make_tree(root)
+    status, body = _call('/api/search', b'query=report')
+    assert status == 200
+    lines = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+    assert lines[-1] == {'done': True, 'count': 5, 'next_cursor': None, 'partial': False}
+    # 结果的链接在流式生成时才通过 url_for 计算
+    assert lines[0]['download_url'].startswith('/download/report-')
+
+
+def test_streamed_search_page_renders_completely(app, root):
+    _make_tree(root)
+    status, body = _call('/search', b'query=report')
+    assert status == 200
+    assert body.rstrip().endswith(b'</html>')
+    assert body.count(b'/download/report-') >= 5
@@ -0,0 +1,79 @@
+import os
+
+
+def _write_text(root, name='rules.conf', lines=2000):
+    path = root / name
+    path.write_text(''.join(f"line {i} of a compressible text file\n" for i in range(lines)))
+    return path
+
+
+def test_cached_variant_keeps_validators(client, app, root):
+    _write_text(root)
+    headers = {'Accept-Encoding': 'gzip'}
+    first = client.get('/download/rules.conf', headers=headers)
+    assert first.status_code == 200
+    assert first.headers['Content-Encoding'] == 'gzip'
+    etag = first.headers['ETag']
+    assert etag and first.headers['Last-Modified']
+    first.get_data()  # 读完流式响应后变体才写入缓存
+    assert os.listdir(app.config['COMPRESSION_CACHE_DIR'])
+
+    # 第二次请求命中磁盘变体缓存，校验值必须与边压缩边发送时相同
+    second = client.get('/download/rules.conf', headers=headers)
+    assert second.headers['ETag'] == etag
+    assert second.headers['Last-Modified'] == first.headers['Last-Modified']
+    second.close()
+
+    third = client.get('/download/rules.conf', headers=dict(headers, **{'If-None-Match': etag}))
+    assert third.status_code == 304
+    assert third.headers['ETag'] == etag
+
+
+def test_streamed_variant_answers_conditional_request(client, app, root):
+    _write_text(root)
+    headers = {'Accept-Encoding': 'gzip'}
+    first = client.get('/download/rules.conf', headers=headers)
+    etag = first.headers['ETag']
+    first.get_data()
+    # 变体被淘汰后，客户端的缓存仍然有效
+    for name in os.listdir(app.config['COMPRESSION_CACHE_DIR']):
+        os.remove(os.path.join(app.config['COMPRESSION_CACHE_DIR'], name))
+    response = client.get('/download/rules.conf', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 304
+
+
+def test_cache_hit_does_not_change_variant_mtime(client, app, root):
+    _write_text(root)
+    headers = {'Accept-Encoding': 'gzip'}
+    client.get('/download/rules.conf', headers=headers).get_data()
+    cache_dir = app.config['COMPRESSION_CACHE_DIR']
+    (variant,) = os.listdir(cache_dir)
+    path = os.path.join(cache_dir, variant)
+    os.utime(path, ns=(0, 1_000_000_000))
+    client.get('/download/rules.conf', headers=headers).close()
+    variant_stat = os.stat(path)
+    assert variant_stat.st_mtime_ns == 1_000_000_000
+    assert variant_stat.st_atime_ns > 0
+
+
+def test_encodings_have_distinct_etags(client, root):
+    _write_text(root)
+    gzip = client.get('/download/rules.conf', headers={'Accept-Encoding': 'gzip'})
+    identity = client.get('/download/rules.conf', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in identity.headers
+    assert gzip.headers['ETag'] != identity.headers['ETag']
+    gzip.close()
+    identity.close()
+
+
+def test_source_change_changes_etag(client, root):
+    path = _write_text(root)
+    headers = {'Accept-Encoding': 'gzip'}
+    first = client.get('/download/rules.conf', headers=headers)
+    first.close()
+    _write_text(root, lines=3000)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 5_000_000_000))
+    second = client.get('/download/rules.conf', headers=dict(headers, **{'If-None-Match': first.headers['ETag']}))
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    second.close()
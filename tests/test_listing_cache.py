@@ -0,0 +1,79 @@
+import os
+import time
+
+from utils import file_operations, fragment_cache
+
+
+def _freeze_mtime(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_recently_modified_directory_is_not_cached(client, root):
+    folder = root / 'incoming'
+    folder.mkdir()
+    (folder / 'a.txt').write_text('a')
+    mtime_ns = time.time_ns()
+    _freeze_mtime(folder, mtime_ns)
+
+    first = client.get('/browse/incoming')
+    assert b'a.txt' in first.data
+
+    # 同一时间戳粒度内的修改不会改变目录的 mtime（也就不会改变 ETag）
+    (folder / 'b.txt').write_text('b')
+    _freeze_mtime(folder, mtime_ns)
+
+    second = client.get('/browse/incoming')
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert b'b.txt' in second.data
+    listing = client.get('/api/list/incoming').get_json()
+    assert [item['name'] for item in listing['items']] == ['a.txt', 'b.txt']
+
+
+def test_settled_directory_rows_are_cached(client, app, root, monkeypatch):
+    folder = root / 'archive'
+    folder.mkdir()
+    (folder / 'a.txt').write_text('a')
+    _freeze_mtime(folder, time.time_ns() - 60 * 10**9)
+
+    calls = []
+    page_directory = file_operations.page_directory
+    monkeypatch.setattr(file_operations, 'page_directory', lambda *a, **kw: calls.append(a) or page_directory(*a, **kw))
+
+    first = client.get('/browse/archive')
+    second = client.get('/browse/archive')
+    assert len(calls) == 1
+    assert second.data == first.data
+    etag, _ = first.get_etag()
+    with app.app_context():
+        assert fragment_cache.get(('browse-rows', etag)) is not None
+
+
+def test_listing_cache_follows_directory_changes(app, root):
+    folder = root / 'docs'
+    folder.mkdir()
+    (folder / 'a.txt').write_text('a')
+    _freeze_mtime(folder, time.time_ns() - 60 * 10**9)
+
+    with app.test_request_context():
+        assert [item['name'] for item in file_operations.list_directory('docs')] == ['a.txt']
+        (folder / 'b.txt').write_text('b')
+        # 新增文件后目录 mtime 改变，缓存随之失效
+        assert [item['name'] for item in file_operations.list_directory('docs')] == ['a.txt', 'b.txt']
+
+
+def test_parallel_listing_is_opt_in_and_matches_serial(app, root, monkeypatch):
+    from config import Config
+    assert Config.LISTING_PARALLEL_THRESHOLD == 0
+    folder = root / 'many'
+    folder.mkdir()
+    for i in range(300):
+        (folder / f"file-{i:03d}.{('txt', 'png', 'bin')[i % 3]}").write_bytes(b'x' * i)
+    _freeze_mtime(folder, time.time_ns() - 60 * 10**9)
+
+    def listing(threshold):
+        monkeypatch.setitem(app.config, 'LISTING_PARALLEL_THRESHOLD', threshold)
+        with app.test_request_context():
+            file_operations._get_listing_cache().clear()
+            return file_operations.list_directory('many')
+
+    assert listing(10) == listing(0)
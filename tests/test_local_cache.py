@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from utils import file_operations, local_cache
+
+
+@pytest.fixture
+def evicting_cache(app, tmp_path, monkeypatch):
+    """
+    启用本地缓存，并模拟副本在 cached_path 返回之后立即被其他 worker 淘汰。
+    """
+    monkeypatch.setitem(app.config, 'LOCAL_CACHE_ENABLED', True)
+    monkeypatch.setitem(app.config, 'LOCAL_CACHE_DIR', str(tmp_path / 'local'))
+    monkeypatch.setitem(app.config, 'LOCAL_CACHE_MIN_REQUESTS', 1)
+    evicted = []
+    cached_path = local_cache.cached_path
+
+    def cached_then_evicted(absolute_path, file_stat=None):
+        path = cached_path(absolute_path, file_stat)
+        if path != absolute_path:
+            os.remove(path)
+            evicted.append(path)
+        return path
+
+    monkeypatch.setattr(local_cache, 'cached_path', cached_then_evicted)
+    return evicted
+
+
+def test_download_falls_back_when_copy_is_evicted(client, root, evicting_cache):
+    (root / 'data.bin').write_bytes(b'payload' * 100)
+    response = client.get('/download/data.bin', headers={'Range': 'bytes=0-6'})
+    assert evicting_cache
+    assert response.status_code == 206
+    assert response.data == b'payload'
+
+
+def test_text_reads_fall_back_when_copy_is_evicted(app, root, evicting_cache):
+    (root / 'notes.txt').write_text('first line\nsecond line\n')
+    with app.test_request_context():
+        content, truncated = file_operations.read_text_file('notes.txt')
+        assert content == 'first line\nsecond line\n' and not truncated
+        data, _, _, _ = file_operations.read_text_chunk('notes.txt', 0, 1024)
+        assert data == b'first line\nsecond line\n'
+    assert len(evicting_cache) == 2
@@ -0,0 +1,102 @@
+import json
+import time
+
+import pytest
+
+from utils import manifest
+from utils.manifest import ManifestIndex, ManifestOutOfRange
+
+
+def _index(root, tmp_path, max_tombstone_age=3600):
+    return ManifestIndex(str(root), ['.*'], str(tmp_path / 'manifest.pickle'), 2, 30, max_tombstone_age)
+
+
+def _paths(entries):
+    return sorted((entry['path'], bool(entry.get('deleted'))) for entry in entries)
+
+
+@pytest.fixture
+def tree(root):
+    (root / 'docs').mkdir()
+    (root / 'docs/a.txt').write_text('a')
+    (root / 'docs/b.txt').write_text('b')
+    (root / 'docs/c.txt').write_text('c')
+    (root / 'top.txt').write_text('top')
+    return root
+
+
+def test_delta_since_generation(tree, tmp_path):
+    index = _index(tree, tmp_path)
+    index.refresh()
+    base = index.generation
+    generation, entries = index.entries('')
+    assert generation == base
+    assert all(entry['sha256'] for entry in entries)
+
+    (tree / 'docs/b.txt').write_text('bigger b')
+    (tree / 'docs/c.txt').unlink()
+    (tree / 'docs/d.txt').write_text('d')
+    index.refresh()
+
+    _, entries = index.entries('docs', since=base)
+    assert _paths(entries) == [('docs/b.txt', False), ('docs/c.txt', True), ('docs/d.txt', False)]
+    _, entries = index.entries('', since=index.generation)
+    assert list(entries) == []
+    # 目录前缀不会匹配名称相同开头的兄弟条目
+    _, entries = index.entries('doc', since=base)
+    assert list(entries) == []
+
+
+def test_since_outside_range_is_rejected(tree, tmp_path):
+    index = _index(tree, tmp_path, max_tombstone_age=0)
+    index.refresh()
+    with pytest.raises(ManifestOutOfRange):
+        index.entries('', since=index.generation + 1)
+    with pytest.raises(ManifestOutOfRange):
+        index.entries('', since=-1)
+
+    before_delete = index.generation
+    (tree / 'docs/a.txt').unlink()
+    index.refresh()
+    time.sleep(0.01)
+    (tree / 'top.txt').write_text('top, changed')
+    index.refresh()
+    # 过期的删除记录被清理后，floor 之前的 since 无法给出增量
+    assert index.floor > before_delete
+    with pytest.raises(ManifestOutOfRange):
+        index.entries('', since=before_delete)
+    _, entries = index.entries('', since=index.floor)
+    assert ('top.txt', False) in _paths(entries)
+
+
+@pytest.fixture
+def manifest_client(app, client, tree, tmp_path, monkeypatch):
+    index = _index(tree, tmp_path)
+    index.refresh()
+    monkeypatch.setitem(app.config, 'MANIFEST_ENABLED', True)
+    # 预先放入已就绪的清单，不启动后台维护线程
+    monkeypatch.setitem(manifest._manifests, '', index)
+    return client, index
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_manifest_api_delta_and_bounds(manifest_client, tree):
+    client, index = manifest_client
+    full = _lines(client.get('/api/manifest/'))
+    assert full[-1]['done'] and full[-1]['count'] == 4
+    base, index_id = full[-1]['generation'], full[-1]['index_id']
+
+    (tree / 'docs/d.txt').write_text('d')
+    index.refresh()
+    delta = _lines(client.get(f'/api/manifest/?since={base}&index_id={index_id}'))
+    assert [entry['path'] for entry in delta[:-1]] == ['docs/d.txt']
+    assert delta[-1]['generation'] == index.generation
+
+    ahead = client.get(f'/api/manifest/?since={index.generation + 5}')
+    assert ahead.status_code == 410
+    assert ahead.get_json()['generation'] == index.generation
+    assert client.get(f'/api/manifest/?since={base}&index_id=rebuilt').status_code == 410
+    assert client.get('/api/manifest/?since=latest').status_code == 400
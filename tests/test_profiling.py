@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from utils.profiling import ProfilingMiddleware, _StackSampler
+
+
+def test_sampler_updates_counters_under_lock():
+    sampler = _StackSampler(1)
+
+    class CheckedCounter(Counter):
+        def __setitem__(self, key, value):
+            # _finish 在锁内复制计数器，采样线程只能在持有锁时修改
+            assert sampler._lock.locked()
+            super().__setitem__(key, value)
+
+    stacks = CheckedCounter()
+    sampler.register(stacks)
+    worker = threading.Thread(target=sampler.sample)
+    worker.start()
+    worker.join()
+    sampler.unregister()
+    assert sum(stacks.values()) == 1
+    copy = sampler.snapshot(stacks)
+    assert copy == stacks and copy is not stacks
+
+
+def test_slow_request_writes_sampled_stacks(tmp_path):
+    def slow_app(environ, start_response):
+        time.sleep(0.1)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'done']
+
+    config = {
+        'PROFILE_DIR': str(tmp_path / 'profiles'),
+        'PROFILE_SLOW_THRESHOLD': 0.05,
+        'PROFILE_SAMPLE_INTERVAL': 0.005,
+        'PROFILE_SAMPLE_RATE': 0,
+        'TIMING_LOG_FILE': None,
+    }
+    middleware = ProfilingMiddleware(slow_app, config, logger=None)
+    body = middleware({'REQUEST_METHOD': 'GET', 'PATH_INFO': '/slow'}, lambda status, headers, exc_info=None: None)
+    assert b''.join(body) == b'done'
+    body.close()
+    (profile,) = os.listdir(tmp_path / 'profiles')
+    assert profile.endswith('.stacks')
+    assert 'slow_app' in (tmp_path / 'profiles' / profile).read_text()
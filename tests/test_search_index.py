@@ -0,0 +1,120 @@
+import os
+import shutil
+
+from utils.search_index import FilenameIndex
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text('')
+
+
+def _bump_mtime(path):
+    # 保证目录 mtime 变化，不依赖文件系统的时间戳粒度
+    mtime_ns = os.stat(path).st_mtime_ns + 10**9
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _paths(index, keyword):
+    return sorted(item['path'] for item in index.iter_search(keyword))
+
+
+def _fresh(root, tmp_path):
+    index = FilenameIndex(str(root), ['.*'], str(tmp_path / 'fresh.pickle'))
+    index.refresh()
+    return index
+
+
+def _assert_matches_fresh_build(index, root, tmp_path):
+    fresh = _fresh(root, tmp_path)
+    for keyword in ('report', 'txt', 'a', 'log', 'zz'):
+        assert _paths(index, keyword) == _paths(fresh, keyword)
+    assert {
+        gram: sorted(index._paths[i] for i in posting) for gram, posting in index._postings.items()
+    } == {
+        gram: sorted(fresh._paths[i] for i in posting) for gram, posting in fresh._postings.items()
+    }
+
+
+def test_refresh_updates_only_changed_directories(root, tmp_path):
+    for name in ('docs/report-2023.txt', 'docs/notes.txt', 'logs/app.log', 'logs/old/report.log'):
+        _touch(root / name)
+    index = FilenameIndex(str(root), ['.*'], str(tmp_path / 'index.pickle'))
+    assert index.refresh()
+    assert _paths(index, 'report') == ['docs/report-2023.txt', 'logs/old/report.log']
+    logs_ids = list(index._dir_ids['logs'])
+
+    _touch(root / 'docs/report-2024.txt')
+    (root / 'docs/notes.txt').unlink()
+    _bump_mtime(root / 'docs')
+    assert index.refresh()
+    assert _paths(index, 'report') == ['docs/report-2023.txt', 'docs/report-2024.txt', 'logs/old/report.log']
+    assert _paths(index, 'notes') == []
+    # 未变化的目录保留原有条目 id
+    assert list(index._dir_ids['logs']) == logs_ids
+    assert not index.refresh()
+    _assert_matches_fresh_build(index, root, tmp_path)
+
+
+def test_vanished_directory_removes_its_entries(root, tmp_path):
+    for name in ('keep/a.txt', 'drop/report.txt', 'drop/deeper/report.log'):
+        _touch(root / name)
+    index = FilenameIndex(str(root), ['.*'], str(tmp_path / 'index.pickle'))
+    index.refresh()
+    shutil.rmtree(root / 'drop')
+    _bump_mtime(root)
+    assert index.refresh()
+    assert _paths(index, 'report') == []
+    assert 'drop/deeper' not in index._dir_ids
+    _assert_matches_fresh_build(index, root, tmp_path)
+
+
+def test_compaction_and_persistence_keep_results(root, tmp_path):
+    for i in range(1500):
+        _touch(root / 'bulk' / f"file-{i:04d}.txt")
+    _touch(root / 'report.txt')
+    index = FilenameIndex(str(root), ['.*'], str(tmp_path / 'index.pickle'))
+    index.refresh()
+    for i in range(1400):
+        (root / 'bulk' / f"file-{i:04d}.txt").unlink()
+    _bump_mtime(root / 'bulk')
+    index.refresh()
+    # 删除的条目超过一半时重新编号
+    assert index._removed == 0 and len(index._paths) == 102
+    _assert_matches_fresh_build(index, root, tmp_path)
+
+    index.save()
+    loaded = FilenameIndex(str(root), ['.*'], str(tmp_path / 'index.pickle'))
+    assert loaded.load()
+    _touch(root / 'bulk' / 'report-new.txt')
+    _bump_mtime(root / 'bulk')
+    assert loaded.refresh()
+    assert _paths(loaded, 'report') == ['bulk/report-new.txt', 'report.txt']
+
+
+def test_iteration_survives_concurrent_refresh(root, tmp_path):
+    for name in ('a/report-1.txt', 'a/report-2.txt', 'a/report-3.txt'):
+        _touch(root / name)
+    index = FilenameIndex(str(root), ['.*'], str(tmp_path / 'index.pickle'))
+    index.refresh()
+    matches = index.iter_search('report')
+    first = next(matches)
+    (root / 'a/report-2.txt').unlink()
+    _bump_mtime(root / 'a')
+    index.refresh()
+    # 迭代开始后被删除的条目不再生成
+    assert [first['path']] + [item['path'] for item in matches] == ['a/report-1.txt', 'a/report-3.txt']
+
+
+def test_iteration_skips_entry_removed_between_name_and_path_reads(root, tmp_path):
+    for name in ('a/report-1.txt', 'a/report-2.txt'):
+        _touch(root / name)
+    index = FilenameIndex(str(root), ['.*'], str(tmp_path / 'index.pickle'))
+    index.refresh()
+    matches = index.iter_search('report')
+    first = next(matches)
+    # 模拟后台重扫在搜索读取名称之后、读取路径之前删除了该条目
+    removed = index._paths.index('a/report-2.txt')
+    index._paths[removed] = None
+    assert first['path'] == 'a/report-1.txt'
+    assert list(matches) == []
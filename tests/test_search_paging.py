@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from utils import search_utils
+from utils.file_operations import InvalidListingQuery
+from utils.search_utils import SearchPage
+
+
+def _make_tree(root, count):
+    expected = set()
+    for i in range(count):
+        path = root / f"dir{i % 3}" / f"report-{i:02d}.txt"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text('')
+        expected.add(f"dir{i % 3}/report-{i:02d}.txt")
+    (root / 'other.txt').write_text('')
+    return expected
+
+
+def _search(client, **params):
+    response = client.get('/api/search', query_string=params)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[-1]['done']
+    return [line['path'] for line in lines[:-1]], lines[-1]
+
+
+def _collect_pages(client, limit):
+    found, pages, cursor = [], 0, None
+    while True:
+        params = {'query': 'report', 'limit': limit}
+        if cursor:
+            params['cursor'] = cursor
+        paths, done = _search(client, **params)
+        found.extend(paths)
+        pages += 1
+        cursor = done['next_cursor']
+        if cursor is None:
+            return found, pages
+        assert pages < 20
+
+
+def test_cursor_pages_cover_all_results_once(client, root):
+    expected = _make_tree(root, 23)
+    found, pages = _collect_pages(client, 7)
+    assert sorted(found) == sorted(expected)
+    # 最后一页已满时还需要一次请求确认没有更多结果
+    assert pages == 4
+
+
+def test_invalid_cursor_is_rejected(client, app, root):
+    _make_tree(root, 3)
+    assert client.get('/api/search?query=report&cursor=bogus').status_code == 400
+    with app.test_request_context():
+        with pytest.raises(InvalidListingQuery):
+            search_utils.search_page('report', 'name', search_utils._encode_root_cursor({'': 1}))
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+
+def test_time_budget_keeps_cursor_resumable(monkeypatch):
+    clock = _FakeClock()
+    monkeypatch.setattr(search_utils, 'time', clock)
+
+    def matches(count):
+        for i in range(count):
+            clock.now += 1.0  # 每个匹配项耗时 1 秒
+            yield {'path': f"item-{i}"}
+
+    page = SearchPage(matches(10), 0, 8, time_budget=3.5)
+    first = [item['path'] for item in page]
+    assert first == ['item-0', 'item-1', 'item-2']
+    assert page.partial
+
+    # 在跳过阶段超时时保持原游标，不会跳过尚未返回的结果
+    offset = search_utils._decode_cursor(page.next_cursor)
+    skipping = SearchPage(matches(10), offset, 8, time_budget=2.5)
+    assert list(skipping) == []
+    assert skipping.partial and search_utils._decode_cursor(skipping.next_cursor) == offset
+
+    rest = SearchPage(matches(10), offset, 8, time_budget=100)
+    assert [item['path'] for item in rest] == [f"item-{i}" for i in range(3, 10)]
+    assert rest.next_cursor is None and not rest.partial
+
+
+@pytest.fixture
+def fan_out(app, tmp_path, monkeypatch):
+    alpha, beta = tmp_path / 'alpha', tmp_path / 'beta'
+    alpha.mkdir()
+    beta.mkdir()
+    monkeypatch.setitem(app.config, 'FILE_SERVER_ROOTS', {'alpha': str(alpha), 'beta': str(beta)})
+    return alpha, beta
+
+
+def test_fan_out_pages_cover_every_root(client, fan_out):
+    alpha, beta = fan_out
+    expected = {f"alpha/{path}" for path in _make_tree(alpha, 4)} | {f"beta/{path}" for path in _make_tree(beta, 17)}
+    found, _ = _collect_pages(client, 5)
+    assert sorted(found) == sorted(expected)
+
+
+def test_fan_out_cursor_skips_exhausted_root(client, app, fan_out, monkeypatch):
+    alpha, beta = fan_out
+    _make_tree(alpha, 4)
+    expected_beta = {f"beta/{path}" for path in _make_tree(beta, 6)}
+
+    searched = []
+    iter_name_matches = search_utils.iter_name_matches
+    monkeypatch.setattr(search_utils, 'iter_name_matches',
+                        lambda keyword, name='': searched.append(name) or iter_name_matches(keyword, name))
+
+    cursor = search_utils._encode_root_cursor({'alpha': search_utils._ROOT_EXHAUSTED, 'beta': 2})
+    paths, done = _search(client, query='report', limit=50, cursor=cursor)
+    assert searched == ['beta']
+    assert len(paths) == 4 and set(paths) < expected_beta
+    assert done['next_cursor'] is None and not done['partial']
+
+
+def test_root_cursor_round_trip():
+    names = ['alpha', 'beta', 'gamma']
+    cursor = search_utils._encode_root_cursor({'alpha': search_utils._ROOT_EXHAUSTED, 'beta': 12})
+    # 游标中没有的根目录（例如新增的根目录）从头开始
+    assert search_utils._decode_root_cursor(cursor, names) == {'alpha': -1, 'beta': 12, 'gamma': 0}
+    with pytest.raises(ValueError):
+        search_utils._decode_root_cursor(search_utils._encode_root_cursor({'alpha': -2}), names)
+    with pytest.raises(ValueError):
+        search_utils._decode_root_cursor(search_utils._encode_cursor(3), names)
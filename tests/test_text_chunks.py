@@ -0,0 +1,51 @@
+import pytest
+
+from utils import file_operations
+
+_TEXT = ''.join(f"第 {i} 行：日志内容 ünïcödé ✓ {'x' * (i % 7)}\n" for i in range(40)) + '没有换行的最后一行'
+
+
+@pytest.fixture
+def text_file(root):
+    path = root / 'notes.txt'
+    path.write_bytes(_TEXT.encode('utf-8'))
+    return path
+
+
+def _read_all(length):
+    chunks, offset = [], 0
+    while True:
+        data, start, next_offset, file_size = file_operations.read_text_chunk('notes.txt', offset, length)
+        assert start == offset and next_offset > offset
+        data.decode('utf-8')  # 每一块都可以单独解码
+        chunks.append(data)
+        if next_offset >= file_size:
+            return chunks
+        offset = next_offset
+
+
+@pytest.mark.parametrize('length', [5, 16, 61, 4096])
+def test_chunks_reassemble_to_file(app, text_file, length):
+    with app.test_request_context():
+        chunks = _read_all(length)
+    assert b''.join(chunks) == text_file.read_bytes()
+    if length >= 61:
+        # 块足够容纳一整行时，除最后一块外都结束于行尾
+        assert all(chunk.endswith(b'\n') for chunk in chunks[:-1])
+
+
+def test_offset_inside_multibyte_character_is_skipped(app, text_file):
+    raw = text_file.read_bytes()
+    offset = raw.index('行'.encode('utf-8')) + 1
+    with app.test_request_context():
+        data, start, _, _ = file_operations.read_text_chunk('notes.txt', offset, 64)
+    assert start == offset + 2
+    assert data == raw[start:start + len(data)]
+    data.decode('utf-8')
+
+
+def test_utf8_boundary_never_splits_characters():
+    encoded = '✓✓'.encode('utf-8')
+    for cut in range(len(encoded) + 1):
+        end = file_operations._utf8_boundary(encoded[:cut])
+        assert end in (0, 3, 6) and end <= cut
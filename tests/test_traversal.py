@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.mark.parametrize('url', [
+    '/browse/../etc',
+    '/browse/..%2f..%2fetc',
+    '/api/list/../etc',
+    '/api/list/..%2f..%2fetc',
+])
+def test_directory_traversal_is_forbidden(client, root, url):
+    (root / 'docs').mkdir()
+    assert client.get(url).status_code == 403
+
+
+def test_listing_api_errors(client, root):
+    (root / 'docs').mkdir()
+    missing = client.get('/api/list/nowhere')
+    assert missing.status_code == 404
+    forbidden = client.get('/api/list/..%2f..%2fetc')
+    assert forbidden.get_json() == {'error': '禁止访问。'}
+    assert client.get('/api/list/docs?cursor=bogus').status_code == 400
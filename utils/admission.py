@@ -0,0 +1,261 @@
+import hashlib
+import math
+import os
+import random
+import time
+
+from flask import current_app
+from werkzeug.wsgi import FileWrapper
+
+from utils import metrics
+
+try:
+    import fcntl  # 仅在类 Unix 系统上可用，用于在多个 worker 之间共享并发槽位和令牌桶
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# before_request 把本次请求占用的槽位和带宽上限写入 environ，供 WSGI 中间件在响应结束时释放
+SLOTS_ENVIRON_KEY = 'aetherserve.admission_slots'
+BANDWIDTH_ENVIRON_KEY = 'aetherserve.bandwidth'
+
+# 每处理多少个请求清理一次长时间未使用的客户端状态文件（按概率触发）
+_CLEANUP_PROBABILITY = 0.001
+_STATE_FILE_MAX_AGE = 3600
+
+_releasing_wrappers = {}  # 服务器的 file_wrapper 类 -> 响应结束时释放槽位的子类
+
+
+class Rejected(Exception):
+    """
+    请求被准入控制拒绝，应返回 429。retry_after 为建议客户端等待的秒数。
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def is_available():
+    """
+    判断准入控制是否可用（已启用且系统支持 fcntl 文件锁）。
+    """
+    return fcntl is not None and current_app.config.get('ADMISSION_ENABLED', False)
+
+
+def client_key(request):
+    """
+    返回用于限流的客户端标识：请求的 ADMISSION_TOKEN_HEADER 是 ADMISSION_TOKENS 中的令牌时按令牌区分，
+    否则按客户端 IP（未列出的令牌被忽略）。
+    位于 ADMISSION_TRUSTED_PROXIES 层反向代理之后时，从 X-Forwarded-For 中取出真实的客户端 IP。
+    """
+    config = current_app.config
+    header = config.get('ADMISSION_TOKEN_HEADER')
+    token = request.headers.get(header) if header else None
+    if token and token in config.get('ADMISSION_TOKENS', ()):
+        return 'token:' + token
+    proxies = config.get('ADMISSION_TRUSTED_PROXIES', 0)
+    if proxies:
+        forwarded = [address.strip() for address in request.headers.get('X-Forwarded-For', '').split(',')
+                     if address.strip()]
+        if len(forwarded) >= proxies:
+            return 'ip:' + forwarded[-proxies]
+    return 'ip:' + (request.remote_addr or '')
+
+
+def _state_name(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def _try_acquire(state_dir, name, count):
+    """
+    尝试占用 name.0 ~ name.<count-1> 中的任意一个槽位文件锁，成功时返回打开的文件（关闭即释放）。
+    文件锁由操作系统维护，worker 异常退出时槽位也会自动释放。
+    """
+    for i in range(count):
+        f = open(os.path.join(state_dir, f"{name}.{i}"), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        os.utime(f.fileno())  # 更新 mtime，避免正在使用的槽位文件被 _cleanup 删除
+        return f
+    return None
+
+
+def _take_token(state_dir, name, rate, burst):
+    """
+    从客户端的令牌桶中取出一个令牌。令牌桶保存在文件中，所有 worker 共享。
+    返回 0 表示成功，否则返回令牌恢复所需的秒数。
+    """
+    with open(os.path.join(state_dir, f"{name}.bucket"), 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        now = time.time()
+        try:
+            tokens, stamp = (float(value) for value in f.read().split())
+            tokens = min(burst, tokens + max(0.0, now - stamp) * rate)
+        except ValueError:
+            tokens = burst
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        f.seek(0)
+        f.truncate()
+        f.write(f"{tokens} {now}")
+    return wait
+
+
+def _cleanup(state_dir):
+    """
+    删除长时间未使用的客户端令牌桶文件。槽位文件只在没有被锁定时删除。
+    """
+    threshold = time.time() - _STATE_FILE_MAX_AGE
+    try:
+        entries = list(os.scandir(state_dir))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime >= threshold:
+                continue
+            if entry.name.endswith('.bucket'):
+                os.remove(entry.path)
+                continue
+            with open(entry.path, 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.remove(entry.path)
+        except OSError:
+            continue
+
+
+def _release(slots):
+    for slot in slots:
+        slot.close()
+
+
+def admit(request):
+    """
+    在 before_request 中调用：检查客户端的请求速率，并为下载类路由占用客户端的传输槽位
+    （设置了 ADMISSION_MAX_TRANSFERS 时还占用一个全局槽位）。
+    被拒绝时抛出 Rejected。占用的槽位记录在 environ 中，由 AdmissionMiddleware 在响应发送完毕后释放。
+    """
+    config = current_app.config
+    endpoint = request.endpoint or 'unmatched'
+    state_dir = config['ADMISSION_DIR']
+    os.makedirs(state_dir, exist_ok=True)
+    if random.random() < _CLEANUP_PROBABILITY:
+        _cleanup(state_dir)
+    client = _state_name(client_key(request))
+
+    rate = config.get('ADMISSION_REQUESTS_PER_SECOND', 0)
+    if rate > 0 and endpoint not in config.get('ADMISSION_RATE_EXEMPT_ENDPOINTS', ()):
+        wait = _take_token(state_dir, client, rate, max(1.0, config.get('ADMISSION_REQUEST_BURST', rate)))
+        if wait > 0:
+            metrics.inc('aetherserve_admission_rejections_total', {'route': endpoint, 'reason': 'rate'})
+            raise Rejected('rate', math.ceil(wait))
+
+    if endpoint not in config.get('ADMISSION_TRANSFER_ENDPOINTS', ()):
+        return
+
+    # 客户端自己的并发下载数
+    client_slot = _try_acquire(state_dir, f"client-{client}", config.get('ADMISSION_MAX_TRANSFERS_PER_CLIENT', 2))
+    if client_slot is None:
+        metrics.inc('aetherserve_admission_rejections_total', {'route': endpoint, 'reason': 'client_transfers'})
+        raise Rejected('client_transfers', config.get('ADMISSION_RETRY_AFTER', 5))
+    slots = (client_slot,)
+    # 所有客户端的并发下载数，剩余的 worker 保留给浏览、预览和搜索；为 0 时不限制
+    max_transfers = config.get('ADMISSION_MAX_TRANSFERS', 0)
+    if max_transfers > 0:
+        global_slot = _try_acquire(state_dir, 'transfers', max_transfers)
+        if global_slot is None:
+            client_slot.close()
+            metrics.inc('aetherserve_admission_rejections_total', {'route': endpoint, 'reason': 'transfers'})
+            raise Rejected('transfers', config.get('ADMISSION_RETRY_AFTER', 5))
+        slots += (global_slot,)
+
+    environ = request.environ
+    environ[SLOTS_ENVIRON_KEY] = slots
+    bandwidth = config.get('DOWNLOAD_BANDWIDTH_LIMIT', 0)
+    if bandwidth > 0:
+        environ[BANDWIDTH_ENVIRON_KEY] = bandwidth
+    else:
+        # 用子类替换服务器的 file_wrapper：响应仍可由服务器通过 sendfile 发送，发送完毕调用 close 时释放槽位
+        base = environ.get('wsgi.file_wrapper') or FileWrapper
+        environ['wsgi.file_wrapper'] = _releasing_wrapper(base)
+
+
+def _releasing_wrapper(base):
+    wrapper = _releasing_wrappers.get(base)
+    if wrapper is None:
+        class ReleasingFileWrapper(base):
+            admission_slots = ()
+
+            def close(self):
+                try:
+                    super().close()
+                finally:
+                    _release(self.admission_slots)
+
+        wrapper = _releasing_wrappers[base] = ReleasingFileWrapper
+    return wrapper
+
+
+class _ReleasingIterable:
+    """
+    包装响应体：按 rate 字节/秒限速发送（令牌桶，允许 1 秒的突发），响应关闭时释放传输槽位。
+    """
+
+    def __init__(self, iterable, slots, rate):
+        self._iterable = iterable
+        self._slots = slots
+        self._rate = rate
+
+    def __iter__(self):
+        if not self._rate:
+            yield from self._iterable
+            return
+        allowance = self._rate
+        last = time.monotonic()
+        for chunk in self._iterable:
+            now = time.monotonic()
+            allowance = min(self._rate, allowance + (now - last) * self._rate) - len(chunk)
+            last = now
+            if allowance < 0:
+                time.sleep(-allowance / self._rate)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, 'close'):
+                self._iterable.close()
+        finally:
+            _release(self._slots)
+
+
+class AdmissionMiddleware:
+    """
+    WSGI 中间件：在响应发送完毕（服务器调用 close）时释放 admit 占用的传输槽位，并按需对下载限速。
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        try:
+            iterable = self.wsgi_app(environ, start_response)
+        except Exception:
+            _release(environ.pop(SLOTS_ENVIRON_KEY, ()))
+            raise
+
+        slots = environ.get(SLOTS_ENVIRON_KEY)
+        if not slots:
+            return iterable
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper in _releasing_wrappers.values() and isinstance(iterable, file_wrapper):
+            iterable.admission_slots = slots
+            return iterable
+        return _ReleasingIterable(iterable, slots, environ.get(BANDWIDTH_ENVIRON_KEY, 0))
@@ -0,0 +1,242 @@
+import os
+import stat
+import tarfile
+import time
+import zipfile
+
+from flask import current_app
+
+from utils import compression, roots
+from utils.file_operations import _get_absolute_path, get_hidden_matcher
+
+# 支持的归档格式（URL 后缀）及其 MIME 类型
+ARCHIVE_FORMATS = {
+    '.zip': 'application/zip',
+    '.tar': 'application/x-tar',
+    '.tar.zst': 'application/zstd',
+}
+
+# 已经压缩过的文件在 ZIP 中使用 STORE 模式，避免浪费 CPU 重复压缩
+_STORED_EXTENSIONS = compression._ALREADY_COMPRESSED_EXTENSIONS | frozenset([
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.heic', '.mp3', '.mp4', '.m4a', '.mkv', '.webm',
+    '.mov', '.ogg', '.flac', '.jar', '.whl', '.apk', '.docx', '.xlsx', '.pptx',
+])
+
+# ZIP 格式无法表示 1980 年之前的时间
+_ZIP_MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class ArchiveTooLarge(Exception):
+    """
+    目录中的文件数或总字节数超过了 ARCHIVE_MAX_FILES / ARCHIVE_MAX_BYTES 限制。
+    """
+
+
+def split_archive_path(archive_path):
+    """
+    将 "configs/nginx.tar.zst" 这样的请求路径拆分为 (目录相对路径, 格式后缀)。
+    不是支持的格式时返回 (None, None)。
+    """
+    # 先匹配较长的后缀，避免 .tar.zst 被识别为其他格式
+    for suffix in sorted(ARCHIVE_FORMATS, key=len, reverse=True):
+        if archive_path.endswith(suffix):
+            if suffix == '.tar.zst' and 'zstd' not in compression.available_encodings():
+                return None, None  # 未安装 zstandard
+            return archive_path[:-len(suffix)].strip('/'), suffix
+    return None, None
+
+
+def _collect_entries(absolute_dir, root_dir, top_name, hidden_patterns, max_files, max_bytes):
+    """
+    遍历目录，返回待打包的条目列表 [(绝对路径, 归档内路径, stat 结果)]，目录条目的归档内路径以 / 结尾。
+    跳过隐藏项以及指向根目录 root_dir 之外的符号链接；超过文件数或字节数上限时抛出 ArchiveTooLarge。
+    """
+    root_real = os.path.realpath(root_dir)
+    is_hidden = get_hidden_matcher(hidden_patterns)
+    entries = []
+    total_bytes = 0
+    for dirpath, dirnames, filenames in os.walk(absolute_dir):
+        dirnames[:] = sorted(name for name in dirnames if not is_hidden(name))
+        relative_dir = os.path.relpath(dirpath, absolute_dir)
+        prefix = top_name if relative_dir == '.' else f"{top_name}/{relative_dir.replace(os.sep, '/')}"
+        try:
+            entries.append((dirpath, prefix + '/', os.stat(dirpath)))
+        except OSError:
+            continue
+        for name in sorted(filenames):
+            if is_hidden(name):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                continue  # 失效的符号链接或无权限的文件
+            if not stat.S_ISREG(file_stat.st_mode):
+                continue
+            if os.path.islink(path) and \
+                    os.path.commonpath([root_real, os.path.realpath(path)]) != root_real:
+                continue
+            total_bytes += file_stat.st_size
+            entries.append((path, f"{prefix}/{name}", file_stat))
+            if len(entries) > max_files or total_bytes > max_bytes:
+                raise ArchiveTooLarge(f"Archive exceeds limits: {len(entries)} entries, {total_bytes} bytes")
+    return entries
+
+
+def _read_chunks(source, size, chunk_size):
+    """
+    从已打开的文件中按固定大小的块读取至多 size 字节（打包期间文件变大时多出的内容被忽略）。
+    """
+    remaining = size
+    while remaining > 0:
+        chunk = source.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+class _StreamBuffer:
+    """
+    只追加、不可 seek 的输出缓冲区，供 zipfile 写入。
+    zipfile 检测到不可 seek 时会使用数据描述符，无需回写本地文件头；生成器每写一块就取走已写入的数据。
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_info(arcname, file_stat):
+    date_time = time.localtime(file_stat.st_mtime)[:6]
+    zip_info = zipfile.ZipInfo(arcname, max(date_time, _ZIP_MIN_DATE_TIME))
+    zip_info.external_attr = (file_stat.st_mode & 0xFFFF) << 16
+    if arcname.endswith('/'):
+        zip_info.external_attr |= 0x10  # MS-DOS 目录属性
+        return zip_info
+    zip_info.file_size = file_stat.st_size
+    if os.path.splitext(arcname)[1].lower() in _STORED_EXTENSIONS:
+        zip_info.compress_type = zipfile.ZIP_STORED
+    else:
+        zip_info.compress_type = zipfile.ZIP_DEFLATED
+    return zip_info
+
+
+def _stream_zip(entries, chunk_size):
+    """
+    以 ZIP 格式流式输出条目。每个文件按块读取、压缩后立即发送，内存占用与文件大小无关。
+    该生成器在请求上下文之外运行，所需配置均通过参数传入。
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for path, arcname, file_stat in entries:
+            zip_info = _zip_info(arcname, file_stat)
+            if zip_info.is_dir():
+                archive.writestr(zip_info, b'')
+                continue
+            try:
+                source = open(path, 'rb')
+            except OSError:
+                continue  # 打包期间被删除或无权限读取的文件直接跳过
+            with source, archive.open(zip_info, 'w') as target:
+                for chunk in _read_chunks(source, file_stat.st_size, chunk_size):
+                    target.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain()
+    yield buffer.drain()  # 中央目录
+
+
+def _stream_tar(entries, chunk_size):
+    """
+    以 tar（PAX 格式，支持长文件名和非 ASCII 文件名）流式输出条目，头部和填充由本函数直接生成。
+    文件在打包期间变小时用 0 填充到头部声明的大小，保证归档结构完整。
+    """
+    written = 0
+    for path, arcname, file_stat in entries:
+        tar_info = tarfile.TarInfo(arcname.rstrip('/'))
+        tar_info.mode = stat.S_IMODE(file_stat.st_mode)
+        tar_info.mtime = int(file_stat.st_mtime)
+        if arcname.endswith('/'):
+            tar_info.type = tarfile.DIRTYPE
+            source = None
+        else:
+            try:
+                source = open(path, 'rb')
+            except OSError:
+                continue
+            tar_info.size = file_stat.st_size
+        header = tar_info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+        written += len(header)
+        yield header
+        if source is None:
+            continue
+        with source:
+            sent = 0
+            for chunk in _read_chunks(source, tar_info.size, chunk_size):
+                sent += len(chunk)
+                yield chunk
+        padding = tar_info.size - sent + (-tar_info.size % tarfile.BLOCKSIZE)
+        written += sent + padding
+        if padding:
+            yield bytes(padding)
+    # 结尾的两个空块，并补齐到完整的记录大小
+    end = 2 * tarfile.BLOCKSIZE
+    end += -(written + end) % tarfile.RECORDSIZE
+    yield bytes(end)
+
+
+def _zstd_compress(chunks):
+    """
+    将 tar 流逐块压缩为 zstd。
+    """
+    encoder = compression._make_encoder('zstd')
+    for chunk in chunks:
+        data = encoder.compress(chunk)
+        if data:
+            yield data
+    yield encoder.flush()
+
+
+def stream_directory(relative_path, suffix):
+    """
+    为目录生成归档流。返回 (生成器, 下载文件名, MIME 类型)。
+    打包前先遍历目录检查上限，因此超出限制时在发送任何数据之前抛出 ArchiveTooLarge。
+    路径不存在或不是目录时抛出 FileNotFoundError，目录穿越时抛出 ValueError。
+    """
+    config = current_app.config
+    absolute_path = _get_absolute_path(relative_path)
+    if not os.path.isdir(absolute_path):
+        raise FileNotFoundError(f"Directory not found: {relative_path}")
+
+    # 多根目录时根目录以其名称命名，而不是挂载点的目录名
+    top_name = relative_path.rsplit('/', 1)[-1] or os.path.basename(absolute_path.rstrip(os.sep)) or 'archive'
+    entries = _collect_entries(
+        absolute_path, roots.split_path(relative_path)[1], top_name, tuple(config.get('HIDDEN_ITEMS', [])),
+        config.get('ARCHIVE_MAX_FILES', 10000), config.get('ARCHIVE_MAX_BYTES', 0)
+    )
+    chunk_size = config.get('ARCHIVE_CHUNK_SIZE', 256 * 1024)
+    if suffix == '.zip':
+        stream = _stream_zip(entries, chunk_size)
+    elif suffix == '.tar.zst':
+        stream = _zstd_compress(_stream_tar(entries, chunk_size))
+    else:
+        stream = _stream_tar(entries, chunk_size)
+    return stream, top_name + suffix, ARCHIVE_FORMATS[suffix]
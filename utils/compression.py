@@ -0,0 +1,354 @@
+import mimetypes
+import os
+import stat
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+from flask import current_app, request, send_file
+from werkzeug.http import is_resource_modified
+
+from utils import metrics
+from utils.file_operations import FILE_KIND_TEXT, _classify
+
+# brotli 和 zstandard 是可选依赖，未安装时只提供 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 预压缩兄弟文件的后缀，例如 rules.conf.br
+PRECOMPRESSED_SUFFIXES = {
+    'br': '.br',
+    'zstd': '.zst',
+    'gzip': '.gz',
+}
+
+# 本身已经压缩过的格式，即使被识别为文本也不再压缩
+_ALREADY_COMPRESSED_EXTENSIONS = frozenset([
+    '.gz', '.tgz', '.br', '.zst', '.zip', '.7z', '.rar', '.xz', '.txz', '.bz2', '.lz', '.lz4', '.lzma',
+])
+
+# 动态压缩 HTML/JSON 等响应时适用的 MIME 类型
+_COMPRESSIBLE_MIMETYPES = frozenset([
+    'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/json',
+    'application/javascript', 'application/xml', 'text/xml',
+])
+
+# 动态压缩读取源文件的块大小
+_READ_CHUNK_SIZE = 256 * 1024
+
+_variant_cache_lock = threading.Lock()
+
+
+class _ZlibGzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 输出 gzip 格式
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+def available_encodings():
+    """
+    返回当前环境可用的动态压缩编码，按服务端偏好排序。
+    """
+    encodings = []
+    if brotli is not None:
+        encodings.append('br')
+    if zstandard is not None:
+        encodings.append('zstd')
+    encodings.append('gzip')
+    return encodings
+
+
+def _make_encoder(encoding):
+    """
+    创建指定编码的流式压缩器。
+    """
+    if encoding == 'br':
+        return _BrotliEncoder()
+    if encoding == 'zstd':
+        return _ZstdEncoder()
+    return _ZlibGzipEncoder()
+
+
+def _negotiate(candidates):
+    """
+    根据请求的 Accept-Encoding 从候选编码中选出最合适的一个，没有可接受的编码时返回 None。
+    """
+    if not candidates:
+        return None
+    best = request.accept_encodings.best_match(candidates)
+    return best if best in candidates else None
+
+
+def _is_compressible_file(absolute_path, file_stat):
+    """
+    判断文件是否适合压缩：只压缩文本文件，不压缩图片、已压缩的归档以及过小的文件。
+    """
+    config = current_app.config
+    extension = os.path.splitext(absolute_path)[1].lower()
+    if extension in _ALREADY_COMPRESSED_EXTENSIONS:
+        return False
+    if file_stat.st_size < config.get('COMPRESSION_MIN_SIZE', 0):
+        return False
+    return _classify(absolute_path, file_stat) == FILE_KIND_TEXT
+
+
+def _find_precompressed(absolute_path, file_stat, encoding):
+    """
+    查找与源文件同目录的预压缩文件（例如 a.conf.gz），返回 (路径, stat 结果)。
+    预压缩文件比源文件旧时视为过期并忽略，返回 None。
+    """
+    candidate = absolute_path + PRECOMPRESSED_SUFFIXES[encoding]
+    try:
+        candidate_stat = os.stat(candidate)
+    except OSError:
+        return None
+    if not stat.S_ISREG(candidate_stat.st_mode) or candidate_stat.st_mtime_ns < file_stat.st_mtime_ns:
+        return None
+    return candidate, candidate_stat
+
+
+def _encoded_etag(absolute_path, file_stat, encoding, *parts):
+    """
+    压缩响应的 ETag：与 send_from_directory 发送源文件时的 ETag 相同的组成部分，再加上编码
+    （同一文件的不同编码是不同的表示，ETag 必须不同）。parts 为影响压缩内容的其他因素（例如预压缩文件的 mtime）。
+    只依赖源文件，缓存变体被重新生成或淘汰后 ETag 不变。
+    """
+    check = zlib.adler32(absolute_path.encode()) & 0xFFFFFFFF
+    return '-'.join(str(part) for part in (file_stat.st_mtime, file_stat.st_size, check, encoding) + parts)
+
+
+def _variant_path(file_stat, encoding):
+    """
+    返回磁盘变体缓存中某个压缩变体的路径，以 (设备, inode, 大小, mtime, 编码) 为键。
+    """
+    name = f"{file_stat.st_dev}-{file_stat.st_ino}-{file_stat.st_size}-{file_stat.st_mtime_ns}.{encoding}"
+    return os.path.join(current_app.config['COMPRESSION_CACHE_DIR'], name)
+
+
+def _evict_variants(cache_dir, max_bytes):
+    """
+    变体缓存超过容量上限时，按最近使用时间（atime，命中时会更新）删除最旧的文件。
+    """
+    with _variant_cache_lock:
+        variants = []
+        total = 0
+        try:
+            with os.scandir(cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        entry_stat = entry.stat()
+                    except OSError:
+                        continue
+                    variants.append((entry_stat.st_atime, entry_stat.st_size, entry.path))
+                    total += entry_stat.st_size
+        except OSError:
+            return
+        variants.sort()
+        for _, size, path in variants:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def _stream_and_cache(absolute_path, variant_path, encoding, cache_dir, max_bytes):
+    """
+    流式压缩源文件：每个块压缩后立即发送给客户端，同时写入变体缓存的临时文件。
+    完整写完后才原子地改名为正式的缓存文件；客户端中途断开时丢弃临时文件。
+    该生成器在请求上下文之外运行，所需配置均通过参数传入。
+    """
+    tmp_path = f"{variant_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    encoder = _make_encoder(encoding)
+    cache_file = None
+    completed = False
+    try:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            cache_file = open(tmp_path, 'wb')
+        except OSError:
+            cache_file = None  # 无法写入缓存时仍然正常发送压缩内容
+        with open(absolute_path, 'rb') as source:
+            while True:
+                chunk = source.read(_READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                data = encoder.compress(chunk)
+                if data:
+                    if cache_file is not None:
+                        cache_file.write(data)
+                    yield data
+        data = encoder.flush()
+        if cache_file is not None:
+            cache_file.write(data)
+        completed = True
+        yield data
+    finally:
+        if cache_file is not None:
+            cache_file.close()
+            if completed:
+                os.replace(tmp_path, variant_path)
+                _evict_variants(cache_dir, max_bytes)
+            else:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+
+def _send_encoded_file(encoded_path, original_path, file_stat, encoding, etag, as_attachment):
+    """
+    发送已经存在的压缩文件（预压缩兄弟文件或缓存变体），Content-Type、文件名和 Last-Modified 沿用源文件，
+    ETag 由 _encoded_etag 根据源文件生成，不受压缩文件自身 mtime 的影响。
+    """
+    file_name = os.path.basename(original_path)
+    response = send_file(
+        encoded_path,
+        mimetype=mimetypes.guess_type(file_name)[0] or 'application/octet-stream',
+        as_attachment=as_attachment,
+        download_name=file_name,
+        conditional=True,
+        etag=etag,
+        last_modified=file_stat.st_mtime
+    )
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compressed_file_response(absolute_path, as_attachment, content_disposition):
+    """
+    如果客户端接受压缩且文件适合压缩，返回压缩后的文件响应；否则返回 None，由调用方发送原文件。
+    优先使用预压缩的兄弟文件，其次使用磁盘变体缓存，都没有时边压缩边发送并写入缓存。
+    """
+    config = current_app.config
+    if not config.get('COMPRESSION_ENABLED', False):
+        return None
+    try:
+        file_stat = os.stat(absolute_path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(file_stat.st_mode) or not _is_compressible_file(absolute_path, file_stat):
+        return None
+
+    encodable = available_encodings()
+    precompressed = {
+        encoding: found for encoding in PRECOMPRESSED_SUFFIXES
+        if (found := _find_precompressed(absolute_path, file_stat, encoding)) is not None
+    }
+    # 客户端权重相同时优先使用预压缩文件，无需消耗 CPU
+    candidates = [encoding for encoding in ('br', 'zstd', 'gzip') if encoding in precompressed]
+    candidates += [encoding for encoding in encodable if encoding not in precompressed]
+    encoding = _negotiate(candidates)
+    if encoding is None:
+        return None
+
+    if encoding in precompressed:
+        path, precompressed_stat = precompressed[encoding]
+        etag = _encoded_etag(absolute_path, file_stat, encoding, precompressed_stat.st_mtime_ns)
+        return _send_encoded_file(path, absolute_path, file_stat, encoding, etag, as_attachment)
+
+    etag = _encoded_etag(absolute_path, file_stat, encoding)
+    variant_path = _variant_path(file_stat, encoding)
+    try:
+        variant_stat = os.stat(variant_path)
+    except OSError:
+        variant_stat = None
+    if variant_stat is not None and stat.S_ISREG(variant_stat.st_mode):
+        metrics.count_cache('compression_variant', True)
+        try:
+            # 只更新 atime 作为 LRU 淘汰的最近使用时间，mtime 保持不变
+            os.utime(variant_path, ns=(time.time_ns(), variant_stat.st_mtime_ns))
+        except OSError:
+            pass
+        return _send_encoded_file(variant_path, absolute_path, file_stat, encoding, etag, as_attachment)
+
+    if file_stat.st_size > config.get('COMPRESSION_MAX_FILE_SIZE', 0):
+        return None  # 过大的文件不做动态压缩
+
+    metrics.count_cache('compression_variant', False)
+
+    file_name = os.path.basename(absolute_path)
+    last_modified = datetime.fromtimestamp(file_stat.st_mtime, tz=timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        # 变体已被淘汰但客户端的缓存仍然有效，不需要重新压缩
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(
+            _stream_and_cache(absolute_path, variant_path, encoding,
+                              config['COMPRESSION_CACHE_DIR'], config['COMPRESSION_CACHE_MAX_BYTES']),
+            mimetype=mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+        )
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Disposition'] = content_disposition
+    response.vary.add('Accept-Encoding')
+    # 与之后从变体缓存发送时的校验值相同，客户端可以用它发起条件请求
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+
+def compress_response(response):
+    """
+    after_request 钩子：对 HTML、JSON 等已在内存中的响应按 Accept-Encoding 进行压缩。
+    文件响应（direct_passthrough）、流式响应和已编码的响应保持不变。
+    """
+    config = current_app.config
+    if not config.get('COMPRESSION_ENABLED', False) or \
+            response.direct_passthrough or response.is_streamed or \
+            response.status_code < 200 or response.status_code in (204, 206, 304) or \
+            'Content-Encoding' in response.headers or \
+            response.mimetype not in _COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config.get('COMPRESSION_MIN_SIZE', 0):
+        return response
+    encoding = _negotiate(available_encodings())
+    if encoding is None:
+        return response
+
+    encoder = _make_encoder(encoding)
+    response.set_data(encoder.compress(data) + encoder.flush())
+    response.headers['Content-Encoding'] = encoding
+    return response
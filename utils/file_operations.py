@@ -1,18 +1,56 @@
+import base64
 import fnmatch
+import functools
 import os
+import re
 import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import magic
 from flask import current_app
 
+from utils import local_cache, metrics, roots
+from utils.lru_cache import LRUCache
 
+# 目录列表缓存（每个 worker 进程一份），在首次使用时根据配置创建
+_listing_cache = None
+_listing_cache_lock = threading.Lock()
+# 目录 mtime 距今小于该秒数时不写入缓存，避免同一时间戳内的修改被漏掉
+_LISTING_CACHE_MIN_AGE = 1.0
+
+# 每个线程复用的 libmagic 句柄，以及按文件身份缓存的 MIME 类型
+_magic_local = threading.local()
+_mime_cache = None
+_mime_cache_lock = threading.Lock()
+
+# tail 模式从文件末尾向前读取时的块大小
+_TAIL_BLOCK_SIZE = 64 * 1024
+
+# 大目录并行 stat/分类使用的线程池（每个 worker 进程一份）
+_listing_executor = None
+_listing_executor_lock = threading.Lock()
+
+
+class InvalidListingQuery(ValueError):
+    """
+    分页列表请求的参数（排序方式、游标等）无效。
+    """
+
+
+@metrics.timed('resolve_path')
 def _get_absolute_path(relative_path):
     """
     将相对路径转换为相对于 FILE_SERVER_ROOT_DIR 的绝对路径。
     并进行目录穿越安全检查。
+    配置了多个根目录（FILE_SERVER_ROOTS）时，路径的第一段为根目录名称，安全检查针对该根目录进行，
+    因此不能通过 .. 从一个根目录进入另一个根目录。根目录名称不存在或路径为虚拟顶层目录时抛出 FileNotFoundError。
     """
-    root_dir = current_app.config['FILE_SERVER_ROOT_DIR']
+    _, root_dir, relative_path = roots.split_path(relative_path)
+    if root_dir is None:
+        raise FileNotFoundError("The top level of multiple roots is not a directory on disk.")
     # 确保相对路径是安全的，防止目录穿越
     # os.path.normpath 规范化路径，处理 ../ 等
     # os.path.join 安全地拼接路径
@@ -27,56 +65,209 @@ def _get_absolute_path(relative_path):
     return absolute_path
 
 
+@functools.lru_cache(maxsize=16)
+def _compile_hidden_matcher(hidden_patterns):
+    """
+    将 HIDDEN_ITEMS 中的所有通配符模式编译为单个正则表达式，返回其 match 方法。
+    """
+    if not hidden_patterns:
+        return lambda item_name: None
+    return re.compile('|'.join(fnmatch.translate(pattern) for pattern in hidden_patterns)).match
+
+
+def get_hidden_matcher(hidden_patterns):
+    """
+    获取隐藏模式的编译匹配函数：对需要隐藏的名称返回真值。
+    """
+    return _compile_hidden_matcher(tuple(hidden_patterns))
+
+
+def is_hidden_item(item_name, hidden_patterns):
+    """
+    判断文件或文件夹名称是否匹配 HIDDEN_ITEMS 中的任一隐藏模式。
+    """
+    return get_hidden_matcher(hidden_patterns)(os.path.normcase(item_name)) is not None
+
+
+def _get_listing_cache():
+    """
+    获取当前进程的目录列表缓存，首次调用时根据配置创建。
+    """
+    global _listing_cache
+    if _listing_cache is None:
+        with _listing_cache_lock:
+            if _listing_cache is None:
+                _listing_cache = LRUCache(
+                    current_app.config.get('LISTING_CACHE_MAX_ENTRIES', 0),
+                    current_app.config.get('LISTING_CACHE_MAX_BYTES')
+                )
+                metrics.register_cache('listing', _listing_cache)
+    return _listing_cache
+
+
+def _estimate_listing_size(items):
+    """
+    粗略估算目录列表占用的内存字节数，用于缓存的内存上限。
+    """
+    # 每个条目的字典、布尔值、整数和时间字符串大约占用 600 字节，再加上名称和路径的长度
+    return sum(600 + 2 * (len(item['name']) + len(item['path'])) for item in items)
+
+
+def _get_listing_executor():
+    """
+    获取当前进程用于并行列目录的线程池，首次调用时根据配置创建。
+    """
+    global _listing_executor
+    if _listing_executor is None:
+        with _listing_executor_lock:
+            if _listing_executor is None:
+                _listing_executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('LISTING_PARALLEL_WORKERS', 8),
+                    thread_name_prefix='aetherserve-listing'
+                )
+    return _listing_executor
+
+
+def _scan_entry(entry, relative_path):
+    """
+    获取单个目录项的信息。无法访问的项（例如权限问题或已被删除）返回 None。
+    """
+    try:
+        # DirEntry.stat() 会缓存结果，在 Windows 上直接复用 scandir 返回的数据
+        item_stat = entry.stat()
+    except OSError:
+        return None
+    is_dir = stat.S_ISDIR(item_stat.st_mode)
+    # 一次分类同时得到文本/图片判断，复用已有的 stat 结果
+    kind = _classify(entry.path, item_stat) if stat.S_ISREG(item_stat.st_mode) else None
+    return {
+        'name': entry.name,
+        'path': os.path.join(relative_path, entry.name),  # 用于前端链接
+        'is_dir': is_dir,
+        'size': item_stat.st_size if not is_dir else 0,  # 文件夹大小通常显示为0或不显示
+        'modified_time': datetime.fromtimestamp(item_stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+        'is_text': kind == FILE_KIND_TEXT,  # 新增：是否为文本文件
+        'is_image': kind == FILE_KIND_IMAGE  # 新增：是否为图片文件
+    }
+
+
+def _scan_entries_parallel(entries, relative_path):
+    """
+    将目录项分块交给线程池处理，使 stat 和 libmagic 的 I/O 相互重叠（实验性，见 LISTING_PARALLEL_THRESHOLD）。
+    预期对 NFS 等每次 stat 都有网络往返的文件系统有收益，本地磁盘上几乎没有效果。
+    """
+    app = current_app._get_current_object()
+    # 在当前线程中先创建 MIME 缓存，工作线程会同时读取和写入它（LRUCache 内部加锁）
+    _get_mime_cache()
+    executor = _get_listing_executor()
+    num_workers = app.config.get('LISTING_PARALLEL_WORKERS', 8)
+    chunk_size = max(64, len(entries) // (num_workers * 4) + 1)
+
+    def scan_chunk(chunk):
+        with app.app_context():
+            return [_scan_entry(entry, relative_path) for entry in chunk]
+
+    futures = [executor.submit(scan_chunk, entries[i:i + chunk_size])
+               for i in range(0, len(entries), chunk_size)]
+    items = []
+    for future in futures:
+        items.extend(future.result())
+    return items
+
+
+@metrics.timed('read_directory')
+def _read_directory(absolute_path, relative_path):
+    """
+    实际读取目录内容，返回已排序的文件/文件夹信息列表。
+    目录项数量达到 LISTING_PARALLEL_THRESHOLD 时，stat 和分类在线程池中并行执行。
+    """
+    config = current_app.config
+    is_hidden = get_hidden_matcher(config.get('HIDDEN_ITEMS', []))  # 编译后的隐藏模式匹配函数
+
+    with os.scandir(absolute_path) as it:
+        # 跳过隐藏项
+        entries = [entry for entry in it if not is_hidden(os.path.normcase(entry.name))]
+
+    threshold = config.get('LISTING_PARALLEL_THRESHOLD', 0)
+    if threshold and len(entries) >= threshold and config.get('LISTING_PARALLEL_WORKERS', 8) > 1:
+        items = _scan_entries_parallel(entries, relative_path)
+    else:
+        items = [_scan_entry(entry, relative_path) for entry in entries]
+    # 忽略无法访问的文件或目录
+    items = [item for item in items if item is not None]
+
+    # 优先显示文件夹，然后按名称排序
+    items.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
+    return items
+
+
+def _root_directory_items():
+    """
+    多根目录模式下虚拟顶层目录的条目：每个根目录一个文件夹条目，按名称排序。
+    无法访问的根目录（例如尚未挂载）不会出现在列表中。
+    """
+    items = []
+    for name, root_dir in roots.named_roots().items():
+        try:
+            root_stat = os.stat(root_dir)
+        except OSError:
+            continue
+        if not stat.S_ISDIR(root_stat.st_mode):
+            continue
+        items.append({
+            'name': name,
+            'path': name,
+            'is_dir': True,
+            'size': 0,
+            'modified_time': datetime.fromtimestamp(root_stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+            'is_text': False,
+            'is_image': False
+        })
+    items.sort(key=lambda x: x['name'].lower())
+    return items
+
+
+def _get_directory_items(relative_path):
+    """
+    返回目录的已排序条目列表（可能是缓存中的共享对象，调用方不得修改）。
+    结果按目录的 (st_ino, st_mtime_ns) 缓存，目录未变化时只需一次 stat。
+    """
+    if not relative_path and roots.is_multi_root():
+        return _root_directory_items()
+    absolute_path = _get_absolute_path(relative_path)
+    try:
+        dir_stat = os.stat(absolute_path)
+    except OSError:
+        raise FileNotFoundError(f"Directory not found: {relative_path}")
+    if not stat.S_ISDIR(dir_stat.st_mode):
+        raise FileNotFoundError(f"Directory not found: {relative_path}")
+
+    cache = _get_listing_cache()
+    version = (dir_stat.st_ino, dir_stat.st_mtime_ns)
+    now = time.time()
+    ttl = current_app.config.get('LISTING_CACHE_TTL', 300)
+    cached = cache.get(absolute_path, validate=lambda v: v[0] == version and now - v[1] < ttl)
+    if cached is not None:
+        return cached[2]
+
+    items = _read_directory(absolute_path, relative_path)
+
+    # 目录在同一时间戳粒度内可能再次被修改，刚修改过的目录暂不缓存
+    if now - dir_stat.st_mtime_ns / 1e9 >= _LISTING_CACHE_MIN_AGE:
+        cache.set(absolute_path, (version, now, items), _estimate_listing_size(items))
+    return items
+
+
+@metrics.timed('list_directory')
 def list_directory(relative_path):
     """
     列出指定相对路径下的文件和文件夹。
     返回一个包含文件/文件夹信息的列表。
+    结果按目录的 (st_ino, st_mtime_ns) 缓存，目录未变化时只需一次 stat。
     """
     try:
-        absolute_path = _get_absolute_path(relative_path)
-        if not os.path.isdir(absolute_path):
-            raise FileNotFoundError(f"Directory not found: {relative_path}")
-
-        items = []
-        hidden_patterns = current_app.config.get('HIDDEN_ITEMS', [])  # 获取隐藏模式列表
-
-        for item_name in os.listdir(absolute_path):
-            # 检查是否需要隐藏该项
-            is_hidden = False
-            for pattern in hidden_patterns:
-                if fnmatch.fnmatch(item_name, pattern):
-                    is_hidden = True
-                    break
-
-            if is_hidden:
-                continue  # 跳过隐藏项
-
-            item_path = os.path.join(absolute_path, item_name)
-            item_relative_path = os.path.join(relative_path, item_name)
-            try:
-                # 获取文件状态信息，避免多次调用 os.path.isdir/isfile
-                item_stat = os.stat(item_path)
-                is_dir = stat.S_ISDIR(item_stat.st_mode)
-                size = item_stat.st_size if not is_dir else 0  # 文件夹大小通常显示为0或不显示
-                modified_time = datetime.fromtimestamp(item_stat.st_mtime)
-
-                items.append({
-                    'name': item_name,
-                    'path': item_relative_path,  # 用于前端链接
-                    'is_dir': is_dir,
-                    'size': size,
-                    'modified_time': modified_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    'is_text': is_text_file(item_relative_path) if not is_dir else False,  # 新增：是否为文本文件
-                    'is_image': is_image_file(item_relative_path) if not is_dir else False  # 新增：是否为图片文件
-                })
-            except OSError:
-                # 忽略无法访问的文件或目录（例如权限问题）
-                continue
-
-        # 优先显示文件夹，然后按名称排序
-        items.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
-        return items
-
+        # 返回副本，调用方可以安全地为条目添加 full_url 等字段
+        return [dict(item) for item in _get_directory_items(relative_path)]
     except ValueError as e:
         # 目录穿越攻击
         current_app.logger.warning(f"Security alert: {e} for path {relative_path}")
@@ -88,6 +279,78 @@ def list_directory(relative_path):
         raise Exception("Failed to list directory.")
 
 
+# 分页列表支持的排序方式（文件夹始终排在文件前面）
+LISTING_SORT_KEYS = {
+    'name': lambda item: item['name'].lower(),
+    'size': lambda item: (item['size'], item['name'].lower()),
+    'modified': lambda item: (item['modified_time'], item['name'].lower()),
+    'type': lambda item: (not item['is_text'], not item['is_image'], item['name'].lower()),
+}
+
+
+def _encode_cursor(offset):
+    """
+    将下一页的起始位置编码为不透明的游标字符串。
+    """
+    return base64.urlsafe_b64encode(f"o:{offset}".encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """
+    解析游标字符串，返回起始位置。游标无效时抛出 ValueError。
+    """
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        prefix, offset = raw.split(':', 1)
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if prefix != 'o' or offset < 0:
+        raise ValueError("Invalid cursor.")
+    return offset
+
+
+@metrics.timed('page_directory')
+def page_directory(relative_path, sort='name', descending=False, name_filter='', cursor=None, limit=200):
+    """
+    分页列出目录内容，支持服务端排序和名称过滤。
+    返回 (当前页条目列表, 过滤后的总条目数, 下一页游标或 None)。
+    只复制当前页的条目，内存占用与目录大小无关。
+    参数无效（排序方式或游标）时抛出 InvalidListingQuery，目录穿越时抛出 ValueError。
+    """
+    if sort not in LISTING_SORT_KEYS:
+        raise InvalidListingQuery(f"Unsupported sort key: {sort}")
+    try:
+        offset = _decode_cursor(cursor)
+    except ValueError as e:
+        raise InvalidListingQuery(str(e))
+
+    try:
+        items = _get_directory_items(relative_path)
+    except ValueError as e:
+        # 目录穿越攻击，原样抛出 ValueError，由路由返回 403（与 browse 一致）
+        current_app.logger.warning(f"Security alert: {e} for path {relative_path}")
+        raise
+
+    if name_filter:
+        name_filter = name_filter.lower()
+        items = [item for item in items if name_filter in item['name'].lower()]
+    if sort != 'name' or descending:
+        # 缓存中的列表已按名称升序排列，其他排序方式在此重新排序
+        key = LISTING_SORT_KEYS[sort]
+        dirs = sorted((item for item in items if item['is_dir']), key=key, reverse=descending)
+        files = sorted((item for item in items if not item['is_dir']), key=key, reverse=descending)
+        items = dirs + files
+
+    total = len(items)
+    page = [dict(item) for item in items[offset:offset + limit]]
+    next_cursor = _encode_cursor(offset + limit) if offset + limit < total else None
+    return page, total, next_cursor
+
+
+@metrics.timed('read_text_file')
 def read_text_file(relative_path):
     """
     读取指定相对路径的文本文件内容。
@@ -95,27 +358,31 @@ def read_text_file(relative_path):
     """
     try:
         absolute_path = _get_absolute_path(relative_path)
-        if not os.path.isfile(absolute_path):
+        try:
+            file_stat = os.stat(absolute_path)
+        except OSError:
+            raise FileNotFoundError(f"File not found: {relative_path}")
+        if not stat.S_ISREG(file_stat.st_mode):
             raise FileNotFoundError(f"File not found: {relative_path}")
 
-        file_size = os.path.getsize(absolute_path)
+        file_size = file_stat.st_size
         max_preview_size = current_app.config['MAX_PREVIEW_FILE_SIZE']
         is_truncated = False
         content = ""
 
         # 检查文件是否是可预览的文本文件类型
-        if not is_text_file(relative_path):  # 使用新的 is_text_file
+        if _classify(absolute_path, file_stat) != FILE_KIND_TEXT:
             return "", False  # 不是可预览的文本文件
 
-        # 处理大文件
-        if file_size > max_preview_size:
-            is_truncated = True
-            # 读取文件开头的一部分
-            with open(absolute_path, 'r', encoding='utf-8', errors='ignore') as f:
+        # 网络挂载的根目录下，热点文件从本地缓存副本读取
+        with open(local_cache.open_cached(absolute_path, file_stat), 'r', encoding='utf-8', errors='ignore') as f:
+            # 处理大文件
+            if file_size > max_preview_size:
+                is_truncated = True
+                # 读取文件开头的一部分
                 content = f.read(max_preview_size)  # 读取指定字节数
-        else:
-            # 读取整个文件
-            with open(absolute_path, 'r', encoding='utf-8', errors='ignore') as f:
+            else:
+                # 读取整个文件
                 content = f.read()
 
         return content, is_truncated
@@ -130,6 +397,166 @@ def read_text_file(relative_path):
         raise Exception("Failed to read file.")
 
 
+def _pread(fd, length, offset):
+    """
+    从文件描述符的指定偏移读取数据，不改变文件位置。没有 os.pread 的平台（Windows）回退到 lseek + read。
+    """
+    if hasattr(os, 'pread'):
+        return os.pread(fd, length, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, length)
+
+
+def _utf8_char_length(lead_byte):
+    """
+    根据 UTF-8 首字节返回字符的字节长度。
+    """
+    if lead_byte < 0x80:
+        return 1
+    if lead_byte < 0xE0:
+        return 2
+    if lead_byte < 0xF0:
+        return 3
+    return 4
+
+
+def _align_chunk_end(data):
+    """
+    返回数据块的截断位置，使其结束于行尾；找不到换行符时结束于最后一个完整的 UTF-8 字符。
+    """
+    newline = data.rfind(b'\n')
+    if newline != -1:
+        return newline + 1
+    return _utf8_boundary(data)
+
+
+def _utf8_boundary(data):
+    """
+    返回数据块中最后一个完整 UTF-8 字符之后的位置，用于在不截断多字节字符的前提下截断数据。
+    """
+    end = len(data)
+    i = end - 1
+    # 向前跳过 UTF-8 延续字节（10xxxxxx），找到最后一个字符的首字节
+    while i >= 0 and end - i < 4 and (data[i] & 0xC0) == 0x80:
+        i -= 1
+    if i >= 0 and end - i < _utf8_char_length(data[i]):
+        return i  # 最后一个字符不完整，截断在它之前
+    return end
+
+
+@metrics.timed('read_text_chunk')
+def read_text_chunk(relative_path, offset, length):
+    """
+    读取文本文件中从 offset 开始、最多 length 字节的一段原始数据，用于分块预览。
+    起点会跳过不完整的 UTF-8 字符，终点对齐到行尾（或完整的 UTF-8 字符），
+    因此把连续的块依次解码拼接即可得到完整内容。
+    返回 (数据, 实际起始偏移, 下一块的起始偏移, 文件大小)。
+    """
+    try:
+        absolute_path = _get_absolute_path(relative_path)
+        try:
+            file_stat = os.stat(absolute_path)
+        except OSError:
+            raise FileNotFoundError(f"File not found: {relative_path}")
+        if not stat.S_ISREG(file_stat.st_mode) or _classify(absolute_path, file_stat) != FILE_KIND_TEXT:
+            raise FileNotFoundError(f"Not a previewable text file: {relative_path}")
+
+        file_size = file_stat.st_size
+        offset = max(0, min(offset, file_size))
+        fd = local_cache.open_cached(absolute_path, file_stat)
+        try:
+            data = _pread(fd, length, offset)
+        finally:
+            os.close(fd)
+
+        # 起点落在多字节字符中间时，跳过其延续字节
+        start = 0
+        while start < min(3, len(data)) and (data[start] & 0xC0) == 0x80:
+            start += 1
+        end = len(data)
+        if offset + end < file_size:
+            end = _align_chunk_end(data[start:]) + start
+            if end == start:
+                end = len(data)  # length 过小时至少返回读取到的数据，避免分页停滞
+        return data[start:end], offset + start, offset + end, file_size
+
+    except ValueError as e:
+        current_app.logger.warning(f"Security alert: {e} for path {relative_path}")
+        raise FileNotFoundError("Invalid path or access denied.")
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error reading chunk of {relative_path}: {e}")
+        raise Exception("Failed to read file.")
+
+
+@metrics.timed('read_text_tail')
+def read_text_tail(relative_path, lines, max_bytes):
+    """
+    从文件末尾向前按块读取，返回最后 lines 行（最多 max_bytes 字节），不扫描文件的其余部分。
+    起点对齐到行首；达到 max_bytes 时第一行可能不完整，此时跳过该行的剩余部分。
+    返回 (数据, 起始偏移, 文件大小)。
+    """
+    try:
+        absolute_path = _get_absolute_path(relative_path)
+        try:
+            file_stat = os.stat(absolute_path)
+        except OSError:
+            raise FileNotFoundError(f"File not found: {relative_path}")
+        if not stat.S_ISREG(file_stat.st_mode) or _classify(absolute_path, file_stat) != FILE_KIND_TEXT:
+            raise FileNotFoundError(f"Not a previewable text file: {relative_path}")
+
+        # 日志文件持续追加，每次追加都会使本地缓存副本失效，因此 tail 始终读取源文件
+        fd = os.open(absolute_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            file_size = os.fstat(fd).st_size
+            chunks = []
+            position = file_size
+            newlines = 0
+            needed = None  # 需要找到的换行符个数，文件以换行符结尾时多一个
+            while position > 0 and file_size - position < max_bytes and (needed is None or newlines < needed):
+                read_size = min(_TAIL_BLOCK_SIZE, position, max_bytes - (file_size - position))
+                position -= read_size
+                block = _pread(fd, read_size, position)
+                if needed is None:
+                    needed = lines + (1 if block.endswith(b'\n') else 0)
+                chunks.append(block)
+                newlines += block.count(b'\n')
+        finally:
+            os.close(fd)
+
+        data = b''.join(reversed(chunks))
+        search_end = len(data) - 1 if data.endswith(b'\n') else len(data)
+        for _ in range(lines):
+            newline = data.rfind(b'\n', 0, search_end)
+            if newline == -1:
+                break
+            search_end = newline
+        else:
+            start = search_end + 1
+            return data[start:], position + start, file_size
+
+        start = 0
+        if position > 0:
+            # 受 max_bytes 限制没有读到行首：跳过不完整的第一行，整块都没有换行符时只跳过不完整的 UTF-8 字符
+            newline = data.find(b'\n')
+            if 0 <= newline < len(data) - 1:
+                start = newline + 1
+            else:
+                while start < min(3, len(data)) and (data[start] & 0xC0) == 0x80:
+                    start += 1
+        return data[start:], position + start, file_size
+
+    except ValueError as e:
+        current_app.logger.warning(f"Security alert: {e} for path {relative_path}")
+        raise FileNotFoundError("Invalid path or access denied.")
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error reading tail of {relative_path}: {e}")
+        raise Exception("Failed to read file.")
+
+
 def get_file_info(relative_path):
     """
     获取单个文件或文件夹的详细信息。
@@ -161,62 +588,124 @@ def get_file_info(relative_path):
         raise Exception("Failed to get file info.")
 
 
-def _get_mime_type(absolute_path):
+# 可预览文本文件的非 text/* MIME 类型
+_TEXT_MIME_TYPES = frozenset([
+    'application/json', 'application/javascript', 'application/xml',
+    'application/x-sh', 'application/x-python', 'application/x-php',
+    'application/x-java', 'application/sql', 'application/yaml',
+    'application/x-yaml', 'application/x-perl', 'application/x-ruby',
+    'application/x-go', 'application/x-swift', 'application/typescript',
+    'application/x-powershell', 'application/x-bat', 'application/csv',
+    'application/vnd.ms-excel',  # 对于某些CSV/TSV文件，可能被识别为excel
+])
+
+# 文件分类结果
+FILE_KIND_TEXT = 'text'
+FILE_KIND_IMAGE = 'image'
+FILE_KIND_OTHER = 'other'
+
+
+def _get_magic():
+    """
+    获取当前线程复用的 libmagic 句柄。
+    magic.Magic 不是线程安全的，因此每个 worker 的每个线程各持有一个。
+    """
+    handle = getattr(_magic_local, 'handle', None)
+    if handle is None:
+        handle = _magic_local.handle = magic.Magic(mime=True)
+    return handle
+
+
+def _get_mime_cache():
+    """
+    获取当前进程的 MIME 类型缓存，首次调用时根据配置创建。
+    """
+    global _mime_cache
+    if _mime_cache is None:
+        with _mime_cache_lock:
+            if _mime_cache is None:
+                _mime_cache = LRUCache(current_app.config.get('MIME_CACHE_MAX_ENTRIES', 0))
+                metrics.register_cache('mime', _mime_cache)
+    return _mime_cache
+
+
+@metrics.timed('get_mime_type')
+def _get_mime_type(absolute_path, file_stat=None):
     """
     使用 python-magic 获取文件的 MIME 类型。
+    提供 file_stat 时，结果按 (st_dev, st_ino, st_size, st_mtime_ns) 缓存。
     """
+    cache_key = None
+    if file_stat is not None:
+        cache_key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+        mime_type = _get_mime_cache().get(cache_key)
+        if mime_type is not None:
+            return mime_type
     try:
-        return magic.Magic(mime=True).from_file(absolute_path)
+        mime_type = _get_magic().from_file(absolute_path)
     except Exception as e:
         current_app.logger.debug(f"python-magic failed for {absolute_path}: {e}")
         return None
+    if cache_key is not None and mime_type:
+        _get_mime_cache().set(cache_key, mime_type)
+    return mime_type
 
 
-def is_text_file(relative_path):
+def _classify(absolute_path, file_stat):
     """
-    判断文件是否是可预览的文本文件。
-    优先使用 python-magic 进行 MIME 类型检测，如果失败或不是明确的文本类型，则回退到扩展名检查。
+    一次性判断普通文件是文本、图片还是其他文件。
+    优先使用 python-magic 进行 MIME 类型检测，如果失败或不是明确的类型，则回退到扩展名检查。
+    启用 MIME_TRUST_EXTENSIONS 时，已知扩展名直接分类，完全跳过 libmagic。
+    """
+    config = current_app.config
+    file_extension = os.path.splitext(absolute_path)[1].lower()
+    is_text_extension = file_extension in config['TEXT_FILE_EXTENSIONS']
+    is_image_extension = file_extension in config['IMAGE_FILE_EXTENSIONS']
+
+    if config.get('MIME_TRUST_EXTENSIONS', False):
+        if is_text_extension:
+            return FILE_KIND_TEXT
+        if is_image_extension:
+            return FILE_KIND_IMAGE
+
+    mime_type = _get_mime_type(absolute_path, file_stat)
+    # 常见文本 MIME 类型
+    if mime_type and (mime_type.startswith('text/') or mime_type in _TEXT_MIME_TYPES):
+        return FILE_KIND_TEXT
+    if is_text_extension:
+        return FILE_KIND_TEXT
+    # 常见图片 MIME 类型
+    if mime_type and mime_type.startswith('image/'):
+        return FILE_KIND_IMAGE
+    if is_image_extension:
+        return FILE_KIND_IMAGE
+    return FILE_KIND_OTHER
+
+
+def classify_file(relative_path):
+    """
+    判断文件是可预览的文本文件、图片文件还是其他文件。
+    返回 FILE_KIND_TEXT、FILE_KIND_IMAGE 或 FILE_KIND_OTHER；不是文件时返回 None。
     """
     absolute_path = _get_absolute_path(relative_path)
+    try:
+        file_stat = os.stat(absolute_path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(file_stat.st_mode):
+        return None  # 不是文件
+    return _classify(absolute_path, file_stat)
 
-    if not os.path.isfile(absolute_path):
-        return False  # 不是文件，所以不是文本文件。
-
-    mime_type = _get_mime_type(absolute_path)
-    if mime_type:
-        # 常见文本 MIME 类型
-        if mime_type.startswith('text/') or \
-                mime_type in ['application/json', 'application/javascript', 'application/xml',
-                              'application/x-sh', 'application/x-python', 'application/x-php',
-                              'application/x-java', 'application/sql', 'application/yaml',
-                              'application/x-yaml', 'application/x-perl', 'application/x-ruby',
-                              'application/x-go', 'application/x-swift', 'application/typescript',
-                              'application/x-powershell', 'application/x-bat', 'application/csv',
-                              'application/vnd.ms-excel',  # 对于某些CSV/TSV文件，可能被识别为excel
-                              ]:
-            return True
 
-    # 回退到扩展名检查
-    file_extension = os.path.splitext(relative_path)[1].lower()
-    return file_extension in current_app.config['TEXT_FILE_EXTENSIONS']
+def is_text_file(relative_path):
+    """
+    判断文件是否是可预览的文本文件。
+    """
+    return classify_file(relative_path) == FILE_KIND_TEXT
 
 
 def is_image_file(relative_path):
     """
     判断文件是否是可预览的图片文件。
-    优先使用 python-magic 进行 MIME 类型检测，如果失败或不是明确的图片类型，则回退到扩展名检查。
     """
-    absolute_path = _get_absolute_path(relative_path)
-
-    if not os.path.isfile(absolute_path):
-        return False
-
-    mime_type = _get_mime_type(absolute_path)
-    if mime_type:
-        # 常见图片 MIME 类型
-        if mime_type.startswith('image/'):
-            return True
-
-    # 回退到扩展名检查
-    file_extension = os.path.splitext(relative_path)[1].lower()
-    return file_extension in current_app.config['IMAGE_FILE_EXTENSIONS']
+    return classify_file(relative_path) == FILE_KIND_IMAGE
@@ -0,0 +1,106 @@
+import mimetypes
+import os
+import unicodedata
+import zlib
+from urllib.parse import quote
+
+from flask import current_app, send_file, send_from_directory
+
+from utils import compression, local_cache, roots
+
+# 支持的文件发送卸载模式
+OFFLOAD_X_ACCEL_REDIRECT = 'x-accel-redirect'  # nginx
+OFFLOAD_X_SENDFILE = 'x-sendfile'  # Apache mod_xsendfile / lighttpd
+
+
+def _content_disposition(disposition, file_name):
+    """
+    生成 Content-Disposition 头的值，非 ASCII 文件名使用 RFC 2231 编码（与 Werkzeug 的 send_file 一致）。
+    """
+    try:
+        file_name.encode('ascii')
+        return f'{disposition}; filename="{file_name}"'
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', file_name).encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(file_name, safe="!#$&+-.^_`|~")
+        return f"{disposition}; filename=\"{simple}\"; filename*=UTF-8''{quoted}"
+
+
+def _x_accel_redirect_response(absolute_path, as_attachment):
+    """
+    构建只包含 X-Accel-Redirect 头的空响应，由 nginx 的 internal location 完成实际的零拷贝发送。
+    """
+    config = current_app.config
+    # 多根目录时内部路径带有根目录名称，nginx 为每个根目录配置一个 alias 到该根目录的 location
+    name, root_dir = roots.locate(absolute_path)
+    relative_path = roots.join(name, os.path.relpath(absolute_path, root_dir).replace(os.sep, '/'))
+    internal_path = config['FILE_OFFLOAD_INTERNAL_PREFIX'].rstrip('/') + '/' + relative_path
+
+    file_name = os.path.basename(absolute_path)
+    response = current_app.response_class()
+    response.headers['X-Accel-Redirect'] = quote(internal_path)
+    response.content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+    response.headers['Content-Disposition'] = _content_disposition(
+        'attachment' if as_attachment else 'inline', file_name
+    )
+    return response
+
+
+def _send_local_copy(local_path, absolute_path, file_stat, as_attachment):
+    """
+    发送源文件的本地缓存副本。文件名、MIME 类型、Last-Modified 和 ETag 都按源文件生成
+    （ETag 与 send_from_directory 直接发送源文件时相同），因此客户端看不出响应来自副本。
+    """
+    check = zlib.adler32(absolute_path.encode()) & 0xFFFFFFFF
+    return send_file(
+        local_path,
+        as_attachment=as_attachment,
+        download_name=os.path.basename(absolute_path),
+        conditional=True,
+        etag=f"{file_stat.st_mtime}-{file_stat.st_size}-{check}",
+        last_modified=file_stat.st_mtime
+    )
+
+
+def send_file_response(absolute_path, as_attachment):
+    """
+    发送已通过 _get_absolute_path 安全检查的文件。
+    根据 FILE_OFFLOAD_MODE 返回 X-Accel-Redirect 或 X-Sendfile 响应交给前端代理发送，
+    未配置卸载模式时由 worker 自己发送（文本文件可能被压缩，热点文件可能从本地缓存副本发送），
+    否则回退到 send_from_directory。
+    """
+    mode = current_app.config.get('FILE_OFFLOAD_MODE', '')
+    if mode == OFFLOAD_X_ACCEL_REDIRECT:
+        return _x_accel_redirect_response(absolute_path, as_attachment)
+
+    if not mode:
+        # 由 Flask 自己发送时，对文本文件按 Accept-Encoding 发送预压缩或动态压缩的版本
+        response = compression.compressed_file_response(
+            absolute_path,
+            as_attachment,
+            _content_disposition('attachment' if as_attachment else 'inline', os.path.basename(absolute_path))
+        )
+        if response is not None:
+            return response
+
+        # 网络挂载的根目录下，热点文件从本地缓存副本发送
+        if current_app.config.get('LOCAL_CACHE_ENABLED', False):
+            try:
+                file_stat = os.stat(absolute_path)
+            except OSError:
+                file_stat = None
+            local_path = absolute_path if file_stat is None else local_cache.cached_path(absolute_path, file_stat)
+            if local_path != absolute_path:
+                try:
+                    # send_file 在返回之前就会打开副本，之后副本被淘汰也不影响发送
+                    return _send_local_copy(local_path, absolute_path, file_stat, as_attachment)
+                except FileNotFoundError:
+                    pass  # 副本刚被其他 worker 淘汰，改为发送源文件
+
+    # X-Sendfile 模式由 Flask 的 USE_X_SENDFILE 配置处理：send_from_directory 只写入 X-Sendfile 头，不读取文件内容
+    # send_from_directory 会自动处理 MIME 类型和条件请求
+    return send_from_directory(
+        os.path.dirname(absolute_path),
+        os.path.basename(absolute_path),
+        as_attachment=as_attachment
+    )
@@ -0,0 +1,42 @@
+import threading
+import time
+
+from flask import current_app
+
+from utils import metrics
+from utils.lru_cache import LRUCache
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache():
+    """
+    获取当前进程的渲染片段缓存，首次调用时根据配置创建。
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LRUCache(
+                    current_app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 0),
+                    current_app.config.get('FRAGMENT_CACHE_MAX_BYTES')
+                )
+                metrics.register_cache('fragment', _cache)
+    return _cache
+
+
+def get(key):
+    """
+    获取已渲染的 HTML 片段及其附带数据，未命中或超过 FRAGMENT_CACHE_TTL 时返回 None。
+    """
+    ttl = current_app.config.get('FRAGMENT_CACHE_TTL', 0)
+    entry = _get_cache().get(key, validate=lambda cached: time.monotonic() - cached[0] < ttl)
+    return None if entry is None else entry[1]
+
+
+def put(key, html, *extra):
+    """
+    缓存渲染好的 HTML 片段。extra 为随片段一起返回的其他数据（例如总条目数和游标）。
+    """
+    _get_cache().set(key, (time.monotonic(), (html,) + extra), size=2 * len(html) + 200)
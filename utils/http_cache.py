@@ -0,0 +1,119 @@
+import hashlib
+import os
+import stat
+from datetime import datetime, timezone
+
+from flask import current_app, request
+from werkzeug.http import is_resource_modified
+
+from utils import roots
+from utils.file_operations import _get_absolute_path
+
+# 影响 HTML 页面内容的配置项，任一变化都会使所有 ETag 失效
+_FINGERPRINT_CONFIG_KEYS = (
+    'FILE_SERVER_ROOT_DIR', 'FILE_SERVER_ROOTS', 'HIDDEN_ITEMS', 'TEXT_FILE_EXTENSIONS', 'IMAGE_FILE_EXTENSIONS',
+    'MIME_TRUST_EXTENSIONS', 'MAX_PREVIEW_FILE_SIZE', 'PREVIEW_CHUNKED', 'PREVIEW_CHUNK_SIZE',
+    'LISTING_PAGE_SIZE', 'THUMBNAIL_ENABLED', 'THUMBNAIL_SIZES', 'CONTENT_SEARCH_SNIPPETS_PER_FILE',
+    'SEARCH_PAGE_SIZE', 'PREVIEW_TAIL_EXTENSIONS', 'PREVIEW_TAIL_LINES', 'PREVIEW_FOLLOW_ENABLED',
+)
+
+_fingerprints = {}
+
+
+def config_fingerprint():
+    """
+    返回影响页面渲染的配置和模板的哈希值。
+    模板文件的 mtime 也参与计算，因此重新部署模板后旧的 ETag 会失效。
+    结果只依赖磁盘和配置内容，所有 Gunicorn worker 计算出的值一致。
+    """
+    config = current_app.config
+    config_values = repr([(key, config.get(key)) for key in _FINGERPRINT_CONFIG_KEYS])
+    fingerprint = _fingerprints.get(config_values)
+    if fingerprint is None:
+        digest = hashlib.sha1(config_values.encode('utf-8'))
+        template_dir = os.path.join(current_app.root_path, current_app.template_folder or 'templates')
+        for name in sorted(os.listdir(template_dir)):
+            digest.update(f"{name}:{os.stat(os.path.join(template_dir, name)).st_mtime_ns}".encode('utf-8'))
+        fingerprint = _fingerprints[config_values] = digest.hexdigest()[:16]
+    return fingerprint
+
+
+def make_etag(*parts):
+    """
+    根据给定的组成部分、配置指纹和请求的根 URL（页面中包含绝对 URL）生成 ETag 值（不含引号）。
+    """
+    raw = '|'.join(str(part) for part in (config_fingerprint(), request.url_root) + parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24]
+
+
+def _stat_validators(relative_path, expect_dir, *parts):
+    """
+    对路径执行一次 stat，返回 (etag, last_modified)。parts 为影响页面内容的其他因素（例如预览模式）。
+    路径不存在或类型不符时抛出 FileNotFoundError，目录穿越时抛出 ValueError。
+    """
+    absolute_path = _get_absolute_path(relative_path)
+    try:
+        path_stat = os.stat(absolute_path)
+    except OSError:
+        raise FileNotFoundError(f"Path not found: {relative_path}")
+    if expect_dir and not stat.S_ISDIR(path_stat.st_mode):
+        raise FileNotFoundError(f"Directory not found: {relative_path}")
+    if not expect_dir and not stat.S_ISREG(path_stat.st_mode):
+        raise FileNotFoundError(f"File not found: {relative_path}")
+    etag = make_etag(path_stat.st_dev, path_stat.st_ino, path_stat.st_size, path_stat.st_mtime_ns, *parts)
+    last_modified = datetime.fromtimestamp(path_stat.st_mtime, tz=timezone.utc)
+    return etag, last_modified
+
+
+def directory_validators(relative_path):
+    """
+    目录列表页的校验值：基于目录自身的 inode 和 mtime 以及配置指纹。
+    多根目录模式下的虚拟顶层目录基于所有根目录的 inode 和 mtime（无法访问的根目录也参与计算，挂载后 ETag 随之变化）。
+    """
+    if not relative_path and roots.is_multi_root():
+        parts, newest = [], 0
+        for name, root_dir in roots.named_roots().items():
+            try:
+                root_stat = os.stat(root_dir)
+            except OSError:
+                parts.append((name, None))
+                continue
+            parts.append((name, root_stat.st_dev, root_stat.st_ino, root_stat.st_mtime_ns))
+            newest = max(newest, root_stat.st_mtime)
+        return make_etag('roots', *parts), datetime.fromtimestamp(newest, tz=timezone.utc)
+    return _stat_validators(relative_path, expect_dir=True)
+
+
+def file_validators(relative_path, *parts):
+    """
+    文件预览页的校验值：基于文件的 inode、大小和 mtime、配置指纹以及 parts。
+    """
+    return _stat_validators(relative_path, False, *parts)
+
+
+def _set_cache_headers(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # 允许 nginx 等共享缓存进行短时间的微缓存，过期后必须重新验证
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('HTML_CACHE_MAX_AGE', 0)
+    response.cache_control.must_revalidate = True
+    return response
+
+
+def not_modified_response(etag, last_modified=None):
+    """
+    如果请求的 If-None-Match / If-Modified-Since 表明客户端缓存仍然有效，返回 304 响应；否则返回 None。
+    应在执行任何列表或渲染工作之前调用。
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return _set_cache_headers(current_app.response_class(status=304), etag, last_modified)
+
+
+def cacheable(response, etag, last_modified=None):
+    """
+    为渲染好的页面添加 ETag、Last-Modified 和 Cache-Control 头。
+    """
+    return _set_cache_headers(current_app.make_response(response), etag, last_modified)
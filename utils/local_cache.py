@@ -0,0 +1,249 @@
+import hashlib
+import os
+import shutil
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+
+from utils import metrics
+from utils.lru_cache import LRUCache
+
+try:
+    import fcntl  # 仅在类 Unix 系统上可用，用于在多个 worker 之间合并同一文件的填充
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# 复制文件时每次读取的块大小
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+# 正在填充中的本地副本：缓存路径 -> Future，并发未命中同一文件时只复制一次
+_pending = {}
+_pending_lock = threading.Lock()
+_evict_lock = threading.Lock()
+# 本进程估算的缓存总字节数，首次填充时通过遍历缓存目录初始化
+_cache_bytes = None
+# 尚未缓存的文件的请求次数：缓存路径 -> 次数，达到 LOCAL_CACHE_MIN_REQUESTS 才复制到本地
+_request_counts = None
+_request_counts_lock = threading.Lock()
+
+
+def _stat_key(file_stat):
+    return file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+def _cache_path(file_stat):
+    """
+    返回本地副本在缓存目录中的路径，以源文件的 (设备, inode, 大小, mtime) 为键。
+    源文件被修改后键随之变化，旧副本不再被使用，最终被 LRU 淘汰。
+    """
+    key = f"{file_stat.st_dev}:{file_stat.st_ino}:{file_stat.st_size}:{file_stat.st_mtime_ns}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(current_app.config['LOCAL_CACHE_DIR'], digest[:2], digest)
+
+
+def _get_request_counts():
+    global _request_counts
+    if _request_counts is None:
+        with _request_counts_lock:
+            if _request_counts is None:
+                _request_counts = LRUCache(current_app.config.get('LOCAL_CACHE_MAX_TRACKED', 100000))
+    return _request_counts
+
+
+def _get_executor():
+    """
+    获取当前进程的填充线程池，首次调用时根据配置创建。
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('LOCAL_CACHE_FILL_WORKERS', 4),
+                    thread_name_prefix='aetherserve-local-cache'
+                )
+    return _executor
+
+
+@metrics.timed('local_cache_fill')
+def _fill(source_path, dest_path, key):
+    """
+    在线程池中运行：把源文件复制到 dest_path。复制前后源文件的 (inode, 大小, mtime) 与 key 不一致时放弃。
+    通过 dest_path.lock 的文件锁与其他 worker 互斥，拿到锁后副本已存在（其他 worker 刚刚填充完成）时直接返回。
+    返回是否得到了有效的副本。
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    lock_path = dest_path + '.lock'
+    with open(lock_path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.isfile(dest_path):
+                return True
+            tmp_path = f"{dest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(source_path, 'rb') as source:
+                    if _stat_key(os.fstat(source.fileno())) != key:
+                        return False
+                    with open(tmp_path, 'wb') as dest:
+                        shutil.copyfileobj(source, dest, _COPY_CHUNK_SIZE)
+                    if _stat_key(os.fstat(source.fileno())) != key:
+                        os.remove(tmp_path)
+                        return False
+                os.replace(tmp_path, dest_path)
+            except OSError:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            return True
+        finally:
+            # 持有锁时删除锁文件；正在等待旧锁文件的 worker 拿到锁后会看到已完成的副本
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+
+def _scan_and_evict(cache_dir, max_bytes):
+    """
+    统计缓存目录的总大小，超过 max_bytes 时按最近使用时间（mtime，命中时会更新）删除最旧的副本。
+    返回清理后的总字节数。
+    """
+    copies = []
+    total = 0
+    for dirpath, _, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            if filename.endswith(('.tmp', '.lock')):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                continue
+            copies.append((file_stat.st_mtime, file_stat.st_size, path))
+            total += file_stat.st_size
+    if total > max_bytes:
+        copies.sort()
+        for _, file_size, path in copies:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= file_size
+            except OSError:
+                pass
+    return total
+
+
+def _record_copy(cache_dir, max_bytes, dest_path):
+    """
+    记录新填充的副本大小。只有估算的总大小超过上限时才遍历缓存目录进行淘汰（清理到上限的 90%）。
+    """
+    global _cache_bytes
+    with _evict_lock:
+        if _cache_bytes is None:
+            _cache_bytes = _scan_and_evict(cache_dir, max_bytes)
+            return
+        try:
+            _cache_bytes += os.path.getsize(dest_path)
+        except OSError:
+            return
+        if _cache_bytes > max_bytes:
+            _cache_bytes = _scan_and_evict(cache_dir, int(max_bytes * 0.9))
+
+
+def _submit(source_path, dest_path, key):
+    """
+    提交填充任务。同一副本已在填充中时复用同一个 Future。
+    """
+    config = current_app.config
+    with _pending_lock:
+        future = _pending.get(dest_path)
+        if future is not None:
+            return future
+        future = _get_executor().submit(_fill, source_path, dest_path, key)
+        _pending[dest_path] = future
+
+    cache_dir, max_bytes = config['LOCAL_CACHE_DIR'], config['LOCAL_CACHE_MAX_BYTES']
+
+    def done(finished):
+        with _pending_lock:
+            _pending.pop(dest_path, None)
+        if finished.exception() is None and finished.result():
+            _record_copy(cache_dir, max_bytes, dest_path)
+
+    future.add_done_callback(done)
+    return future
+
+
+def cached_path(absolute_path, file_stat=None):
+    """
+    返回读取该文件时应使用的路径：本地副本有效时返回副本路径，否则返回源文件路径。
+    副本以源文件的 stat 结果校验，不读取源文件内容。文件被请求 LOCAL_CACHE_MIN_REQUESTS 次后开始复制到本地，
+    最多等待 LOCAL_CACHE_FILL_WAIT 秒，超时（例如大文件）时本次仍读取源文件，复制在后台继续完成。
+    absolute_path 必须已经通过 _get_absolute_path 的安全检查。
+    返回的副本随时可能被其他 worker 的 LRU 淘汰删除，调用方打开副本遇到 FileNotFoundError 时应改为读取源文件
+    （或直接使用 open_cached）。
+    """
+    config = current_app.config
+    if not config.get('LOCAL_CACHE_ENABLED', False):
+        return absolute_path
+    if file_stat is None:
+        try:
+            file_stat = os.stat(absolute_path)
+        except OSError:
+            return absolute_path
+    if not stat.S_ISREG(file_stat.st_mode) or not 0 < file_stat.st_size <= config['LOCAL_CACHE_MAX_FILE_SIZE']:
+        return absolute_path
+
+    dest_path = _cache_path(file_stat)
+    if os.path.isfile(dest_path):
+        metrics.count_cache('local_file', True)
+        try:
+            os.utime(dest_path)  # 更新 mtime，作为 LRU 淘汰的最近使用时间
+        except OSError:
+            pass
+        return dest_path
+
+    metrics.count_cache('local_file', False)
+    with _pending_lock:
+        future = _pending.get(dest_path)
+    if future is None:
+        # 没有正在进行的填充时才计数，已在填充中的文件直接等待同一次复制
+        counts = _get_request_counts()
+        requests = counts.get(dest_path, 0) + 1
+        if requests < config.get('LOCAL_CACHE_MIN_REQUESTS', 1):
+            counts.set(dest_path, requests)
+            return absolute_path
+        counts.pop(dest_path)
+        future = _submit(absolute_path, dest_path, _stat_key(file_stat))
+
+    try:
+        if future.result(timeout=config.get('LOCAL_CACHE_FILL_WAIT', 2)):
+            return dest_path
+    except FutureTimeoutError:
+        pass
+    except Exception as e:
+        current_app.logger.warning(f"Local cache fill failed for {absolute_path}: {e}")
+    return absolute_path
+
+
+def open_cached(absolute_path, file_stat=None):
+    """
+    以只读方式打开读取该文件时应使用的文件（见 cached_path），返回文件描述符。
+    本地副本在 cached_path 返回之后被淘汰时，改为打开源文件。
+    """
+    flags = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+    read_path = cached_path(absolute_path, file_stat)
+    try:
+        return os.open(read_path, flags)
+    except FileNotFoundError:
+        if read_path == absolute_path:
+            raise
+        return os.open(absolute_path, flags)
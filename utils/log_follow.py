@@ -0,0 +1,249 @@
+import json
+import os
+import threading
+import time
+
+from utils.file_operations import _pread, _utf8_boundary
+
+# 每个进程中正在被跟随的文件：绝对路径 -> _Watcher
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+class TooManyFollowers(Exception):
+    """
+    当前进程跟随文件的连接数已达到上限。
+    """
+
+
+class _Watcher:
+    """
+    轮询单个文件的大小，把新追加的内容读入内存缓冲区，供所有跟随该文件的客户端共享。
+    同一进程中无论有多少客户端在跟随，每个轮询周期都只有一次 stat 和（有新内容时）一次读取。
+    文件被截断或轮转（inode 变化）时 epoch 加一，缓冲区从新文件的开头重新计数。
+    """
+
+    def __init__(self, absolute_path, poll_interval, buffer_bytes):
+        self.absolute_path = absolute_path
+        self.poll_interval = poll_interval
+        self.buffer_bytes = buffer_bytes
+        self.subscribers = 0
+        self.epoch = 0
+        self.condition = threading.Condition()
+        try:
+            file_stat = os.stat(absolute_path)
+            self.identity = (file_stat.st_dev, file_stat.st_ino)
+            self.size = file_stat.st_size  # 已读入的内容的结束偏移
+        except OSError:
+            self.identity = None
+            self.size = 0
+        self.base = self.size  # 缓冲区第一个字节对应的文件偏移
+        self.buffer = bytearray()
+
+    def _poll(self):
+        try:
+            file_stat = os.stat(self.absolute_path)
+        except OSError:
+            return  # 文件暂时不存在（例如轮转过程中），等待下一次轮询
+        identity = (file_stat.st_dev, file_stat.st_ino)
+        with self.condition:
+            if identity != self.identity or file_stat.st_size < self.size:
+                self.identity = identity
+                self.epoch += 1
+                self.size = self.base = 0
+                self.buffer = bytearray()
+                self.condition.notify_all()
+            start = self.size
+        if file_stat.st_size <= start:
+            return
+
+        # 两次轮询之间追加的内容超过缓冲区大小时只读取最后 buffer_bytes 字节，落后的客户端直接从文件补读
+        start = max(start, file_stat.st_size - self.buffer_bytes)
+        try:
+            fd = os.open(self.absolute_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                data = _pread(fd, file_stat.st_size - start, start)
+            finally:
+                os.close(fd)
+        except OSError:
+            return
+        if start > self.size:
+            # 跳过的位置可能落在多字节字符中间
+            skip = 0
+            while skip < min(3, len(data)) and (data[skip] & 0xC0) == 0x80:
+                skip += 1
+            data, start = data[skip:], start + skip
+        data = data[:_utf8_boundary(data)]  # 不完整的 UTF-8 字符留到下一次轮询
+        if not data:
+            return
+
+        with self.condition:
+            if identity != self.identity:
+                return
+            if start > self.size:
+                self.buffer = bytearray()
+                self.base = start
+            self.buffer += data
+            self.size = start + len(data)
+            overflow = len(self.buffer) - self.buffer_bytes
+            if overflow > 0:
+                del self.buffer[:overflow]
+                self.base += overflow
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with _watchers_lock:
+                if self.subscribers == 0:
+                    _watchers.pop(self.absolute_path, None)
+                    return
+            self._poll()
+            time.sleep(self.poll_interval)
+
+    def wait(self, epoch, offset, max_bytes, timeout):
+        """
+        等待 offset 之后的新内容，最多等待 timeout 秒。
+        返回 ('reset', 新 epoch)（文件被截断或轮转）、('data', (数据, 数据的起始偏移)) 或 None（超时）。
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.epoch != epoch or self.size > offset, timeout)
+            if self.epoch != epoch:
+                return 'reset', self.epoch
+            if self.size <= offset:
+                return None
+            if offset >= self.base:
+                start = offset - self.base
+                return 'data', (bytes(self.buffer[start:start + max_bytes]), offset)
+            end = min(self.base, offset + max_bytes)
+
+        # 客户端落后于缓冲区（刚开始跟随或追加速度过快），直接从文件补读
+        try:
+            fd = os.open(self.absolute_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                data = _pread(fd, end - offset, offset)
+            finally:
+                os.close(fd)
+        except OSError:
+            return None
+        if not data:
+            return None
+        return 'data', (data[:_utf8_boundary(data)] or data, offset)
+
+
+def _subscribe(absolute_path, poll_interval, buffer_bytes, max_clients):
+    with _watchers_lock:
+        if sum(watcher.subscribers for watcher in _watchers.values()) >= max_clients:
+            raise TooManyFollowers(absolute_path)
+        watcher = _watchers.get(absolute_path)
+        if watcher is None:
+            watcher = _watchers[absolute_path] = _Watcher(absolute_path, poll_interval, buffer_bytes)
+            threading.Thread(target=watcher.run, name='aetherserve-follow', daemon=True).start()
+        watcher.subscribers += 1
+    return watcher
+
+
+def _unsubscribe(watcher):
+    with _watchers_lock:
+        watcher.subscribers -= 1
+
+
+def _event(event=None, event_id=None, data=None):
+    lines = []
+    if event is not None:
+        lines.append(f"event: {event}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def parse_event_id(value):
+    """
+    解析客户端重连时发送的 Last-Event-ID（"<inode>-<偏移>"），无效时返回 None。
+    """
+    try:
+        inode, offset = (int(part) for part in value.split('-', 1))
+    except (AttributeError, ValueError):
+        return None
+    if offset < 0:
+        return None
+    return inode, offset
+
+
+def follow(absolute_path, inode, offset, config):
+    """
+    返回以 Server-Sent Events 格式推送文件新追加内容的响应体，响应关闭时取消跟随。
+    inode 和 offset 为客户端已读取到的位置（inode 为 None 时不检查文件是否已轮转），
+    offset 为 None 时从当前文件末尾开始。inode 不一致或 offset 超过文件大小时先发送 reset 事件，再从头开始。
+    连接超过 PREVIEW_FOLLOW_MAX_DURATION 秒后结束，浏览器的 EventSource 会带着 Last-Event-ID 自动重连。
+    当前进程的跟随连接数已达上限时抛出 TooManyFollowers。
+    响应体在请求上下文之外迭代，所需配置在调用时从 config 中读取。
+    """
+    watcher = _subscribe(
+        absolute_path,
+        config.get('PREVIEW_FOLLOW_POLL_INTERVAL', 1.0),
+        config.get('PREVIEW_FOLLOW_BUFFER_BYTES', 1024 * 1024),
+        config.get('PREVIEW_FOLLOW_MAX_CLIENTS', 16)
+    )
+    return _FollowStream(watcher, _generate(
+        watcher, inode, offset,
+        config.get('PREVIEW_CHUNK_SIZE', 256 * 1024),
+        config.get('PREVIEW_FOLLOW_KEEPALIVE', 15),
+        time.monotonic() + config.get('PREVIEW_FOLLOW_MAX_DURATION', 600)
+    ))
+
+
+class _FollowStream:
+    """
+    响应体：关闭时（包括生成器尚未开始迭代就被关闭的情况）取消对文件的跟随。
+    """
+
+    def __init__(self, watcher, events):
+        self._watcher = watcher
+        self._events = events
+        self._closed = False
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._events.close()
+            _unsubscribe(self._watcher)
+
+
+def _current_inode(watcher):
+    with watcher.condition:
+        return watcher.identity[1] if watcher.identity else None
+
+
+def _generate(watcher, inode, offset, max_bytes, keepalive, deadline):
+    with watcher.condition:
+        epoch, size = watcher.epoch, watcher.size
+    current_inode = _current_inode(watcher)
+    position = size if offset is None else offset
+    yield b'retry: 3000\n\n'
+    if (inode is not None and inode != current_inode) or position > size:
+        yield _event('reset', f"{current_inode}-0", {'inode': current_inode})
+        position = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        result = watcher.wait(epoch, position, max_bytes, min(keepalive, remaining))
+        if result is None:
+            yield b': keepalive\n\n'  # 保持代理连接，并及时发现已断开的客户端
+            continue
+        kind, value = result
+        current_inode = _current_inode(watcher)
+        if kind == 'reset':
+            epoch, position = value, 0
+            yield _event('reset', f"{current_inode}-0", {'inode': current_inode})
+            continue
+        data, start = value
+        position = start + len(data)
+        yield _event(None, f"{current_inode}-{position}", {
+            'offset': start,
+            'text': data.decode('utf-8', errors='ignore'),
+        })
@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存，同时按条目数和估算的内存字节数进行淘汰。
+    """
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (value, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None, validate=None):
+        """
+        获取缓存值，并将其标记为最近使用。未命中时返回 default。
+        如果提供了 validate 且其对缓存值返回 False，则该条目视为过期：移除并按未命中处理。
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and validate is not None and not validate(entry[0]):
+                del self._data[key]
+                self._total_bytes -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size=0):
+        """
+        写入缓存值。size 为该条目的估算字节数，用于按内存上限淘汰。
+        单个条目超过内存上限时不会被缓存。
+        """
+        if self.max_entries <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._data[key] = (value, size)
+            self._total_bytes += size
+            while len(self._data) > self.max_entries or \
+                    (self.max_bytes is not None and self._total_bytes > self.max_bytes):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def pop(self, key):
+        """
+        移除并返回缓存值，不存在时返回 None。
+        """
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            self._total_bytes -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        """
+        清空缓存。
+        """
+        with self._lock:
+            self._data.clear()
+            self._total_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
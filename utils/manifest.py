@@ -0,0 +1,273 @@
+import bisect
+import hashlib
+import os
+import stat
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import current_app
+
+from utils import roots
+from utils.file_operations import get_hidden_matcher
+from utils.search_index import _PersistentIndex, _maintain
+
+# 计算 SHA-256 时每次读取的块大小
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ManifestOutOfRange(Exception):
+    """
+    请求的 since 早于保留的删除记录，或晚于当前清单，无法给出准确的增量，客户端需要重新获取完整清单。
+    """
+
+
+def _sha256(absolute_path, key):
+    """
+    计算文件的 SHA-256。计算前后 (inode, 大小, mtime_ns) 不一致（文件正在被修改）或无法读取时返回 None。
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(absolute_path, 'rb') as f:
+            if _stat_key(os.fstat(f.fileno())) != key:
+                return None
+            while True:
+                chunk = f.read(_HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+            if _stat_key(os.fstat(f.fileno())) != key:
+                return None
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _stat_key(file_stat):
+    return file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+class ManifestIndex(_PersistentIndex):
+    """
+    供镜像同步使用的文件清单：每个文件的大小、mtime 和 SHA-256，以及每个条目最后一次变化时的 generation。
+
+    后台重扫时按 (inode, 大小, mtime_ns) 判断文件是否变化，变化的文件先以 sha256=None 出现在清单中，
+    再由线程池计算哈希；重命名的文件按原来的键直接复用哈希。哈希计算完成也算作一次变化（递增 generation），
+    因此镜像通过 since 增量请求就能拿到之前尚未计算完成的哈希。
+    删除的文件保留删除记录（墓碑）max_tombstone_age 秒，更早的 since 无法给出增量。
+    """
+
+    def __init__(self, root_dir, hidden_patterns, index_file, hash_workers, save_interval, max_tombstone_age):
+        super().__init__(root_dir, hidden_patterns, index_file)
+        self.hash_workers = hash_workers
+        self.save_interval = save_interval
+        self.max_tombstone_age = max_tombstone_age
+        self.index_id = uuid.uuid4().hex  # 索引重建（例如删除了索引文件）后 generation 会重新计数
+        # 相对路径 -> (inode, 大小, mtime_ns, sha256 或 None, 最后变化的 generation)
+        self._files = {}
+        self._paths = []  # 排序后的相对路径，按目录前缀二分查找
+        self._tombstones = {}  # 相对路径 -> (删除时的 generation, 删除时间)
+        self.floor = 0  # 早于该 generation 的删除记录已被清理
+
+    def _state(self):
+        return {
+            'index_id': self.index_id,
+            'files': self._files,
+            'tombstones': self._tombstones,
+            'floor': self.floor,
+        }
+
+    def _restore(self, data):
+        self.index_id = data['index_id']
+        self._files, self._tombstones, self.floor = data['files'], data['tombstones'], data['floor']
+        self._paths = sorted(self._files)
+
+    def _scan(self):
+        """
+        遍历目录树，返回 {相对路径: stat 结果}，跳过隐藏项、非普通文件以及指向根目录之外的符号链接。
+        """
+        is_hidden = get_hidden_matcher(self.hidden_patterns)
+        root_real = os.path.realpath(self.root_dir)
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(self.root_dir):
+            dirnames[:] = [d for d in dirnames if not is_hidden(os.path.normcase(d))]
+            rel_dir = os.path.relpath(dirpath, self.root_dir).replace(os.sep, '/')
+            for name in filenames:
+                if is_hidden(os.path.normcase(name)):
+                    continue
+                absolute_path = os.path.join(dirpath, name)
+                try:
+                    file_stat = os.stat(absolute_path)
+                except OSError:
+                    continue
+                if not stat.S_ISREG(file_stat.st_mode):
+                    continue
+                if os.path.islink(absolute_path) and \
+                        os.path.commonpath([root_real, os.path.realpath(absolute_path)]) != root_real:
+                    continue
+                found[name if rel_dir == '.' else f"{rel_dir}/{name}"] = file_stat
+        return found
+
+    def refresh(self):
+        """
+        执行一次增量重扫并计算缺失的哈希。返回是否有变化。
+        哈希计算可能耗时很长，期间每隔 save_interval 秒保存一次，使其他 worker 能看到进度。
+        """
+        found = self._scan()
+        # 旧条目的 stat 键 -> 哈希，用于重命名和未变化文件的复用
+        known_hashes = {entry[:3]: entry[3] for entry in self._files.values() if entry[3] is not None}
+        changed = {}
+        for rel_path, file_stat in found.items():
+            key = _stat_key(file_stat)
+            old = self._files.get(rel_path)
+            if old is None or old[:3] != key:
+                changed[rel_path] = key
+        removed = [rel_path for rel_path in self._files if rel_path not in found]
+
+        now = time.time()
+        expired = [rel_path for rel_path, (_, deleted_at) in self._tombstones.items()
+                   if now - deleted_at > self.max_tombstone_age]
+        has_changes = bool(changed or removed or expired) or not self.ready
+        if has_changes:
+            with self._lock:
+                generation = self.generation + 1
+                for rel_path in expired:
+                    self.floor = max(self.floor, self._tombstones.pop(rel_path)[0])
+                for rel_path in removed:
+                    del self._files[rel_path]
+                    self._tombstones[rel_path] = (generation, now)
+                for rel_path, key in changed.items():
+                    self._files[rel_path] = key + (known_hashes.get(key), generation)
+                    self._tombstones.pop(rel_path, None)
+                if changed or removed:
+                    self._paths = sorted(self._files)
+                self.generation = generation
+                self.ready = True
+
+        pending = [(rel_path, entry[:3]) for rel_path, entry in self._files.items() if entry[3] is None]
+        if pending:
+            self._hash_pending(pending)
+            has_changes = True
+        return has_changes
+
+    def _hash_pending(self, pending):
+        """
+        在线程池中计算尚无哈希的文件，按批写回索引并递增 generation。
+        """
+        computed = []
+        last_save = time.monotonic()
+        with ThreadPoolExecutor(self.hash_workers, thread_name_prefix='aetherserve-manifest-hash') as executor:
+            futures = {
+                executor.submit(_sha256, os.path.join(self.root_dir, rel_path), key): (rel_path, key)
+                for rel_path, key in pending
+            }
+            for future in as_completed(futures):
+                digest = future.result()
+                if digest is not None:
+                    computed.append(futures[future] + (digest,))
+                if computed and time.monotonic() - last_save >= self.save_interval:
+                    self._apply_hashes(computed)
+                    computed = []
+                    self.save()
+                    last_save = time.monotonic()
+        if computed:
+            self._apply_hashes(computed)
+
+    def _apply_hashes(self, computed):
+        with self._lock:
+            generation = self.generation + 1
+            for rel_path, key, digest in computed:
+                entry = self._files.get(rel_path)
+                if entry is not None and entry[:3] == key:
+                    self._files[rel_path] = key + (digest, generation)
+            self.generation = generation
+
+    def entries(self, relative_dir, since=None):
+        """
+        返回 (generation, 条目生成器)。条目为 relative_dir 下的文件，since 不为 None 时只包含
+        在 since 之后新增、修改（包括哈希计算完成）或删除的条目。
+        since 超出可以给出增量的范围时抛出 ManifestOutOfRange。
+        """
+        with self._lock:
+            generation = self.generation
+            paths = self._paths
+            tombstones = list(self._tombstones.items()) if since is not None else []
+            floor = self.floor
+        if since is not None and not floor <= since <= generation:
+            raise ManifestOutOfRange(f"since={since} is outside [{floor}, {generation}]")
+        prefix = relative_dir + '/' if relative_dir else ''
+        return generation, self._iter_entries(paths, tombstones, prefix, since)
+
+    def _iter_entries(self, paths, tombstones, prefix, since):
+        files = self._files
+        for i in range(bisect.bisect_left(paths, prefix), len(paths)):
+            rel_path = paths[i]
+            if not rel_path.startswith(prefix):
+                break
+            entry = files.get(rel_path)
+            if entry is None or (since is not None and entry[4] <= since):
+                continue
+            ino, size, mtime_ns, digest, changed_in = entry
+            yield {
+                'path': rel_path,
+                'size': size,
+                'mtime_ns': mtime_ns,
+                'sha256': digest,
+                'generation': changed_in,
+            }
+        for rel_path, (deleted_in, _) in sorted(tombstones):
+            if deleted_in > since and rel_path.startswith(prefix):
+                yield {'path': rel_path, 'deleted': True, 'generation': deleted_in}
+
+
+_manifests = {}  # 根目录名称 -> ManifestIndex
+_manifest_lock = threading.Lock()
+
+
+def get_manifest(name=''):
+    """
+    获取当前进程中根目录 name 的文件清单，首次调用时创建并启动后台维护线程。配置中禁用时返回 None。
+    """
+    config = current_app.config
+    if not config.get('MANIFEST_ENABLED', False):
+        return None
+    root_dir = roots.named_roots()[name]
+    manifest = _manifests.get(name)
+    if manifest is not None and manifest.root_dir == root_dir:
+        return manifest
+
+    with _manifest_lock:
+        manifest = _manifests.get(name)
+        if manifest is None or manifest.root_dir != root_dir:
+            manifest = ManifestIndex(
+                root_dir,
+                config.get('HIDDEN_ITEMS', []),
+                roots.index_file(config['MANIFEST_INDEX_FILE'], name),
+                config.get('MANIFEST_HASH_WORKERS', 4),
+                config.get('MANIFEST_SAVE_INTERVAL', 30),
+                config.get('MANIFEST_TOMBSTONE_MAX_AGE', 30 * 86400)
+            )
+            thread = threading.Thread(
+                target=_maintain,
+                args=(manifest, config.get('MANIFEST_REFRESH_INTERVAL', 300), current_app.logger),
+                name='aetherserve-manifest',
+                daemon=True
+            )
+            thread.start()
+            _manifests[name] = manifest
+    return manifest
+
+
+def ready_manifest(since=None, name=''):
+    """
+    返回根目录 name 已就绪的文件清单，尚未就绪时返回 None。
+    since 比本进程加载的版本新时（由其他 worker 写入），先重新加载磁盘上的清单。
+    每个根目录的清单有各自的 generation 和 index_id。
+    """
+    manifest = get_manifest(name)
+    if manifest is None or not manifest.ready:
+        return None
+    if since is not None and since > manifest.generation and manifest.is_stale_on_disk():
+        manifest.load()
+    return manifest
@@ -0,0 +1,435 @@
+import os
+import re
+import threading
+import time
+from array import array
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+from flask import current_app
+
+from utils import metrics, roots
+from utils.file_operations import get_hidden_matcher
+from utils.search_index import _PersistentIndex, _maintain
+
+# NumPy 是可选依赖，未安装时元数据查询接口不可用
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 支持的排序方式。path 即快照中的存储顺序（按路径先序遍历），不需要额外排序
+QUERY_SORT_KEYS = ('path', 'size', 'modified', 'depth')
+
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+class InvalidMetadataQuery(ValueError):
+    """
+    元数据查询的参数（过滤条件、排序方式等）无效。
+    """
+
+
+class MetadataStore(_PersistentIndex):
+    """
+    FILE_SERVER_ROOT_DIR 下所有文件和文件夹元数据的列式快照。
+
+    条目按路径先序排列，因此任意目录的全部后代在各列中占据连续的区间，按目录过滤只需要切片。
+    目录路径保存在字符串表中，名称拼接为一个 UTF-8 字节串并用偏移数组定位；
+    大小、修改时间、深度、扩展名 id 和是否目录分别保存为 NumPy 数组，查询时对整列做向量化运算。
+    文件大小变化不会改变目录的 mtime，因此每次重扫都会 stat 所有条目，只有内容变化时才递增 generation。
+    """
+
+    def __init__(self, root_dir, hidden_patterns, index_file):
+        super().__init__(root_dir, hidden_patterns, index_file)
+        # 列名 -> 数组或表，每次重扫后整体替换，查询时无需持锁
+        self._columns = None
+
+    def _scan(self):
+        """
+        按路径先序遍历目录树，返回新的列数据。
+        """
+        is_hidden = get_hidden_matcher(self.hidden_patterns)
+        dir_paths = ['']  # 目录 id -> 相对路径，0 为根目录
+        subtrees = {}  # 相对路径 -> [后代区间起点, 终点]
+        extensions = {'': 0}
+        parents, sizes, mtimes = array('i'), array('q'), array('d')
+        depths, ext_ids, is_dir_flags = array('H'), array('i'), bytearray()
+        names = []
+
+        def list_children(rel_dir, dir_id, depth):
+            abs_dir = os.path.join(self.root_dir, rel_dir) if rel_dir else self.root_dir
+            children = []
+            try:
+                with os.scandir(abs_dir) as it:
+                    for entry in it:
+                        if is_hidden(os.path.normcase(entry.name)):
+                            continue
+                        try:
+                            is_dir = entry.is_dir()
+                            # 与 os.walk 一致：列出符号链接目录，但不递归进入
+                            recurse = is_dir and not entry.is_symlink()
+                            entry_stat = entry.stat()
+                        except OSError:
+                            continue  # 失效的符号链接或无权限的条目
+                        children.append((entry.name, is_dir, recurse, entry_stat, dir_id, rel_dir, depth))
+            except OSError:
+                # 忽略无法访问的目录（例如权限问题）
+                pass
+            children.sort(key=lambda child: child[0], reverse=True)
+            return children
+
+        subtrees[''] = [0, None]
+        open_dirs = [('', 0)]  # 尚未结束的目录：(相对路径, 深度)
+        stack = list_children('', 0, 1)
+        while stack:
+            name, is_dir, recurse, entry_stat, parent_id, rel_dir, depth = stack.pop()
+            # 深度不大于 depth - 1 之前打开的目录已经遍历完毕，记录它们的后代区间终点
+            while open_dirs[-1][1] >= depth:
+                subtrees[open_dirs.pop()[0]][1] = len(names)
+            extension = '' if is_dir else os.path.splitext(name)[1].lower()
+            ext_id = extensions.setdefault(extension, len(extensions))
+            names.append(name.encode('utf-8', 'surrogateescape'))
+            parents.append(parent_id)
+            sizes.append(0 if is_dir else entry_stat.st_size)
+            mtimes.append(entry_stat.st_mtime)
+            depths.append(min(depth, 0xFFFF))
+            ext_ids.append(ext_id)
+            is_dir_flags.append(is_dir)
+            if recurse:
+                child_rel = f"{rel_dir}/{name}" if rel_dir else name
+                dir_paths.append(child_rel)
+                subtrees[child_rel] = [len(names), None]
+                open_dirs.append((child_rel, depth))
+                stack.extend(list_children(child_rel, len(dir_paths) - 1, depth + 1))
+        for rel_dir, _ in open_dirs:
+            subtrees[rel_dir][1] = len(names)
+
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in names], out=offsets[1:])
+        return {
+            'dir_paths': dir_paths,
+            'subtrees': {path: tuple(bounds) for path, bounds in subtrees.items()},
+            'extensions': extensions,
+            'names': b''.join(names),
+            'name_offsets': offsets,
+            'parent': np.frombuffer(parents, dtype=np.int32),
+            'size': np.frombuffer(sizes, dtype=np.int64),
+            'mtime': np.frombuffer(mtimes, dtype=np.float64),
+            'depth': np.frombuffer(depths, dtype=np.uint16),
+            'ext': np.frombuffer(ext_ids, dtype=np.int32),
+            'is_dir': np.frombuffer(bytes(is_dir_flags), dtype=np.bool_),
+        }
+
+    @staticmethod
+    def _same(old, new):
+        if old is None:
+            return False
+        return old['names'] == new['names'] and old['dir_paths'] == new['dir_paths'] and \
+            all(np.array_equal(old[column], new[column]) for column in ('size', 'mtime', 'is_dir'))
+
+    def refresh(self):
+        """
+        重新扫描目录树。内容有变化时替换快照并递增 generation，返回是否有变化。
+        """
+        columns = self._scan()
+        if self.ready and self._same(self._columns, columns):
+            return False
+        with self._lock:
+            self._columns = columns
+            self.generation += 1
+            self.ready = True
+        return True
+
+    def _state(self):
+        return {'columns': self._columns}
+
+    def _restore(self, data):
+        self._columns = data['columns']
+
+    def _path_of(self, columns, entry_id):
+        start, end = columns['name_offsets'][entry_id:entry_id + 2]
+        name = columns['names'][start:end].decode('utf-8', 'surrogateescape')
+        rel_dir = columns['dir_paths'][columns['parent'][entry_id]]
+        return name, f"{rel_dir}/{name}" if rel_dir else name
+
+    def query(self, relative_dir, filters, sort, descending, limit):
+        """
+        在 relative_dir 的所有后代中按 filters 过滤，按 sort 排序后返回前 limit 个条目。
+        返回 (匹配条目总数, 匹配文件总字节数, 条目列表)。目录不在快照中时抛出 FileNotFoundError。
+        """
+        columns = self._columns
+        bounds = columns['subtrees'].get(relative_dir)
+        if bounds is None:
+            raise FileNotFoundError(f"Directory not in metadata index: {relative_dir}")
+        start, end = bounds
+        base_depth = relative_dir.count('/') + 1 if relative_dir else 0
+
+        window = slice(start, end)
+        mask = np.ones(end - start, dtype=np.bool_)
+        if filters['type'] == 'file':
+            mask &= ~columns['is_dir'][window]
+        elif filters['type'] == 'dir':
+            mask &= columns['is_dir'][window]
+        size = columns['size'][window]
+        if filters['min_size'] is not None:
+            mask &= size >= filters['min_size']
+        if filters['max_size'] is not None:
+            mask &= size <= filters['max_size']
+        mtime = columns['mtime'][window]
+        if filters['modified_after'] is not None:
+            mask &= mtime >= filters['modified_after']
+        if filters['modified_before'] is not None:
+            mask &= mtime < filters['modified_before']
+        if filters['extensions'] is not None:
+            ext_ids = [columns['extensions'][ext] for ext in filters['extensions'] if ext in columns['extensions']]
+            mask &= np.isin(columns['ext'][window], ext_ids)
+        if filters['min_depth'] is not None or filters['max_depth'] is not None:
+            depth = columns['depth'][window].astype(np.int64) - base_depth
+            if filters['min_depth'] is not None:
+                mask &= depth >= filters['min_depth']
+            if filters['max_depth'] is not None:
+                mask &= depth <= filters['max_depth']
+
+        matched = np.flatnonzero(mask) + start
+        total = int(matched.size)
+        total_size = int(columns['size'][matched].sum())
+
+        if sort == 'path':
+            selected = matched[::-1][:limit] if descending else matched[:limit]
+        else:
+            column = {'size': 'size', 'modified': 'mtime', 'depth': 'depth'}[sort]
+            keys = columns[column][matched].astype(np.float64 if column == 'mtime' else np.int64)
+            if descending:
+                keys = -keys
+            if limit < total:
+                # 只对前 limit 个做完整排序，其余元素只做一次线性的分区
+                top = np.argpartition(keys, limit - 1)[:limit]
+                selected = matched[top[np.argsort(keys[top], kind='stable')]]
+            else:
+                selected = matched[np.argsort(keys, kind='stable')]
+
+        items = []
+        for entry_id in selected.tolist():
+            name, path = self._path_of(columns, entry_id)
+            items.append({
+                'name': name,
+                'path': path,
+                'is_dir': bool(columns['is_dir'][entry_id]),
+                'size': int(columns['size'][entry_id]),
+                'modified': float(columns['mtime'][entry_id]),
+                'depth': int(columns['depth'][entry_id]) - base_depth,
+            })
+        return total, total_size, items
+
+
+def _parse_size(value):
+    """
+    解析 "500M"、"1.5G"、"4096" 这样的字节数（1024 进制）。
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*', value.lower())
+    if match is None:
+        raise InvalidMetadataQuery(f"Invalid size: {value}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def _parse_duration(value):
+    """
+    解析 "7d"、"12h"、"30m" 这样的时长，返回秒数。没有单位时按秒计算。
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*', value.lower())
+    if match is None:
+        raise InvalidMetadataQuery(f"Invalid duration: {value}")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2) or 's']
+
+
+def _parse_time(value):
+    """
+    解析 Unix 时间戳或 ISO 8601 日期时间（例如 2024-05-01 或 2024-05-01T12:00:00），返回时间戳。
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise InvalidMetadataQuery(f"Invalid time: {value}")
+
+
+def _parse_int(value, name):
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidMetadataQuery(f"{name} must be an integer.")
+
+
+def _parse_filters(args):
+    """
+    将查询参数解析为 MetadataStore.query 使用的过滤条件，参数无效时抛出 InvalidMetadataQuery。
+    """
+    file_type = args.get('type', 'all')
+    if file_type not in ('all', 'file', 'dir'):
+        raise InvalidMetadataQuery(f"Unsupported type: {file_type}")
+
+    now = time.time()
+    modified_after = [now - _parse_duration(args['newer_than'])] if args.get('newer_than') else []
+    modified_before = [now - _parse_duration(args['older_than'])] if args.get('older_than') else []
+    if args.get('modified_after'):
+        modified_after.append(_parse_time(args['modified_after']))
+    if args.get('modified_before'):
+        modified_before.append(_parse_time(args['modified_before']))
+
+    extensions = None
+    if args.get('ext'):
+        extensions = ['.' + ext.strip().lstrip('.').lower() for ext in args['ext'].split(',') if ext.strip()]
+
+    return {
+        'type': file_type,
+        'min_size': _parse_size(args['min_size']) if args.get('min_size') else None,
+        'max_size': _parse_size(args['max_size']) if args.get('max_size') else None,
+        'modified_after': max(modified_after) if modified_after else None,
+        'modified_before': min(modified_before) if modified_before else None,
+        'extensions': extensions,
+        'min_depth': _parse_int(args['min_depth'], 'min_depth') if args.get('min_depth') else None,
+        'max_depth': _parse_int(args['max_depth'], 'max_depth') if args.get('max_depth') else None,
+    }
+
+
+_stores = {}  # 根目录名称 -> MetadataStore
+_store_lock = threading.Lock()
+
+
+def is_available():
+    """
+    判断元数据查询是否可用（已启用且安装了 NumPy）。
+    """
+    return np is not None and current_app.config.get('METADATA_INDEX_ENABLED', False)
+
+
+def get_store(name=''):
+    """
+    获取当前进程中根目录 name 的元数据快照，首次调用时创建快照并启动后台维护线程。不可用时返回 None。
+    """
+    if not is_available():
+        return None
+    config = current_app.config
+    root_dir = roots.named_roots()[name]
+    store = _stores.get(name)
+    if store is not None and store.root_dir == root_dir:
+        return store
+
+    with _store_lock:
+        store = _stores.get(name)
+        if store is None or store.root_dir != root_dir:
+            store = MetadataStore(
+                root_dir,
+                config.get('HIDDEN_ITEMS', []),
+                roots.index_file(config['METADATA_INDEX_FILE'], name)
+            )
+            thread = threading.Thread(
+                target=_maintain,
+                args=(store, config.get('METADATA_INDEX_REFRESH_INTERVAL', 300), current_app.logger),
+                name='aetherserve-metadata-index',
+                daemon=True
+            )
+            thread.start()
+            _stores[name] = store
+    return store
+
+
+def _prefixed(name, result):
+    """
+    把单个根目录的查询结果中的路径转换为对外的路径（加上根目录名称）。
+    """
+    total, total_size, items = result
+    for item in items:
+        item['path'] = roots.join(name, item['path'])
+    return total, total_size, items
+
+
+def _merge_top(results, sort, descending, limit):
+    """
+    合并多个根目录各自排好序的前 limit 个条目，返回整体的前 limit 个。
+    path 排序时按根目录名称排列，同一根目录内保持快照中的顺序。
+    """
+    items = [(name, item) for name, (_, _, root_items) in results for item in root_items]
+    if sort == 'path':
+        key = lambda entry: entry[0]
+    else:
+        key = lambda entry: entry[1][sort]
+    # 各根目录内部已经排好序，稳定排序（reverse 也是稳定的）保证同值条目保持根目录内的顺序
+    items.sort(key=key, reverse=descending)
+    return [item for _, item in items[:limit]]
+
+
+def _query_roots(filters, sort, descending, limit):
+    """
+    在线程池中并行查询所有根目录的快照，每个根目录最多等待 QUERY_ROOT_TIME_BUDGET 秒。
+    返回 (总数, 总字节数, 条目列表, 未能参与本次结果的根目录列表)；所有快照都尚未就绪时返回 None。
+    """
+    config = current_app.config
+    budget = config.get('QUERY_ROOT_TIME_BUDGET', 2.0)
+    stores = {name: get_store(name) for name in roots.named_roots()}
+    ready = {name: store for name, store in stores.items() if store is not None and store.ready}
+    missing = [name for name in stores if name not in ready]
+    metrics.count_cache('metadata_index', bool(ready))
+    if not ready:
+        return None
+
+    # 深度相对于顶层目录计算，根目录中的条目比在根目录内查询时深一层
+    filters = dict(filters)
+    for key in ('min_depth', 'max_depth'):
+        if filters[key] is not None:
+            filters[key] -= 1
+
+    executor = roots.get_executor()
+    futures = {
+        name: executor.submit(store.query, '', filters, sort, descending, limit)
+        for name, store in ready.items()
+    }
+    deadline = time.monotonic() + budget
+    results = []
+    for name, future in futures.items():
+        try:
+            result = _prefixed(name, future.result(timeout=max(0.0, deadline - time.monotonic())))
+            for item in result[2]:
+                item['depth'] += 1
+            results.append((name, result))
+        except FutureTimeoutError:
+            future.cancel()
+            missing.append(name)
+        except Exception as e:
+            current_app.logger.error(f"Metadata query failed for root {name}: {e}")
+            missing.append(name)
+    total = sum(result[0] for _, result in results)
+    total_size = sum(result[1] for _, result in results)
+    return total, total_size, _merge_top(results, sort, descending, limit), missing
+
+
+@metrics.timed('query_metadata')
+def query_metadata(relative_path, args, limit):
+    """
+    按查询参数 args（type、min_size、max_size、newer_than、older_than、modified_after、modified_before、
+    ext、min_depth、max_depth、sort、order）查询 relative_path 下的条目，返回 (总数, 总字节数, 条目列表, 缺少的根目录)。
+    快照尚未就绪时返回 None；参数无效时抛出 InvalidMetadataQuery；目录不存在时抛出 FileNotFoundError。
+    多根目录模式下查询顶层目录时并行查询所有根目录并合并结果，超时或快照尚未就绪的根目录列在缺少的根目录中；
+    其他情况下缺少的根目录总是空列表。
+    """
+    sort = args.get('sort', 'path')
+    if sort not in QUERY_SORT_KEYS:
+        raise InvalidMetadataQuery(f"Unsupported sort key: {sort}")
+    filters = _parse_filters(args)
+    descending = args.get('order', 'asc') == 'desc'
+
+    name, _, inner_path = roots.split_path(relative_path)
+    if name is None:
+        return _query_roots(filters, sort, descending, limit)
+
+    store = get_store(name)
+    ready = store is not None and store.ready
+    metrics.count_cache('metadata_index', ready)
+    if not ready:
+        return None
+    return _prefixed(name, store.query(inner_path, filters, sort, descending, limit)) + ([],)
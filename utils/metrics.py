@@ -0,0 +1,358 @@
+import bisect
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+# 指标定义：名称 -> (类型, 说明, 直方图桶上界)
+_REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_FUNCTION_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+METRICS = {
+    'aetherserve_http_requests_total': ('counter', 'HTTP requests by route, method and status.', None),
+    'aetherserve_http_request_duration_seconds': (
+        'histogram', 'Time until the response headers are ready, by route.', _REQUEST_BUCKETS
+    ),
+    'aetherserve_http_response_bytes_total': ('counter', 'Response body bytes sent, by route.', None),
+    'aetherserve_http_requests_in_flight': ('gauge', 'Requests currently being handled, by route.', None),
+    'aetherserve_function_duration_seconds': (
+        'histogram', 'Time spent in instrumented hot-path functions.', _FUNCTION_BUCKETS
+    ),
+    'aetherserve_admission_rejections_total': (
+        'counter', 'Requests rejected with 429 by admission control, by route and reason.', None
+    ),
+    'aetherserve_cache_hits_total': ('counter', 'Cache hits, by cache.', None),
+    'aetherserve_cache_misses_total': ('counter', 'Cache misses, by cache.', None),
+    'aetherserve_cache_entries': ('gauge', 'Entries in in-memory caches.', None),
+    'aetherserve_cache_bytes': ('gauge', 'Estimated size of in-memory caches in bytes.', None),
+}
+
+# start_request 把路由名写入 environ，供 WSGI 中间件读取
+ROUTE_ENVIRON_KEY = 'aetherserve.route'
+
+# 当前请求中各个计时函数的累计耗时：函数名 -> [秒数, 调用次数]，由 profiling.ProfilingMiddleware 设置
+request_timings = contextvars.ContextVar('aetherserve_request_timings', default=None)
+
+_lock = threading.Lock()
+_values = {}  # (名称, 排序后的标签元组) -> 数值；直方图为 [各桶计数..., 总和, 总数]
+_caches = {}  # 缓存名称 -> LRUCache
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, labels, amount=1):
+    """
+    计数器或仪表盘增加 amount（仪表盘可以传入负数）。
+    """
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+
+
+def observe(name, labels, value):
+    """
+    向直方图记录一个观测值。
+    """
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        histogram = _values.get(key)
+        if histogram is None:
+            histogram = _values[key] = [0] * (len(buckets) + 3)  # 含 +Inf 桶
+        histogram[bisect.bisect_left(buckets, value)] += 1  # 非累积计数，渲染时再累加
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+def count_cache(cache_name, hit):
+    """
+    记录一次缓存命中或未命中（用于磁盘缓存等没有 LRUCache 统计的缓存）。
+    """
+    inc('aetherserve_cache_hits_total' if hit else 'aetherserve_cache_misses_total', {'cache': cache_name})
+
+
+def register_cache(cache_name, cache):
+    """
+    注册一个 LRUCache，导出时读取它的命中、未命中、条目数和字节数。
+    """
+    _caches[cache_name] = cache
+
+
+def record_duration(function_name, elapsed):
+    """
+    记录一次函数耗时到 aetherserve_function_duration_seconds，并累加到当前请求的计时（如果正在记录）。
+    """
+    observe('aetherserve_function_duration_seconds', {'function': function_name}, elapsed)
+    timings = request_timings.get()
+    if timings is not None:
+        entry = timings.get(function_name)
+        if entry is None:
+            timings[function_name] = [elapsed, 1]
+        else:
+            entry[0] += elapsed
+            entry[1] += 1
+
+
+def timed(function_name):
+    """
+    装饰器：记录函数每次调用的耗时到 aetherserve_function_duration_seconds{function=...}。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_duration(function_name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def start_request(environ, route):
+    """
+    在 before_request 钩子中调用：记录请求的路由名（Flask endpoint）并增加该路由的 in-flight 计数。
+    """
+    environ[ROUTE_ENVIRON_KEY] = route
+    inc('aetherserve_http_requests_in_flight', {'route': route})
+
+
+def connect_template_timing(app):
+    """
+    通过 Flask 的模板信号记录 Jinja 渲染耗时（function="render:<模板名>"）。
+    """
+    from flask import before_render_template, g, template_rendered
+
+    def started(sender, template, context, **extra):
+        g.setdefault('_metrics_render_starts', []).append(time.perf_counter())
+
+    def finished(sender, template, context, **extra):
+        starts = g.get('_metrics_render_starts')
+        if starts:
+            record_duration(f"render:{template.name}", time.perf_counter() - starts.pop())
+
+    before_render_template.connect(started, app, weak=False)
+    template_rendered.connect(finished, app, weak=False)
+
+
+class _CountingIterable:
+    """
+    包装响应体，统计实际发送的字节数，在响应关闭时记录字节数并结束 in-flight 计数。
+    """
+
+    def __init__(self, iterable, labels, in_flight):
+        self._iterable = iterable
+        self._labels = labels
+        self._in_flight = in_flight
+        self._sent = 0
+
+    def __iter__(self):
+        for chunk in self._iterable:
+            self._sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, 'close'):
+                self._iterable.close()
+        finally:
+            inc('aetherserve_http_response_bytes_total', self._labels, self._sent)
+            if self._in_flight:
+                inc('aetherserve_http_requests_in_flight', self._labels, -1)
+
+
+class MetricsMiddleware:
+    """
+    WSGI 中间件：按路由记录请求数、响应头就绪前的耗时、发送字节数和 in-flight 请求数。
+    由服务器的 wsgi.file_wrapper 发送的文件（Gunicorn 的 sendfile）不能被包装，
+    这类响应按 Content-Length 计算字节数，并在交给服务器时结束 in-flight 计数。
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        response_info = {}
+
+        def metrics_start_response(status, headers, exc_info=None):
+            response_info['status'] = status.split(' ', 1)[0]
+            for name, value in headers:
+                if name.lower() == 'content-length':
+                    response_info['length'] = int(value)
+            return start_response(status, headers, exc_info)
+
+        try:
+            iterable = self.wsgi_app(environ, metrics_start_response)
+        except Exception:
+            if ROUTE_ENVIRON_KEY in environ:
+                inc('aetherserve_http_requests_in_flight', {'route': environ[ROUTE_ENVIRON_KEY]}, -1)
+            raise
+
+        in_flight = ROUTE_ENVIRON_KEY in environ  # start_request 已经增加了 in-flight 计数
+        labels = {'route': environ.get(ROUTE_ENVIRON_KEY, 'unmatched')}
+        observe('aetherserve_http_request_duration_seconds', labels, time.perf_counter() - start)
+        inc('aetherserve_http_requests_total', {
+            'route': labels['route'],
+            'method': environ.get('REQUEST_METHOD', ''),
+            'status': response_info.get('status', ''),
+        })
+
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(iterable, file_wrapper):
+            if environ.get('REQUEST_METHOD') != 'HEAD':
+                inc('aetherserve_http_response_bytes_total', labels, response_info.get('length', 0))
+            if in_flight:
+                inc('aetherserve_http_requests_in_flight', labels, -1)
+            return iterable
+        return _CountingIterable(iterable, labels, in_flight)
+
+
+def _snapshot():
+    """
+    返回本进程所有指标的快照（可 JSON 序列化）。
+    """
+    with _lock:
+        values = [[name, list(labels), list(value) if isinstance(value, list) else value]
+                  for (name, labels), value in _values.items()]
+    for cache_name, cache in list(_caches.items()):
+        labels = [['cache', cache_name]]
+        values.append(['aetherserve_cache_hits_total', labels, cache.hits])
+        values.append(['aetherserve_cache_misses_total', labels, cache.misses])
+        values.append(['aetherserve_cache_entries', labels, len(cache)])
+        values.append(['aetherserve_cache_bytes', labels, cache.total_bytes])
+    return {'pid': os.getpid(), 'values': values}
+
+
+def _write_snapshot(metrics_dir):
+    """
+    把本进程的快照原子地写入 metrics_dir/<pid>.json，供其他 worker 汇总。
+    """
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, f"{os.getpid()}.json")
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def _flush_loop(metrics_dir, interval, logger):
+    while True:
+        time.sleep(interval)
+        try:
+            _write_snapshot(metrics_dir)
+        except Exception as e:
+            logger.error(f"Error writing metrics snapshot: {e}")
+
+
+def start_flusher(app):
+    """
+    启动本进程的后台线程，定期把指标快照写入 METRICS_DIR。
+    每个 Gunicorn worker 在处理第一个请求时启动自己的线程（fork 之后），因此 pid 与文件一一对应。
+    """
+    global _flusher
+    if _flusher is not None and _flusher[0] == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher is None or _flusher[0] != os.getpid():
+            thread = threading.Thread(
+                target=_flush_loop,
+                args=(app.config['METRICS_DIR'], app.config.get('METRICS_FLUSH_INTERVAL', 5), app.logger),
+                name='aetherserve-metrics',
+                daemon=True
+            )
+            thread.start()
+            _flusher = (os.getpid(), thread)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _collect(metrics_dir):
+    """
+    汇总所有 worker 的快照：计数器和直方图对所有进程求和（包括已退出的 worker，保证单调递增），
+    仪表盘只计算仍在运行的进程。本进程总是使用内存中的最新值。
+    """
+    own_pid = os.getpid()
+    snapshots = [_snapshot()]
+    try:
+        names = os.listdir(metrics_dir)
+    except OSError:
+        names = []
+    for name in names:
+        if not name.endswith('.json') or name == f"{own_pid}.json":
+            continue
+        try:
+            with open(os.path.join(metrics_dir, name), encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+
+    merged = {}
+    for snapshot in snapshots:
+        alive = snapshot['pid'] == own_pid or _pid_alive(snapshot['pid'])
+        for name, labels, value in snapshot['values']:
+            metric_type = METRICS.get(name, ('untyped',))[0]
+            if metric_type == 'gauge' and not alive:
+                continue
+            key = (name, tuple(tuple(label) for label in labels))
+            if metric_type == 'histogram':
+                current = merged.get(key)
+                merged[key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(metrics_dir):
+    """
+    以 Prometheus 文本格式 (0.0.4) 输出所有 worker 汇总后的指标。
+    """
+    merged = _collect(metrics_dir)
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric_name, labels), value in merged.items() if metric_name == name)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in series:
+            if metric_type != 'histogram':
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for upper, count in zip(buckets + (float('inf'),), value[:-2]):
+                cumulative += count
+                le = _format_number(upper)
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(value[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,291 @@
+import cProfile
+import json
+import logging
+import logging.handlers
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from utils import metrics
+
+
+def _write_ring_file(directory, max_files, name, write):
+    """
+    原子地写入 directory/name（write 接收临时文件路径），然后只保留最新的 max_files 个文件。
+    文件名以纳秒时间戳开头，按名称排序即按时间排序。
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+    names = sorted(entry for entry in os.listdir(directory) if not entry.endswith('.tmp'))
+    for old in names[:max(0, len(names) - max_files)]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
+    return name
+
+
+class _StackSampler:
+    """
+    后台线程每隔 interval 秒对所有正在处理请求的线程采样一次调用栈，按折叠栈（flame graph 格式）计数。
+    只在有请求正在处理时读取 sys._current_frames()，空闲时几乎没有开销。
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}  # 线程 id -> 该线程正在处理的请求的栈计数
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """
+        在当前进程中启动采样线程（fork 之后的每个 worker 各启动一个）。
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name='aetherserve-profiler', daemon=True).start()
+                self._pid = os.getpid()
+
+    def register(self, stacks):
+        with self._lock:
+            self._active[threading.get_ident()] = stacks
+
+    def unregister(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def snapshot(self, stacks):
+        """
+        返回请求栈计数的副本。采样线程可能仍持有已注销请求的计数器，必须在锁内复制。
+        """
+        with self._lock:
+            return Counter(stacks)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        """
+        对所有正在处理请求的线程采样一次。遍历调用栈在锁外进行，计数器只在持有锁时修改。
+        """
+        with self._lock:
+            active = list(self._active.items())
+        if not active:
+            return
+        frames = sys._current_frames()
+        samples = []
+        for ident, stacks in active:
+            frame = frames.get(ident)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                samples.append((stacks, ';'.join(reversed(names))))
+        with self._lock:
+            for stacks, stack in samples:
+                stacks[stack] += 1
+
+
+class _RequestRecord:
+    """
+    单个请求的计时、采样栈和（被抽中时）cProfile 剖析数据。
+    """
+
+    def __init__(self, environ, profile):
+        self.environ = environ
+        self.start = time.perf_counter()
+        self.headers_elapsed = None
+        self.status = None
+        self.length = None
+        self.sent = 0
+        self.busy = 0.0  # 在应用代码中花费的时间，不包括等待客户端接收数据的时间
+        self.timings = {}
+        self.stacks = Counter()
+        self.profile = profile
+
+
+class _ProfiledIterable:
+    """
+    包装响应体：迭代响应体时继续累计计时和采样（流式渲染、搜索等在此阶段执行），响应关闭时写出记录。
+    """
+
+    def __init__(self, iterable, record, middleware):
+        self._iterable = iterable
+        self._record = record
+        self._middleware = middleware
+
+    def __iter__(self):
+        iterator = iter(self._iterable)
+        while True:
+            with self._middleware._active(self._record):
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+            self._record.sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, 'close'):
+                with self._middleware._active(self._record):
+                    self._iterable.close()
+        finally:
+            self._middleware._finish(self._record)
+
+
+class _Activation:
+    def __init__(self, middleware, record):
+        self._middleware = middleware
+        self._record = record
+        self._token = None
+        self._entered = None
+
+    def __enter__(self):
+        self._entered = time.perf_counter()
+        self._token = metrics.request_timings.set(self._record.timings)
+        if self._middleware.sampler is not None:
+            self._middleware.sampler.register(self._record.stacks)
+        if self._record.profile is not None:
+            try:
+                self._record.profile.enable()
+            except ValueError:
+                # Python 3.12+ 的 cProfile 同一时间只能有一个剖析器，其他请求正在被剖析时放弃本次剖析
+                self._record.profile = None
+
+    def __exit__(self, *exc_info):
+        if self._record.profile is not None:
+            self._record.profile.disable()
+        if self._middleware.sampler is not None:
+            self._middleware.sampler.unregister()
+        metrics.request_timings.reset(self._token)
+        self._record.busy += time.perf_counter() - self._entered
+        return False
+
+
+class ProfilingMiddleware:
+    """
+    WSGI 中间件：为每个请求写一行 JSON 计时日志（TIMING_LOG_FILE），包括总耗时、在应用代码中花费的时间（busy_ms，
+    不包括等待客户端接收数据的时间）、响应头就绪耗时、发送字节数，以及请求中各个计时函数（路径解析、列目录、MIME 检测、模板渲染等，即 metrics.timed 标记的函数）的累计耗时。
+    busy_ms 超过 PROFILE_SLOW_THRESHOLD 的请求保存采样得到的折叠调用栈（*.stacks，可直接交给 flamegraph.pl），
+    按 PROFILE_SAMPLE_RATE 随机抽中的请求保存完整的 cProfile 数据（*.prof，可用 pstats 或 snakeviz 查看）。
+    剖析文件保存在 PROFILE_DIR 中，只保留最新的 PROFILE_MAX_FILES 个。
+    """
+
+    def __init__(self, wsgi_app, config, logger):
+        self.wsgi_app = wsgi_app
+        self.logger = logger
+        self.profile_dir = config['PROFILE_DIR']
+        self.max_files = config.get('PROFILE_MAX_FILES', 200)
+        self.slow_threshold = config.get('PROFILE_SLOW_THRESHOLD', 0)
+        self.sample_rate = config.get('PROFILE_SAMPLE_RATE', 0)
+        self.exempt_routes = frozenset(config.get('PROFILE_EXEMPT_ENDPOINTS', ()))
+        self.sampler = None
+        if self.slow_threshold > 0:
+            self.sampler = _StackSampler(config.get('PROFILE_SAMPLE_INTERVAL', 0.01))
+
+        self.timing_log = None
+        log_file = config.get('TIMING_LOG_FILE')
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            # WatchedFileHandler 在文件被 logrotate 移走后自动重新打开；每条记录一次 write，多个 worker 可以追加同一文件
+            handler = logging.handlers.WatchedFileHandler(log_file, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.timing_log = logging.getLogger('aetherserve.timing')
+            self.timing_log.handlers = [handler]
+            self.timing_log.setLevel(logging.INFO)
+            self.timing_log.propagate = False
+
+    def _active(self, record):
+        return _Activation(self, record)
+
+    def __call__(self, environ, start_response):
+        if self.sampler is not None:
+            self.sampler.start()
+        profile = cProfile.Profile() if self.sample_rate > 0 and random.random() < self.sample_rate else None
+        record = _RequestRecord(environ, profile)
+
+        def profiling_start_response(status, headers, exc_info=None):
+            record.status = int(status.split(' ', 1)[0])
+            for name, value in headers:
+                if name.lower() == 'content-length':
+                    record.length = int(value)
+            return start_response(status, headers, exc_info)
+
+        try:
+            with self._active(record):
+                iterable = self.wsgi_app(environ, profiling_start_response)
+        except Exception:
+            record.status = 500
+            self._finish(record)
+            raise
+        record.headers_elapsed = time.perf_counter() - record.start
+
+        # 由服务器的 wsgi.file_wrapper 发送的文件（sendfile）不能被包装，
+        # 在交给服务器时结束记录，按 Content-Length 计算字节数
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(iterable, file_wrapper):
+            if environ.get('REQUEST_METHOD') != 'HEAD':
+                record.sent = record.length or 0
+            self._finish(record)
+            return iterable
+        return _ProfiledIterable(iterable, record, self)
+
+    def _finish(self, record):
+        elapsed = time.perf_counter() - record.start
+        environ = record.environ
+        profiles = []
+        try:
+            stamp = f"{time.time_ns():020d}-{os.getpid()}"
+            exempt = environ.get(metrics.ROUTE_ENVIRON_KEY) in self.exempt_routes
+            stacks = self.sampler.snapshot(record.stacks) if self.sampler is not None else record.stacks
+            if stacks and record.busy >= self.slow_threshold and not exempt:
+                lines = [f"{stack} {count}\n" for stack, count in stacks.most_common()]
+
+                def write_stacks(path):
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.writelines(lines)
+
+                profiles.append(_write_ring_file(self.profile_dir, self.max_files, stamp + '.stacks', write_stacks))
+            if record.profile is not None and not exempt:
+                profiles.append(_write_ring_file(self.profile_dir, self.max_files, stamp + '.prof',
+                                                 record.profile.dump_stats))
+        except Exception as e:
+            self.logger.error(f"Error writing request profile: {e}")
+
+        if self.timing_log is None:
+            return
+        path = environ.get('PATH_INFO', '').encode('latin-1').decode('utf-8', errors='replace')
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'pid': os.getpid(),
+            'method': environ.get('REQUEST_METHOD'),
+            'path': path,
+            'query': environ.get('QUERY_STRING', ''),
+            'route': environ.get(metrics.ROUTE_ENVIRON_KEY),
+            'status': record.status,
+            'duration_ms': round(elapsed * 1000, 3),
+            'busy_ms': round(record.busy * 1000, 3),
+            'headers_ms': round(record.headers_elapsed * 1000, 3) if record.headers_elapsed is not None else None,
+            'bytes': record.sent,
+            'timings': {
+                name: {'ms': round(total * 1000, 3), 'calls': calls}
+                for name, (total, calls) in sorted(record.timings.items())
+            },
+        }
+        if profiles:
+            entry['profiles'] = profiles
+        self.timing_log.info(json.dumps(entry, ensure_ascii=False))
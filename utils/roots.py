@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+# 并行查询各个根目录使用的线程池（每个 worker 进程一份）
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_multi_root():
+    """
+    判断是否配置了多个命名根目录（FILE_SERVER_ROOTS）。
+    """
+    return bool(current_app.config.get('FILE_SERVER_ROOTS'))
+
+
+def named_roots():
+    """
+    返回 {根目录名称: 根目录绝对路径}，按配置顺序排列。
+    单根目录模式下只有一个名称为空字符串的根目录，即 FILE_SERVER_ROOT_DIR。
+    """
+    config = current_app.config
+    return config.get('FILE_SERVER_ROOTS') or {'': config['FILE_SERVER_ROOT_DIR']}
+
+
+def split_path(relative_path):
+    """
+    将对外的相对路径拆分为 (根目录名称, 根目录, 根目录内的相对路径)。
+    单根目录模式下路径原样属于 FILE_SERVER_ROOT_DIR；多根目录模式下路径的第一段为根目录名称，
+    空路径（列出所有根目录的虚拟顶层目录）返回 (None, None, '')，名称不存在时抛出 FileNotFoundError。
+    """
+    configured = current_app.config.get('FILE_SERVER_ROOTS')
+    if not configured:
+        return '', current_app.config['FILE_SERVER_ROOT_DIR'], relative_path
+    name, _, rest = relative_path.partition('/')
+    if not name and not rest:
+        return None, None, ''
+    if name not in configured:
+        raise FileNotFoundError(f"Unknown root: {name}")
+    return name, configured[name], rest
+
+
+def join(name, relative_path):
+    """
+    split_path 的逆操作：把根目录内的相对路径转换为对外的相对路径。
+    """
+    if not name:
+        return relative_path
+    return f"{name}/{relative_path}" if relative_path else name
+
+
+def locate(absolute_path):
+    """
+    返回包含 absolute_path 的根目录的 (名称, 根目录)，不属于任何根目录时返回 (None, None)。
+    根目录相互嵌套时取最深的一个。
+    """
+    found = (None, None)
+    for name, root_dir in named_roots().items():
+        try:
+            inside = os.path.commonpath([root_dir, absolute_path]) == root_dir
+        except ValueError:
+            continue  # 一个是相对路径、另一个是绝对路径，或位于 Windows 的不同驱动器
+        if inside and (found[1] is None or len(root_dir) > len(found[1])):
+            found = (name, root_dir)
+    return found
+
+
+def index_file(base_file, name):
+    """
+    返回根目录的持久化索引文件路径：单根目录时为 base_file，否则在扩展名之前插入根目录名称，
+    例如 search_index.media.pickle，使各个根目录的索引互不影响。
+    """
+    if not name:
+        return base_file
+    stem, ext = os.path.splitext(base_file)
+    return f"{stem}.{name}{ext}"
+
+
+def get_executor():
+    """
+    获取当前进程并行查询各个根目录的线程池，首次调用时根据配置创建。
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('ROOT_FANOUT_WORKERS', 8),
+                    thread_name_prefix='aetherserve-roots'
+                )
+    return _executor
@@ -0,0 +1,687 @@
+import os
+import pickle
+import stat
+import threading
+import time
+import zlib
+from array import array
+
+from flask import current_app
+
+from utils import roots
+from utils.file_operations import FILE_KIND_TEXT, _classify, get_hidden_matcher
+
+try:
+    import fcntl  # 仅在类 Unix 系统上可用，用于多个 worker 之间协调索引重建
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# 索引文件格式版本，格式变化时递增以丢弃旧文件
+_INDEX_FORMAT_VERSION = 2
+
+
+def _trigrams(text):
+    """
+    返回字符串中所有长度为 3 的子串集合。
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _PersistentIndex:
+    """
+    持久化到磁盘的索引基类：负责原子保存、加载以及检测其他 worker 写入的新版本。
+    子类实现 refresh()、_state() 和 _restore()。
+    """
+
+    def __init__(self, root_dir, hidden_patterns, index_file):
+        self.root_dir = root_dir
+        self.hidden_patterns = tuple(hidden_patterns)
+        self.index_file = index_file
+        self.generation = 0
+        self.ready = False
+        self._loaded_mtime = None
+        self._lock = threading.Lock()
+
+    def _state(self):
+        """
+        返回需要持久化的索引内容（在持有 self._lock 时调用）。
+        """
+        raise NotImplementedError
+
+    def _restore(self, data):
+        """
+        从 _state() 保存的内容恢复索引（在持有 self._lock 时调用）。
+        """
+        raise NotImplementedError
+
+    def _compatible(self, data):
+        """
+        判断磁盘上的索引是否可以复用：格式版本、根目录和隐藏规则必须一致。
+        """
+        return data.get('version') == _INDEX_FORMAT_VERSION and \
+            data.get('root_dir') == self.root_dir and \
+            tuple(data.get('hidden_patterns', ())) == self.hidden_patterns
+
+    def save(self):
+        """
+        将索引写入磁盘。先写临时文件再原子替换，避免其他 worker 读到半个文件。
+        """
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        with self._lock:
+            data = {
+                'version': _INDEX_FORMAT_VERSION,
+                'root_dir': self.root_dir,
+                'hidden_patterns': self.hidden_patterns,
+                'generation': self.generation,
+            }
+            data.update(self._state())
+            tmp_file = f"{self.index_file}.{os.getpid()}.tmp"
+            # 在锁内序列化，避免 refresh 同时修改增量维护的倒排表
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.index_file)
+        self._loaded_mtime = os.stat(self.index_file).st_mtime_ns
+
+    def load(self):
+        """
+        从磁盘加载索引。文件不存在、格式不符或根目录/隐藏规则不同时返回 False。
+        """
+        try:
+            file_mtime = os.stat(self.index_file).st_mtime_ns
+            with open(self.index_file, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False
+        if not self._compatible(data):
+            return False
+        with self._lock:
+            self._restore(data)
+            self.generation = data['generation']
+            self.ready = True
+        self._loaded_mtime = file_mtime
+        return True
+
+    def is_stale_on_disk(self):
+        """
+        判断磁盘上的索引文件是否比当前进程加载的版本更新（由其他 worker 写入）。
+        """
+        try:
+            return os.stat(self.index_file).st_mtime_ns != self._loaded_mtime
+        except OSError:
+            return False
+
+
+class FilenameIndex(_PersistentIndex):
+    """
+    FILE_SERVER_ROOT_DIR 下所有文件和文件夹名称的三元组（trigram）索引。
+
+    索引按目录记录 st_mtime_ns，增量重扫时只重新列出 mtime 发生变化的目录，
+    其余目录直接复用上一次的结果；倒排表只为新增和删除的条目更新。
+    索引会持久化到磁盘，供重启和其他 worker 复用。
+    """
+
+    def __init__(self, root_dir, hidden_patterns, index_file):
+        super().__init__(root_dir, hidden_patterns, index_file)
+        # 相对目录路径 -> (mtime_ns, [(名称, 是否目录), ...], [需要递归的子目录名称, ...])
+        self._dirs = {}
+        # 相对目录路径 -> 与目录表中条目一一对应的条目 id
+        self._dir_ids = {}
+        # 条目 id -> 相对路径 / 小写名称 / 是否目录，删除后的旧 id 路径和名称为 None
+        self._paths = []
+        self._names = []
+        self._is_dir = bytearray()
+        self._removed = 0
+        self._postings = {}  # trigram -> 按升序排列的条目 id
+
+    def _scan(self):
+        """
+        遍历目录树，只对 mtime 变化的目录重新调用 scandir。
+        返回 (新的目录表, 重新列出的目录集合)。
+        """
+        old_dirs = self._dirs
+        new_dirs = {}
+        relisted = set()
+        is_hidden = get_hidden_matcher(self.hidden_patterns)
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(self.root_dir, rel_dir) if rel_dir else self.root_dir
+            try:
+                mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue
+
+            cached = old_dirs.get(rel_dir)
+            if cached is not None and cached[0] == mtime_ns:
+                entries, subdirs = cached[1], cached[2]
+            else:
+                relisted.add(rel_dir)
+                entries, subdirs = [], []
+                try:
+                    with os.scandir(abs_dir) as it:
+                        for entry in it:
+                            if is_hidden(os.path.normcase(entry.name)):
+                                continue
+                            try:
+                                is_dir = entry.is_dir()
+                                # 与 os.walk 一致：列出符号链接目录，但不递归进入
+                                recurse = is_dir and not entry.is_symlink()
+                            except OSError:
+                                continue
+                            entries.append((entry.name, is_dir))
+                            if recurse:
+                                subdirs.append(entry.name)
+                except OSError:
+                    # 忽略无法访问的目录（例如权限问题）
+                    pass
+                entries.sort(key=lambda x: (not x[1], x[0].lower()))
+                subdirs.sort(key=str.lower, reverse=True)
+
+            new_dirs[rel_dir] = (mtime_ns, entries, subdirs)
+            for name in subdirs:
+                stack.append(f"{rel_dir}/{name}" if rel_dir else name)
+        return new_dirs, relisted
+
+    def refresh(self):
+        """
+        执行一次增量重扫：只对重新列出或已消失的目录比较新旧条目，并增量更新倒排表。
+        返回是否有变化。
+        """
+        dirs, relisted = self._scan()
+        vanished = [rel_dir for rel_dir in self._dirs if rel_dir not in dirs]
+        if not relisted and not vanished and self.ready:
+            return False
+
+        with self._lock:
+            removed_ids = []
+            for rel_dir in vanished:
+                removed_ids.extend(self._dir_ids.pop(rel_dir, ()))
+            # 按目录路径顺序处理，首次建立索引时条目顺序与目录树一致
+            for rel_dir in sorted(relisted):
+                removed_ids.extend(self._update_directory(rel_dir, dirs[rel_dir][1]))
+            self._remove_entries(removed_ids)
+            self._dirs = dirs
+            # 删除的条目过多时重新编号，回收列表中的空位
+            if self._removed > 1000 and self._removed > len(self._paths) // 2:
+                self._compact()
+            self.generation += 1
+            self.ready = True
+        return True
+
+    def _update_directory(self, rel_dir, entries):
+        """
+        比较目录的新旧条目：未变化的条目保留原有 id，新增的条目追加到索引末尾。
+        返回需要删除的旧条目 id（在持有 self._lock 时调用）。
+        """
+        old = self._dirs.get(rel_dir)
+        kept = dict(zip(old[1], self._dir_ids.get(rel_dir, ()))) if old is not None else {}
+        ids = array('I')
+        for name, is_dir in entries:
+            entry_id = kept.pop((name, is_dir), None)
+            if entry_id is None:
+                entry_id = self._add_entry(f"{rel_dir}/{name}" if rel_dir else name, name.lower(), is_dir)
+            ids.append(entry_id)
+        self._dir_ids[rel_dir] = ids
+        return kept.values()
+
+    def _add_entry(self, path, lower_name, is_dir):
+        entry_id = len(self._paths)
+        self._paths.append(path)
+        self._names.append(lower_name)
+        self._is_dir.append(is_dir)
+        for gram in _trigrams(lower_name):
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array('I')
+            posting.append(entry_id)
+        return entry_id
+
+    def _remove_entries(self, entry_ids):
+        """
+        从倒排表中删除条目，每个受影响的 trigram 只重建一次。
+        倒排表替换为新的数组，不会影响正在进行的搜索已经取得的引用。
+        """
+        dead_by_gram = {}
+        for entry_id in entry_ids:
+            for gram in _trigrams(self._names[entry_id]):
+                dead_by_gram.setdefault(gram, set()).add(entry_id)
+            # 先清除名称再清除路径：没有持锁的 iter_search 先检查名称，再读取路径
+            self._names[entry_id] = None
+            self._paths[entry_id] = None
+            self._removed += 1
+        for gram, dead in dead_by_gram.items():
+            posting = array('I', (entry_id for entry_id in self._postings[gram] if entry_id not in dead))
+            if posting:
+                self._postings[gram] = posting
+            else:
+                del self._postings[gram]
+
+    def _compact(self):
+        id_map = {}
+        paths, names, is_dir_flags = [], [], bytearray()
+        for old_id, path in enumerate(self._paths):
+            if path is not None:
+                id_map[old_id] = len(paths)
+                paths.append(path)
+                names.append(self._names[old_id])
+                is_dir_flags.append(self._is_dir[old_id])
+        # 重新编号保持原有顺序，倒排表仍然是升序的
+        self._paths, self._names, self._is_dir = paths, names, is_dir_flags
+        self._postings = {
+            gram: array('I', (id_map[entry_id] for entry_id in posting)) for gram, posting in self._postings.items()
+        }
+        self._dir_ids = {
+            rel_dir: array('I', (id_map[entry_id] for entry_id in ids)) for rel_dir, ids in self._dir_ids.items()
+        }
+        self._removed = 0
+
+    def _state(self):
+        return {
+            'dirs': self._dirs,
+            'dir_ids': self._dir_ids,
+            'paths': self._paths,
+            'names': self._names,
+            'is_dir': self._is_dir,
+            'removed': self._removed,
+            'postings': self._postings,
+        }
+
+    def _restore(self, data):
+        self._dirs, self._dir_ids = data['dirs'], data['dir_ids']
+        self._paths, self._names = data['paths'], data['names']
+        self._is_dir, self._removed, self._postings = data['is_dir'], data['removed'], data['postings']
+
+    def search(self, keyword):
+        """
+        在索引中查找名称包含 keyword（不区分大小写）的文件和文件夹。
+        """
+        return list(self.iter_search(keyword))
+
+    def iter_search(self, keyword):
+        """
+        按索引中的条目顺序逐个生成名称包含 keyword 的文件和文件夹。
+        生成器开始时取得当前索引数据的引用和候选 id 的副本，后台重扫不会影响正在进行的迭代。
+        """
+        keyword_lower = keyword.lower()
+        with self._lock:
+            paths, names, is_dir_flags = self._paths, self._names, self._is_dir
+            if len(keyword_lower) >= 3:
+                # 取最短的 trigram 倒排表作为候选集，再做一次子串校验。
+                # 在锁内复制候选 id，后台重扫增量修改倒排表不会影响正在进行的迭代
+                candidate_lists = []
+                for gram in _trigrams(keyword_lower):
+                    posting = self._postings.get(gram)
+                    if posting is None:
+                        return
+                    candidate_lists.append(posting)
+                candidates = array('I', min(candidate_lists, key=len))
+            else:
+                # 过短的关键词无法使用 trigram，直接线性扫描内存中的名称列表
+                candidates = range(len(names))
+
+        for entry_id in candidates:
+            name = names[entry_id]
+            # 迭代期间被删除的条目名称和路径为 None，两者之间也可能刚好被删除
+            if name is None or keyword_lower not in name:
+                continue
+            path = paths[entry_id]
+            if path is not None:
+                yield {
+                    'name': path.rsplit('/', 1)[-1],
+                    'path': path,
+                    'is_dir': bool(is_dir_flags[entry_id])
+                }
+
+
+class ContentIndex(_PersistentIndex):
+    """
+    文本文件内容的三元组倒排索引，用于全文搜索。
+
+    每个文件按 (inode, 大小, mtime) 记录，增量重扫时只重新读取发生变化的文件；
+    文件内容以 zlib 压缩后保存在索引中，查询时从索引生成带行号的片段，不会读取磁盘上的文件。
+    超过 max_file_size 的文件和非文本文件不建立索引。
+    """
+
+    def __init__(self, root_dir, hidden_patterns, index_file, max_file_size, app):
+        super().__init__(root_dir, hidden_patterns, index_file)
+        self.max_file_size = max_file_size
+        self._app = app  # 后台线程中判断文件类型需要应用上下文
+        # 相对路径 -> (inode, 大小, mtime_ns, 文件 id)，文件 id 为 -1 表示不是可索引的文本文件
+        self._files = {}
+        # 文件 id -> (相对路径, 压缩后的内容)，删除或修改后的旧 id 为 None
+        self._contents = []
+        self._postings = {}  # trigram -> 文件 id 集合
+
+    def _compatible(self, data):
+        return super()._compatible(data) and data.get('max_file_size') == self.max_file_size
+
+    def _state(self):
+        return {
+            'max_file_size': self.max_file_size,
+            'files': self._files,
+            'contents': self._contents,
+            'postings': self._postings,
+        }
+
+    def _restore(self, data):
+        self._files, self._contents, self._postings = data['files'], data['contents'], data['postings']
+
+    def _scan(self):
+        """
+        遍历目录树，返回 {相对路径: (绝对路径, stat 结果)}，跳过隐藏项和超过大小上限的文件。
+        """
+        is_hidden = get_hidden_matcher(self.hidden_patterns)
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(self.root_dir):
+            dirnames[:] = [d for d in dirnames if not is_hidden(os.path.normcase(d))]
+            rel_dir = os.path.relpath(dirpath, self.root_dir).replace(os.sep, '/')
+            for name in filenames:
+                if is_hidden(os.path.normcase(name)):
+                    continue
+                absolute_path = os.path.join(dirpath, name)
+                try:
+                    file_stat = os.stat(absolute_path)
+                except OSError:
+                    continue
+                if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size > self.max_file_size:
+                    continue
+                found[name if rel_dir == '.' else f"{rel_dir}/{name}"] = (absolute_path, file_stat)
+        return found
+
+    @staticmethod
+    def _read_text(absolute_path):
+        try:
+            with open(absolute_path, 'rb') as f:
+                return f.read().decode('utf-8', errors='replace')
+        except OSError:
+            return None
+
+    def refresh(self):
+        """
+        执行一次增量重扫：只读取新增或 (inode, 大小, mtime) 发生变化的文件，并增量更新倒排表。
+        返回是否有变化。
+        """
+        with self._app.app_context():
+            found = self._scan()
+            added = {}  # 相对路径 -> (stat 键, 内容或 None)
+            for rel_path, (absolute_path, file_stat) in found.items():
+                key = (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+                old = self._files.get(rel_path)
+                if old is not None and old[:3] == key:
+                    continue
+                text = None
+                if _classify(absolute_path, file_stat) == FILE_KIND_TEXT:
+                    text = self._read_text(absolute_path)
+                added[rel_path] = (key, text)
+        removed = [rel_path for rel_path in self._files if rel_path not in found or rel_path in added]
+        if not removed and not added and self.ready:
+            return False
+
+        with self._lock:
+            for rel_path in removed:
+                file_id = self._files.pop(rel_path)[3]
+                if file_id >= 0:
+                    self._remove_postings(file_id)
+            for rel_path, (key, text) in added.items():
+                file_id = -1
+                if text is not None:
+                    file_id = len(self._contents)
+                    self._contents.append((rel_path, zlib.compress(text.encode('utf-8'))))
+                    for gram in _trigrams(text.lower()):
+                        self._postings.setdefault(gram, set()).add(file_id)
+                self._files[rel_path] = key + (file_id,)
+            # 删除的文件过多时重新编号，回收 _contents 中的空位
+            if len(self._contents) > 1000 and len(self._contents) > 2 * self._indexed_count():
+                self._compact()
+            self.generation += 1
+            self.ready = True
+        return True
+
+    def _indexed_count(self):
+        return sum(1 for entry in self._contents if entry is not None)
+
+    def _remove_postings(self, file_id):
+        rel_path, compressed = self._contents[file_id]
+        for gram in _trigrams(zlib.decompress(compressed).decode('utf-8').lower()):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(file_id)
+                if not posting:
+                    del self._postings[gram]
+        self._contents[file_id] = None
+
+    def _compact(self):
+        id_map = {}
+        contents = []
+        for old_id, entry in enumerate(self._contents):
+            if entry is not None:
+                id_map[old_id] = len(contents)
+                contents.append(entry)
+        self._contents = contents
+        self._postings = {gram: {id_map[file_id] for file_id in posting} for gram, posting in self._postings.items()}
+        self._files = {path: value[:3] + (id_map.get(value[3], -1),) for path, value in self._files.items()}
+
+    def iter_search(self, keyword, max_snippets):
+        """
+        按路径顺序逐个生成内容包含 keyword（不区分大小写，至少 3 个字符）的文本文件，
+        每个文件附带最多 max_snippets 个带行号的匹配行。
+        trigram 候选文件实际不包含 keyword 时生成 None，调用方可以借此检查时间预算。
+        """
+        keyword_lower = keyword.lower()
+        grams = _trigrams(keyword_lower)
+        if not grams:
+            return
+        with self._lock:
+            postings = [self._postings.get(gram) for gram in grams]
+            if any(posting is None for posting in postings):
+                return
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            entries = [self._contents[file_id] for file_id in candidates]
+
+        for rel_path, compressed in sorted(entries):
+            matches = []
+            match_count = 0
+            for line_no, line in enumerate(zlib.decompress(compressed).decode('utf-8').splitlines(), 1):
+                position = line.lower().find(keyword_lower)
+                if position < 0:
+                    continue
+                match_count += 1
+                if len(matches) < max_snippets:
+                    matches.append({'line': line_no, 'text': _snippet(line, position, len(keyword_lower))})
+            if not match_count:
+                yield None
+                continue
+            yield {
+                'name': rel_path.rsplit('/', 1)[-1],
+                'path': rel_path,
+                'is_dir': False,
+                'is_text': True,
+                'matches': matches,
+                'match_count': match_count,
+            }
+
+
+def _snippet(line, position, length, width=160):
+    """
+    截取匹配位置附近至多 width 个字符作为片段。
+    """
+    if len(line) <= width:
+        return line
+    start = max(0, min(position - (width - length) // 2, len(line) - width))
+    snippet = line[start:start + width]
+    return ('…' if start > 0 else '') + snippet + ('…' if start + width < len(line) else '')
+
+
+def _try_lock(lock_file):
+    """
+    尝试以非阻塞方式获取索引文件锁。成功返回文件对象，失败返回 None。
+    """
+    if fcntl is None:
+        return open(lock_file, 'a')
+    f = open(lock_file, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return f
+    except OSError:
+        f.close()
+        return None
+
+
+def _maintain(index, interval, logger):
+    """
+    后台维护线程：启动时加载或构建索引，之后按间隔增量重扫。
+    同一时刻只有一个 worker 持有文件锁负责重扫，其他 worker 只在索引文件更新后重新加载。
+    """
+    os.makedirs(os.path.dirname(index.index_file), exist_ok=True)
+    lock_file = f"{index.index_file}.lock"
+    index.load()
+    while True:
+        try:
+            lock = _try_lock(lock_file)
+            if lock is not None:
+                try:
+                    # 其他 worker 可能刚写入了更新的索引，先加载再增量扫描
+                    if index.is_stale_on_disk():
+                        index.load()
+                    if index.refresh() or not os.path.exists(index.index_file):
+                        index.save()
+                finally:
+                    lock.close()
+            elif index.is_stale_on_disk():
+                index.load()
+        except Exception as e:
+            logger.error(f"Error refreshing search index: {e}")
+        time.sleep(interval)
+
+
+_indexes = {}  # 根目录名称 -> FilenameIndex
+_index_lock = threading.Lock()
+
+
+def get_index(name=''):
+    """
+    获取当前进程中根目录 name 的文件名索引，首次调用时创建索引并启动后台维护线程。
+    每个根目录有独立的索引和索引文件。如果配置中禁用了索引则返回 None。
+    """
+    config = current_app.config
+    if not config.get('SEARCH_INDEX_ENABLED', False):
+        return None
+    root_dir = roots.named_roots()[name]
+    index = _indexes.get(name)
+    if index is not None and index.root_dir == root_dir:
+        return index
+
+    with _index_lock:
+        index = _indexes.get(name)
+        if index is None or index.root_dir != root_dir:
+            index = FilenameIndex(
+                root_dir,
+                config.get('HIDDEN_ITEMS', []),
+                roots.index_file(config['SEARCH_INDEX_FILE'], name)
+            )
+            thread = threading.Thread(
+                target=_maintain,
+                args=(index, config.get('SEARCH_INDEX_REFRESH_INTERVAL', 60), current_app.logger),
+                name='aetherserve-search-index',
+                daemon=True
+            )
+            thread.start()
+            _indexes[name] = index
+    return index
+
+
+def search(keyword, name=''):
+    """
+    使用根目录 name 的文件名索引搜索。索引尚未就绪或被禁用时返回 None，由调用方回退到目录遍历。
+    """
+    index = get_index(name)
+    if index is None or not index.ready:
+        return None
+    return index.search(keyword)
+
+
+def iter_search(keyword, name=''):
+    """
+    与 search 相同，但返回逐个生成结果的生成器，索引尚未就绪或被禁用时返回 None。
+    """
+    index = get_index(name)
+    if index is None or not index.ready:
+        return None
+    return index.iter_search(keyword)
+
+
+def _combined_generation(get):
+    generations = []
+    for name in roots.named_roots():
+        index = get(name)
+        if index is None or not index.ready:
+            return None
+        generations.append(index.generation)
+    return generations[0] if len(generations) == 1 else '-'.join(str(g) for g in generations)
+
+
+def current_generation():
+    """
+    返回当前进程索引的 generation，索引尚未就绪或被禁用时返回 None。
+    generation 在每次索引内容变化时递增，可用于生成搜索结果页的 ETag。
+    多根目录时由所有根目录索引的 generation 组合而成，任一根目录的索引尚未就绪时返回 None。
+    """
+    return _combined_generation(get_index)
+
+
+_content_indexes = {}  # 根目录名称 -> ContentIndex
+_content_index_lock = threading.Lock()
+
+
+def get_content_index(name=''):
+    """
+    获取当前进程中根目录 name 的全文索引，首次调用时创建索引并启动后台维护线程。
+    如果配置中禁用了全文索引则返回 None。
+    """
+    config = current_app.config
+    if not config.get('CONTENT_INDEX_ENABLED', False):
+        return None
+    root_dir = roots.named_roots()[name]
+    index = _content_indexes.get(name)
+    if index is not None and index.root_dir == root_dir:
+        return index
+
+    with _content_index_lock:
+        index = _content_indexes.get(name)
+        if index is None or index.root_dir != root_dir:
+            index = ContentIndex(
+                root_dir,
+                config.get('HIDDEN_ITEMS', []),
+                roots.index_file(config['CONTENT_INDEX_FILE'], name),
+                config.get('CONTENT_INDEX_MAX_FILE_SIZE', 1024 * 1024),
+                current_app._get_current_object()
+            )
+            thread = threading.Thread(
+                target=_maintain,
+                args=(index, config.get('CONTENT_INDEX_REFRESH_INTERVAL', 60), current_app.logger),
+                name='aetherserve-content-index',
+                daemon=True
+            )
+            thread.start()
+            _content_indexes[name] = index
+    return index
+
+
+def iter_search_content(keyword, name=''):
+    """
+    使用根目录 name 的全文索引搜索文件内容，返回结果生成器（见 ContentIndex.iter_search）。
+    索引尚未就绪或被禁用时返回 None。
+    """
+    index = get_content_index(name)
+    if index is None or not index.ready:
+        return None
+    return index.iter_search(keyword, current_app.config.get('CONTENT_SEARCH_SNIPPETS_PER_FILE', 5))
+
+
+def current_content_generation():
+    """
+    返回当前进程全文索引的 generation，索引尚未就绪或被禁用时返回 None。
+    多根目录时与 current_generation 一样由所有根目录组合而成。
+    """
+    return _combined_generation(get_content_index)
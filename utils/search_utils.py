@@ -1,19 +1,60 @@
+import base64
 import os
+import queue
+import threading
+import time
 
 from flask import current_app
 
+from utils import metrics, roots, search_index
+from utils.file_operations import InvalidListingQuery, _decode_cursor, _encode_cursor, get_hidden_matcher
 
+
+@metrics.timed('search_files_globally')
 def search_files_globally(keyword):
     """
-    在 FILE_SERVER_ROOT_DIR 下全局搜索文件和文件夹。
+    在 FILE_SERVER_ROOT_DIR（多根目录时为所有根目录）下全局搜索文件和文件夹。
     返回一个包含匹配项信息的列表。
+    优先使用持久化的文件名索引，索引尚未就绪时回退到完整的目录遍历。
     """
-    root_dir = current_app.config['FILE_SERVER_ROOT_DIR']
     results = []
+    for name in roots.named_roots():
+        for item in iter_name_matches(keyword, name):
+            if item is not None:
+                item['path'] = roots.join(name, item['path'])
+                results.append(item)
+    return results
+
+
+def iter_name_matches(keyword, name=''):
+    """
+    逐个生成根目录 name 中名称包含 keyword 的文件和文件夹（路径相对于该根目录），顺序在索引（或目录树）不变时是确定的。
+    优先使用文件名索引，索引尚未就绪时回退到目录遍历；遍历时每进入一个目录生成一次 None，
+    供调用方在没有匹配项时也能检查时间预算。
+    """
+    matches = search_index.iter_search(keyword, name)
+    metrics.count_cache('search_index', matches is not None)
+    if matches is not None:
+        return matches
+    return _walk_and_search(keyword, roots.named_roots()[name], current_app.config.get('HIDDEN_ITEMS', []))
+
+
+def _walk_and_search(keyword, root_dir, hidden_items):
+    """
+    通过 os.walk 遍历整个目录树进行搜索，与索引一样会跳过 HIDDEN_ITEMS 中的项。
+    目录和文件按名称排序遍历，使分页游标在目录树不变时指向相同的位置。
+    该生成器可能在请求上下文之外运行，所需配置均通过参数传入。
+    """
+    is_hidden = get_hidden_matcher(hidden_items)
     keyword_lower = keyword.lower()
 
     # 遍历根目录下的所有文件和子目录
     for dirpath, dirnames, filenames in os.walk(root_dir):
+        # 原地移除隐藏的目录，os.walk 将不会进入这些目录
+        dirnames[:] = sorted(d for d in dirnames if not is_hidden(os.path.normcase(d)))
+        filenames = sorted(f for f in filenames if not is_hidden(os.path.normcase(f)))
+        yield None
+
         # 计算当前目录相对于根目录的相对路径
         relative_dirpath = os.path.relpath(dirpath, root_dir)
         # 如果相对路径是 '.'，表示根目录本身，将其设置为空字符串以便拼接 URL
@@ -24,19 +65,269 @@ def search_files_globally(keyword):
         for dirname in dirnames:
             if keyword_lower in dirname.lower():
                 full_relative_path = os.path.join(relative_dirpath, dirname).replace('\\', '/') # 统一路径分隔符
-                results.append({
+                yield {
                     'name': dirname,
                     'path': full_relative_path,
                     'is_dir': True
-                })
+                }
 
         # 搜索文件名称
         for filename in filenames:
             if keyword_lower in filename.lower():
                 full_relative_path = os.path.join(relative_dirpath, filename).replace('\\', '/') # 统一路径分隔符
-                results.append({
+                yield {
                     'name': filename,
                     'path': full_relative_path,
                     'is_dir': False
-                })
-    return results
+                }
+
+
+class SearchPage:
+    """
+    一页搜索结果的惰性迭代器。
+    迭代时先跳过游标之前的匹配项，再逐个生成至多 limit 个结果；页面填满或搜索耗时超过时间预算时立即停止，
+    不再继续遍历。时间预算只计算搜索本身的耗时，不包括等待客户端接收数据的时间。
+    迭代结束后 next_cursor 为下一页的游标（没有更多结果时为 None），partial 表示是否因超时提前结束。
+    """
+
+    def __init__(self, matches, offset, limit, time_budget):
+        self._matches = matches
+        self.offset = offset
+        self.limit = limit
+        self.time_budget = time_budget
+        self.count = 0
+        self.next_cursor = None
+        self.partial = False
+
+    def __iter__(self):
+        spent = 0.0
+        resumed = time.perf_counter()
+        position = 0  # 已经找到的匹配项数，包括被跳过的
+        try:
+            for item in self._matches:
+                now = time.perf_counter()
+                if spent + (now - resumed) > self.time_budget:
+                    # 当前匹配项不计入 position，下一页会重新找到它；仍在跳过阶段时保持原游标，避免重复结果
+                    self.partial = True
+                    self.next_cursor = _encode_cursor(max(position, self.offset))
+                    break
+                if item is None:
+                    continue
+                position += 1
+                if position <= self.offset:
+                    continue
+                self.count += 1
+                spent += now - resumed
+                resumed = None
+                yield item
+                resumed = time.perf_counter()
+                if self.count >= self.limit:
+                    # 页面已满，不再检查是否还有更多结果，下一页可能为空
+                    self.next_cursor = _encode_cursor(position)
+                    break
+        finally:
+            if resumed is not None:
+                spent += time.perf_counter() - resumed
+            if hasattr(self._matches, 'close'):
+                self._matches.close()
+            metrics.observe('aetherserve_function_duration_seconds', {'function': 'search_page'}, spent)
+
+
+# 多根目录游标中表示该根目录已经没有更多结果的位置
+_ROOT_EXHAUSTED = -1
+
+
+def _encode_root_cursor(positions):
+    """
+    将每个根目录的下一页起始位置编码为不透明的游标字符串。
+    """
+    raw = 'r:' + ','.join(f"{name}={position}" for name, position in positions.items())
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_root_cursor(cursor, names):
+    """
+    解析多根目录的游标，返回 {根目录名称: 起始位置}。游标中没有的根目录（例如新增的根目录）从头开始。
+    游标无效时抛出 ValueError。
+    """
+    positions = dict.fromkeys(names, 0)
+    if not cursor:
+        return positions
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        prefix, body = raw.split(':', 1)
+        parsed = {name: int(position) for name, position in (item.rsplit('=', 1) for item in body.split(',') if item)}
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if prefix != 'r' or any(position < _ROOT_EXHAUSTED for position in parsed.values()):
+        raise ValueError("Invalid cursor.")
+    for name in names:
+        positions[name] = parsed.get(name, 0)
+    return positions
+
+
+class FanOutSearchPage:
+    """
+    多根目录的一页搜索结果，接口与 SearchPage 相同。
+    各个根目录的搜索在线程池中并行执行，结果按到达的顺序合并生成，较慢的磁盘不会挡住其他根目录的结果。
+    每个根目录有独立的时间预算（root_time_budget，从开始搜索时计时），超时的根目录本页只贡献已找到的结果；
+    整页的时间预算（time_budget）与 SearchPage 一样不包括等待客户端接收数据的时间。
+    游标分别记录每个根目录已经返回到的位置，下一页各自从那里继续，因此合并顺序不影响分页的正确性。
+    """
+
+    def __init__(self, sources, positions, limit, time_budget, root_time_budget, logger):
+        self._sources = sources  # 根目录名称 -> 匹配项生成器，None 表示该根目录的索引尚未就绪
+        self.positions = positions
+        self.offset = any(position != 0 for position in positions.values())  # 是否不是第一页
+        self.limit = limit
+        self.time_budget = time_budget
+        self.root_time_budget = root_time_budget
+        self.count = 0
+        self.next_cursor = None
+        self.partial = False
+        self._logger = logger
+
+    def _search_root(self, name, matches, offset, results, stop, deadline):
+        """
+        在线程池中运行：跳过游标之前的匹配项，把至多 limit 个结果（路径加上根目录名称）依次放入 results，
+        最后放入结束状态：done（没有更多结果）、full、timeout、stopped 或 error。
+        """
+        position = 0
+        produced = 0
+        status = 'done'
+        try:
+            # 线程池繁忙时，轮到该根目录之前页面可能已经结束
+            for item in () if stop.is_set() else matches:
+                if stop.is_set():
+                    status = 'stopped'
+                    break
+                if time.perf_counter() > deadline:
+                    status = 'timeout'
+                    break
+                if item is None:
+                    continue
+                position += 1
+                if position <= offset:
+                    continue
+                item['path'] = roots.join(name, item['path'])
+                results.put((name, position, item))
+                produced += 1
+                if produced >= self.limit:
+                    status = 'full'
+                    break
+        except Exception as e:
+            self._logger.error(f"Search failed in root {name}: {e}")
+            status = 'error'
+        finally:
+            if hasattr(matches, 'close'):
+                matches.close()
+            results.put((name, position, status))
+
+    def __iter__(self):
+        results = queue.Queue()
+        stop = threading.Event()
+        consumed = dict(self.positions)  # 根目录 -> 已生成的最后一个结果的位置
+        finished = {}  # 根目录 -> 结束状态
+        running = set()
+        started = time.perf_counter()
+        root_deadline = started + self.root_time_budget
+        executor = roots.get_executor()
+        for name, matches in self._sources.items():
+            if matches is None:
+                finished[name] = 'unavailable'
+                self.partial = True
+                continue
+            executor.submit(self._search_root, name, matches, self.positions[name], results, stop, root_deadline)
+            running.add(name)
+
+        spent = 0.0
+        try:
+            # 每个根目录的结束状态排在它的所有结果之后，收到结束状态时该根目录的结果已经全部生成
+            while running:
+                waited = time.perf_counter()
+                timeout = min(self.time_budget - spent, root_deadline - waited)
+                try:
+                    if timeout <= 0:
+                        raise queue.Empty
+                    name, position, payload = results.get(timeout=timeout)
+                except queue.Empty:
+                    # 仍在搜索的根目录（例如卡在无响应的挂载点上）本页不再等待
+                    self.partial = True
+                    break
+                finally:
+                    spent += time.perf_counter() - waited
+                if isinstance(payload, str):
+                    running.discard(name)
+                    finished[name] = payload
+                    if payload in ('timeout', 'error'):
+                        self.partial = True
+                    continue
+                consumed[name] = position
+                self.count += 1
+                yield payload
+                if self.count >= self.limit:
+                    break
+        finally:
+            stop.set()
+            positions = {
+                name: _ROOT_EXHAUSTED if finished.get(name) == 'done' else consumed[name]
+                for name in self.positions
+            }
+            if any(position != _ROOT_EXHAUSTED for position in positions.values()):
+                self.next_cursor = _encode_root_cursor(positions)
+            metrics.observe('aetherserve_function_duration_seconds', {'function': 'search_page'}, spent)
+
+
+def _fan_out_page(keyword, mode, cursor, limit):
+    """
+    创建多根目录的一页搜索结果（FanOutSearchPage）。全文搜索时所有根目录的全文索引都尚未就绪才返回 None，
+    部分根目录尚未就绪时只搜索其余的根目录，页面标记为 partial。
+    """
+    config = current_app.config
+    names = list(roots.named_roots())
+    try:
+        positions = _decode_root_cursor(cursor, names)
+    except ValueError as e:
+        raise InvalidListingQuery(str(e))
+
+    sources = {}
+    for name in names:
+        if positions[name] == _ROOT_EXHAUSTED:
+            continue
+        if mode == 'content':
+            sources[name] = search_index.iter_search_content(keyword, name)
+            metrics.count_cache('content_index', sources[name] is not None)
+        else:
+            sources[name] = iter_name_matches(keyword, name)
+    if mode == 'content' and sources and all(matches is None for matches in sources.values()):
+        return None
+    return FanOutSearchPage(
+        sources, positions, limit,
+        config.get('SEARCH_TIME_BUDGET', 3.0), config.get('SEARCH_ROOT_TIME_BUDGET', 2.0), current_app.logger
+    )
+
+
+def search_page(keyword, mode, cursor=None, limit=None):
+    """
+    创建一页搜索结果（SearchPage）。mode 为 'content' 时搜索文本文件的内容，否则搜索文件和文件夹名称。
+    全文搜索只使用全文索引，索引被禁用或尚未就绪时返回 None。游标无效时抛出 InvalidListingQuery。
+    配置了多个根目录时并行搜索所有根目录（FanOutSearchPage）。
+    """
+    config = current_app.config
+    if limit is None:
+        limit = config.get('SEARCH_PAGE_SIZE', 100)
+    if roots.is_multi_root():
+        return _fan_out_page(keyword, mode, cursor, limit)
+    try:
+        offset = _decode_cursor(cursor)
+    except ValueError as e:
+        raise InvalidListingQuery(str(e))
+
+    if mode == 'content':
+        matches = search_index.iter_search_content(keyword)
+        metrics.count_cache('content_index', matches is not None)
+        if matches is None:
+            return None
+    else:
+        matches = iter_name_matches(keyword)
+    return SearchPage(matches, offset, limit, config.get('SEARCH_TIME_BUDGET', 3.0))
@@ -0,0 +1,239 @@
+import hashlib
+import multiprocessing
+import os
+import stat
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+
+from utils import metrics
+from utils.file_operations import FILE_KIND_IMAGE, _classify, _get_absolute_path
+
+# Pillow 是可选依赖，未安装时缩略图功能自动禁用，页面直接使用原图
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+# Pillow 无法解码的矢量/特殊格式，直接使用原图
+_UNSUPPORTED_EXTENSIONS = frozenset(['.svg'])
+
+_executor = None
+_executor_lock = threading.Lock()
+# 正在生成中的缩略图：缓存路径 -> Future，并发请求同一缩略图时只生成一次
+_pending = {}
+_pending_lock = threading.Lock()
+_evict_lock = threading.Lock()
+# 本进程估算的缓存总字节数，首次生成缩略图时通过遍历缓存目录初始化
+_cache_bytes = None
+
+
+def is_available():
+    """
+    判断缩略图功能是否可用（已启用且安装了 Pillow）。
+    """
+    return Image is not None and current_app.config.get('THUMBNAIL_ENABLED', False)
+
+
+def _output_format():
+    """
+    返回缩略图格式及其 MIME 类型：优先 WebP，Pillow 不支持 WebP 时使用 JPEG。
+    """
+    if features.check('webp'):
+        return 'WEBP', 'image/webp'
+    return 'JPEG', 'image/jpeg'
+
+
+def _render_thumbnail(source_path, dest_path, size, image_format, max_pixels):
+    """
+    在进程池中运行：生成最长边不超过 size 的缩略图并原子地写入 dest_path。
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels  # 防止解压炸弹
+    with Image.open(source_path) as image:
+        image.draft('RGB', (size, size))  # JPEG 可以直接以较低分辨率解码，显著减少内存和 CPU
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+        image.save(tmp_path, image_format, quality=80)
+    os.replace(tmp_path, dest_path)
+    return dest_path
+
+
+def _get_executor():
+    """
+    获取当前进程的缩略图进程池，首次调用时根据配置创建。
+    使用 spawn 方式启动子进程，避免在带有后台线程的 Gunicorn worker 中 fork。
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=current_app.config.get('THUMBNAIL_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _executor
+
+
+def _cache_path(file_stat, size, image_format):
+    """
+    返回缩略图在内容寻址缓存中的路径，以源文件的 (设备, inode, 大小, mtime) 和缩略图尺寸为键。
+    """
+    key = f"{file_stat.st_dev}:{file_stat.st_ino}:{file_stat.st_size}:{file_stat.st_mtime_ns}:{size}:{image_format}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    extension = '.webp' if image_format == 'WEBP' else '.jpg'
+    return os.path.join(current_app.config['THUMBNAIL_CACHE_DIR'], digest[:2], digest + extension)
+
+
+def _scan_and_evict(cache_dir, max_bytes):
+    """
+    统计缓存目录的总大小，超过 max_bytes 时按最近使用时间（mtime，命中时会更新）删除最旧的缩略图。
+    返回清理后的总字节数。
+    """
+    thumbnails = []
+    total = 0
+    for dirpath, _, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            if filename.endswith('.tmp'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                continue
+            thumbnails.append((file_stat.st_mtime, file_stat.st_size, path))
+            total += file_stat.st_size
+    if total > max_bytes:
+        thumbnails.sort()
+        for _, file_size, path in thumbnails:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= file_size
+            except OSError:
+                pass
+    return total
+
+
+def _record_thumbnail(cache_dir, max_bytes, dest_path):
+    """
+    记录新生成的缩略图大小。只有估算的总大小超过上限时才遍历缓存目录进行淘汰（清理到上限的 90%）。
+    """
+    global _cache_bytes
+    with _evict_lock:
+        if _cache_bytes is None:
+            _cache_bytes = _scan_and_evict(cache_dir, max_bytes)
+            return
+        try:
+            _cache_bytes += os.path.getsize(dest_path)
+        except OSError:
+            return
+        if _cache_bytes > max_bytes:
+            _cache_bytes = _scan_and_evict(cache_dir, int(max_bytes * 0.9))
+
+
+def _submit(source_path, dest_path, size, image_format):
+    """
+    提交缩略图生成任务。同一缩略图已在生成中时复用同一个 Future。
+    """
+    config = current_app.config
+    with _pending_lock:
+        future = _pending.get(dest_path)
+        if future is not None:
+            return future
+        future = _get_executor().submit(
+            _render_thumbnail, source_path, dest_path, size, image_format, config['THUMBNAIL_MAX_SOURCE_PIXELS']
+        )
+        _pending[dest_path] = future
+
+    cache_dir, max_bytes = config['THUMBNAIL_CACHE_DIR'], config['THUMBNAIL_CACHE_MAX_BYTES']
+
+    def done(finished):
+        with _pending_lock:
+            _pending.pop(dest_path, None)
+        if finished.exception() is None:
+            _record_thumbnail(cache_dir, max_bytes, dest_path)
+
+    future.add_done_callback(done)
+    return future
+
+
+def _resolve(relative_path):
+    """
+    解析并检查源图片，返回 (绝对路径, stat 结果)。
+    不是可生成缩略图的图片时返回 None；路径不存在时抛出 FileNotFoundError，目录穿越时抛出 ValueError。
+    """
+    absolute_path = _get_absolute_path(relative_path)
+    try:
+        file_stat = os.stat(absolute_path)
+    except OSError:
+        raise FileNotFoundError(f"File not found: {relative_path}")
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise FileNotFoundError(f"File not found: {relative_path}")
+    if os.path.splitext(absolute_path)[1].lower() in _UNSUPPORTED_EXTENSIONS or \
+            _classify(absolute_path, file_stat) != FILE_KIND_IMAGE:
+        return None
+    return absolute_path, file_stat
+
+
+def get_thumbnail(relative_path, size):
+    """
+    获取图片的缩略图，必要时同步生成（首次请求时惰性生成）。
+    返回 (缩略图路径, MIME 类型)；无法生成缩略图（格式不支持、解码失败或超时）时返回 None，由调用方回退到原图。
+    """
+    resolved = _resolve(relative_path)
+    if resolved is None:
+        return None
+    absolute_path, file_stat = resolved
+    image_format, mimetype = _output_format()
+    dest_path = _cache_path(file_stat, size, image_format)
+
+    if os.path.isfile(dest_path):
+        metrics.count_cache('thumbnail', True)
+        try:
+            os.utime(dest_path)  # 更新 mtime，作为 LRU 淘汰的最近使用时间
+        except OSError:
+            pass
+        return dest_path, mimetype
+
+    metrics.count_cache('thumbnail', False)
+    future = _submit(absolute_path, dest_path, size, image_format)
+    try:
+        future.result(timeout=current_app.config.get('THUMBNAIL_TIMEOUT', 30))
+    except Exception as e:
+        current_app.logger.warning(f"Thumbnail generation failed for {relative_path}: {e}")
+        return None
+    return dest_path, mimetype
+
+
+def warm_directory(items, size):
+    """
+    在后台为目录列表中的图片预生成缩略图，不等待结果。items 为 list_directory 返回的条目。
+    返回提交生成的缩略图数量（已缓存的不计入）。
+    """
+    if not is_available():
+        return 0
+    queued = 0
+    image_format, _ = _output_format()
+    for item in items:
+        if not item.get('is_image'):
+            continue
+        try:
+            resolved = _resolve(item['path'])
+        except (FileNotFoundError, ValueError):
+            continue
+        if resolved is None:
+            continue
+        absolute_path, file_stat = resolved
+        dest_path = _cache_path(file_stat, size, image_format)
+        if not os.path.isfile(dest_path):
+            _submit(absolute_path, dest_path, size, image_format)
+            queued += 1
+    return queued